@@ -0,0 +1,176 @@
+"""Delivery analytics: time-bucketed rollups of tracking events.
+
+Two rollups are kept up to date as events are written (see
+``record_event_rollups`` in app.py) and filled for older data by
+``flask analytics backfill``:
+
+- event_rollup: events per hour, status and location
+- transition_rollup: per day, route and status, how many shipments first
+  reached the status and the total seconds it took them since creation
+
+so questions like "average time to Delivered per day or route" or
+"exceptions per location per hour" read a few rollup rows instead of
+scanning tracking_event. Durations between any two statuses over an ad-hoc
+range are computed from the raw events with NumPy when it is installed
+(``pip install numpy``), and with plain Python otherwise.
+"""
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ENGINE = 'numpy' if np is not None else 'python'
+
+
+def hour_bucket(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def place(address):
+    """The last comma-separated part of an address, usually the town or city"""
+    return (address or '').rsplit(',', 1)[-1].strip()[:95]
+
+
+def route_of(pickup_address, delivery_address):
+    return f'{place(pickup_address)} -> {place(delivery_address)}'
+
+
+class Rollup:
+    """Rollup increments for a set of events, ready to be added to the tables"""
+
+    def __init__(self):
+        self.events = {}
+        self.transitions = {}
+
+    def add(self, status, location, timestamp, created_at, route, first):
+        """Count one event; ``first`` marks the shipment's first event with this status"""
+        if timestamp is None:
+            return
+        key = (hour_bucket(timestamp), status, location or '')
+        self.events[key] = self.events.get(key, 0) + 1
+        if first and created_at is not None:
+            key = (timestamp.date(), route, status)
+            count, total = self.transitions.get(key, (0, 0.0))
+            seconds = max((timestamp - created_at).total_seconds(), 0.0)
+            self.transitions[key] = (count + 1, total + seconds)
+
+    def event_rows(self):
+        return [{'bucket': bucket, 'status': status, 'location': location, 'count': count}
+                for (bucket, status, location), count in self.events.items()]
+
+    def transition_rows(self):
+        return [{'day': day, 'route': route, 'status': status, 'count': count,
+                 'total_seconds': total}
+                for (day, route, status), (count, total) in self.transitions.items()]
+
+
+def period_start(value, granularity):
+    """The hour or day a bucket falls in"""
+    if granularity == 'day':
+        return datetime(value.year, value.month, value.day)
+    return hour_bucket(value)
+
+
+def fold_event_rows(rows, granularity, by):
+    """Sum (bucket, status, location, count) rows per period and the ``by`` columns"""
+    totals = {}
+    for bucket, status, location, count in rows:
+        values = {'status': status, 'location': location}
+        key = (period_start(bucket, granularity),) + tuple(values[name] for name in by)
+        totals[key] = totals.get(key, 0) + count
+    return [dict(zip(('period',) + tuple(by), key), count=count)
+            for key, count in sorted(totals.items())]
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated percentile of an ascending list, as numpy.percentile
+
+    The benchmarks report their latency percentiles with this too.
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def duration_summary(seconds):
+    """count, mean, p50 and p90 of a list or array of durations in seconds"""
+    if np is not None:
+        seconds = np.asarray(seconds, dtype=float)
+        if not len(seconds):
+            return {'count': 0, 'mean_seconds': None, 'p50_seconds': None, 'p90_seconds': None}
+        p50, p90 = np.percentile(seconds, [50, 90])
+        return {'count': int(len(seconds)), 'mean_seconds': float(seconds.mean()),
+                'p50_seconds': float(p50), 'p90_seconds': float(p90)}
+    values = sorted(seconds)
+    return {'count': len(values),
+            'mean_seconds': sum(values) / len(values) if values else None,
+            'p50_seconds': percentile(values, 50),
+            'p90_seconds': percentile(values, 90)}
+
+
+def _first_reached_numpy(ids, shipment_ids, statuses, timestamps, status):
+    mask = statuses == status
+    order = np.lexsort((ids[mask], shipment_ids[mask]))
+    shipments = shipment_ids[mask][order]
+    reached = timestamps[mask][order]
+    keep = np.ones(len(shipments), dtype=bool)
+    keep[1:] = shipments[1:] != shipments[:-1]
+    return shipments[keep], reached[keep]
+
+
+def transition_durations(events, from_status, to_status, start, end):
+    """Durations from each shipment's first ``from_status`` event to its first ``to_status`` event
+
+    ``events`` are (id, shipment_id, status, timestamp) rows covering both
+    statuses of the shipments of interest; "first" is by event id, as in
+    the rollups. Only shipments whose first ``to_status`` event falls in
+    [start, end) count. Returns ``(days, seconds)``: the day each shipment
+    reached ``to_status`` and how long it took.
+    """
+    if np is not None:
+        if not events:
+            return [], np.array([], dtype=float)
+        ids, shipment_ids, statuses, timestamps = zip(*events)
+        ids = np.asarray(ids, dtype=np.int64)
+        shipment_ids = np.asarray(shipment_ids, dtype=np.int64)
+        statuses = np.asarray(statuses, dtype=object)
+        timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+        from_shipments, started = _first_reached_numpy(ids, shipment_ids, statuses, timestamps,
+                                                       from_status)
+        to_shipments, reached = _first_reached_numpy(ids, shipment_ids, statuses, timestamps,
+                                                     to_status)
+        _, from_index, to_index = np.intersect1d(from_shipments, to_shipments, assume_unique=True,
+                                                 return_indices=True)
+        started, reached = started[from_index], reached[to_index]
+        keep = (reached >= np.datetime64(start, 'us')) & (reached < np.datetime64(end, 'us')) & \
+            (reached >= started)
+        seconds = (reached[keep] - started[keep]) / np.timedelta64(1, 's')
+        return reached[keep].astype('datetime64[D]').tolist(), seconds
+
+    first = {}
+    for event_id, shipment_id, status, timestamp in sorted(events):
+        first.setdefault((shipment_id, status), timestamp)
+    days, seconds = [], []
+    for (shipment_id, status), reached in first.items():
+        if status != to_status or not start <= reached < end:
+            continue
+        started = first.get((shipment_id, from_status))
+        if started is not None and reached >= started:
+            days.append(reached.date())
+            seconds.append((reached - started).total_seconds())
+    return days, seconds
+
+
+def durations_by_day(days, seconds):
+    """duration_summary per day, in day order"""
+    grouped = {}
+    for day, value in zip(days, seconds):
+        grouped.setdefault(day, []).append(float(value))
+    return [dict(duration_summary(values), day=day.isoformat())
+            for day, values in sorted(grouped.items())]
+
@@ -1,22 +1,73 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, current_app, json, send_file
+from flask.cli import AppGroup
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-from sqlalchemy import desc, func, or_
+from sqlalchemy import bindparam, desc, event, false, func, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached, selectinload
 from functools import wraps
+import csv
+import hashlib
+import hmac
+import click
+import math
 import os
-import random
+import shutil
+import time
+
+import analytics
+import archive
+from config import Config
+from database import Database, add_to_rows
+import migrations
+from migrations.explain import check_queries
+from notification_dispatch import BatchResult, NotificationDispatcher, retry_delay
+from ingest import chunked, detect_format, iter_scans, parse_timestamp
+from instrumentation import Instrumentation
+import manifest
+from page_cache import PageCache
+from passwords import HashingBusy, PasswordHasher
+from live_updates import (HubFull, SubscriptionClosed, create_hub, frame_id, parse_channels,
+                          parse_last_event_id, tracking_frame)
+from pagination import decode_cursor, encode_cursor, keyset_page
+from rate_limit import create_rate_limiter
+import search
+from static_assets import StaticAssets
+from tracking_cache import CachedResponse, ResponseCache, create_backend, create_tracking_cache
+from tracking_numbers import TrackingNumberAllocator
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///logistics.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config)
 
-db = SQLAlchemy(app)
+instrumentation = Instrumentation(app)
+db = Database(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+tracking_cache = create_tracking_cache(app.config)
+tracking_misses = ResponseCache(create_backend(app.config, prefix='miss:', setting='TRACKING_MISS_CACHE'))
+rate_limiter = create_rate_limiter(app.config)
+user_cache = ResponseCache(create_backend(app.config, prefix='user:', setting='USER_CACHE'))
+page_cache = PageCache(create_backend(app.config, prefix='page:', setting='PAGE_CACHE'),
+                       max_age=app.config['PAGE_MAX_AGE'])
+static_assets = StaticAssets(app, max_age=app.config['STATIC_MAX_AGE'])
+passwords = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    pbkdf2_iterations=app.config['PASSWORD_PBKDF2_ITERATIONS'],
+    scrypt_n=app.config['PASSWORD_SCRYPT_N'],
+    scrypt_r=app.config['PASSWORD_SCRYPT_R'],
+    scrypt_p=app.config['PASSWORD_SCRYPT_P'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_QUEUE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+live_hub = create_hub(app.config)
+tracking_numbers = TrackingNumberAllocator(
+    lambda: db.engine,
+    block_size=app.config['TRACKING_NUMBER_BLOCK_SIZE'],
+    prefix=app.config['TRACKING_NUMBER_PREFIX'],
+    number_format=app.config['TRACKING_NUMBER_FORMAT']
+)
 
 # Models
 class User(UserMixin, db.Model):
@@ -28,6 +79,11 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
 
 class TrackingEvent(db.Model):
+    __table_args__ = (
+        db.Index('ix_tracking_event_shipment_id_timestamp', 'shipment_id', 'timestamp'),
+        db.Index('ix_tracking_event_timestamp', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     shipment_id = db.Column(db.Integer, db.ForeignKey('shipment.id'), nullable=False)
     status = db.Column(db.String(50), nullable=False)
@@ -46,6 +102,14 @@ class TrackingEvent(db.Model):
         }
 
 class Shipment(db.Model):
+    __table_args__ = (
+        db.Index('ix_shipment_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_shipment_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_shipment_created_at_id', 'created_at', 'id'),
+        db.Index('ix_shipment_status_updated_at_id', 'status', 'updated_at', 'id'),
+        db.Index('ix_shipment_user_id_updated_at_id', 'user_id', 'updated_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     tracking_number = db.Column(db.String(20), unique=True, nullable=False)
     sender_name = db.Column(db.String(100), nullable=False)
@@ -54,7 +118,8 @@ class Shipment(db.Model):
     receiver_phone = db.Column(db.String(20), nullable=False)
     pickup_address = db.Column(db.String(200), nullable=False)
     delivery_address = db.Column(db.String(200), nullable=False)
-    status = db.Column(db.String(50), default='Pending')
+    # Load the old status before a change, so the status counters see both sides
+    status = db.column_property(db.Column(db.String(50), default='Pending'), active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     weight = db.Column(db.Float)
@@ -65,7 +130,94 @@ class Shipment(db.Model):
     tracking_events = db.relationship('TrackingEvent', backref='shipment', lazy=True, 
                                     order_by=desc(TrackingEvent.timestamp))
 
+class ShipmentStatusCount(db.Model):
+    """Number of shipments currently in each status, kept in step with writes"""
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ManifestImport(db.Model):
+    """One uploaded shipment manifest and the outcome of importing it"""
+    __table_args__ = (
+        db.Index('ix_manifest_import_user_id_created_at', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(200))
+    format = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='processing')
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'format': self.format,
+            'status': self.status,
+            'rows': self.rows,
+            'created': self.created,
+            'rejected': self.rejected,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result_url': url_for('manifest_import_result', import_id=self.id)
+        }
+
+class TrackingEventArchive(db.Model):
+    """Compressed tracking history of a shipment whose events left tracking_event"""
+    shipment_id = db.Column(db.Integer, db.ForeignKey('shipment.id'), primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False)
+    first_event_at = db.Column(db.DateTime)
+    last_event_at = db.Column(db.DateTime)
+    last_event_id = db.Column(db.Integer)
+    search_text = db.Column(db.Text, nullable=False, default='')
+    events = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ArchiveCheckpoint(db.Model):
+    """Where a batched archival run stopped, so the next run resumes there"""
+    name = db.Column(db.String(50), primary_key=True)
+    last_updated_at = db.Column(db.DateTime)
+    last_shipment_id = db.Column(db.Integer)
+    saved_at = db.Column(db.DateTime)
+
+class EventRollup(db.Model):
+    """Tracking events per hour, status and location ('' when unknown)"""
+    bucket = db.Column(db.DateTime, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    location = db.Column(db.String(200), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class TransitionRollup(db.Model):
+    """Shipments first reaching a status per day and route, and the seconds it took since creation"""
+    day = db.Column(db.Date, primary_key=True)
+    route = db.Column(db.String(200), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0)
+
+class AnalyticsCheckpoint(db.Model):
+    """Progress of the analytics backfill over events up to max_event_id"""
+    name = db.Column(db.String(50), primary_key=True)
+    last_shipment_id = db.Column(db.Integer, nullable=False, default=0)
+    max_event_id = db.Column(db.Integer, nullable=False, default=0)
+    saved_at = db.Column(db.DateTime)
+
+class TrackingNumberSequence(db.Model):
+    """Next unreserved value of a tracking number sequence"""
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notification_user_id_is_read_created_at_id',
+                 'user_id', 'is_read', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
@@ -74,8 +226,12 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     shipment_id = db.Column(db.Integer, db.ForeignKey('shipment.id'))
     
-    def to_dict(self):
-        """Convert notification to dictionary for JSON responses"""
+    def to_dict(self, now=None):
+        """Convert notification to dictionary for JSON responses
+        
+        Pass one ``now`` for every notification of a response so their
+        ``time_ago`` values are consistent with each other.
+        """
         return {
             'id': self.id,
             'title': self.title,
@@ -83,12 +239,12 @@ class Notification(db.Model):
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat(),
             'shipment_id': self.shipment_id,
-            'time_ago': self.get_time_ago()
+            'time_ago': self.get_time_ago(now)
         }
         
-    def get_time_ago(self):
+    def get_time_ago(self, now=None):
         """Get human-readable time difference"""
-        now = datetime.utcnow()
+        now = now or datetime.utcnow()
         diff = now - self.created_at
         
         if diff.days > 30:
@@ -106,67 +262,585 @@ class Notification(db.Model):
         else:
             return "Just now"
 
+class NotificationUnreadCount(db.Model):
+    """Number of unread notifications per user, kept in step with writes"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Act on committed changes to shipments and their events: invalidate cached
+# tracking responses and push new events to live subscribers. Changes are
+# collected per session on flush and only acted on after commit, so a rolled
+# back change leaves the cache and the live streams alone.
+@event.listens_for(db.session, 'after_flush')
+def _collect_tracking_changes(session, flush_context):
+    changed = session.info.setdefault('changed_tracking_numbers', set())
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Shipment):
+                changed.add(obj.tracking_number)
+            elif isinstance(obj, TrackingEvent):
+                shipment = obj.shipment or Shipment.query.get(obj.shipment_id)
+                if shipment is not None:
+                    changed.add(shipment.tracking_number)
+                    if obj in session.new:
+                        queue_live_event(session, shipment.tracking_number, shipment.status,
+                                         obj.to_dict())
+
+def mark_tracking_changed(tracking_numbers):
+    """Record changes made with bulk statements that bypass the ORM flush"""
+    db.session().info.setdefault('changed_tracking_numbers', set()).update(tracking_numbers)
+
+def queue_live_event(session, tracking_number, status, event_data):
+    """Hold a new tracking event for live subscribers until the session commits"""
+    session.info.setdefault('live_events', []).append((tracking_number, status, event_data))
+
+@event.listens_for(db.session, 'after_commit')
+def _after_tracking_commit(session):
+    changed = session.info.pop('changed_tracking_numbers', None)
+    if changed:
+        tracking_cache.invalidate_many(changed)
+        tracking_misses.invalidate_many(changed)
+    for tracking_number, status, event_data in session.info.pop('live_events', ()):
+        live_hub.publish(tracking_number, tracking_frame(tracking_number, status, event_data))
+    if session.info.pop('notifications_enqueued', False):
+        notification_dispatcher.notify()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_tracking_changes(session):
+    session.info.pop('changed_tracking_numbers', None)
+    session.info.pop('live_events', None)
+    session.info.pop('notifications_enqueued', None)
+
+def apply_counter_deltas(connection, table, key, deltas):
+    """Add deltas to the ``count`` column of a counter table keyed by ``key`` in one statement"""
+    add_to_rows(connection, table, (key,),
+                [{key: value, 'count': delta} for value, delta in deltas.items() if delta])
+
+def apply_status_deltas(connection, deltas):
+    """Add per-status deltas to the shipment status counters in one statement"""
+    apply_counter_deltas(connection, ShipmentStatusCount.__table__, 'status', deltas)
+
+def apply_unread_deltas(connection, deltas):
+    """Add per-user deltas to the unread notification counters in one statement"""
+    apply_counter_deltas(connection, NotificationUnreadCount.__table__, 'user_id', deltas)
+
+# Keep the status counters transactional with the flush that changes a
+# shipment's status, so the admin dashboard never has to count rows.
+@event.listens_for(db.session, 'after_flush')
+def _count_status_transitions(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Shipment):
+            status = obj.status or Shipment.status.default.arg
+            deltas[status] = deltas.get(status, 0) + 1
+    for obj in session.dirty:
+        if isinstance(obj, Shipment):
+            history = db.inspect(obj).attrs.status.history
+            if history.deleted and history.added:
+                deltas[history.deleted[0]] = deltas.get(history.deleted[0], 0) - 1
+                deltas[history.added[0]] = deltas.get(history.added[0], 0) + 1
+    for obj in session.deleted:
+        if isinstance(obj, Shipment):
+            history = db.inspect(obj).attrs.status.history
+            status = (history.deleted or history.unchanged or [None])[0]
+            deltas[status] = deltas.get(status, 0) - 1
+    apply_status_deltas(session.connection(), deltas)
+
+def shipment_status_counts():
+    """Current shipment count per status, read from the maintained counters"""
+    return {row.status: row.count for row in db.read_session.query(ShipmentStatusCount)}
+
+def rebuild_status_counts():
+    """Recompute the status counters from the shipment table with one grouped aggregate"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        # Writers touching the counters wait until the rebuilt values commit
+        connection.execute(db.text('LOCK TABLE shipment_status_count IN EXCLUSIVE MODE'))
+    ShipmentStatusCount.query.delete()
+    counts = db.session.query(Shipment.status, func.count(Shipment.id))\
+        .filter(Shipment.status.isnot(None))\
+        .group_by(Shipment.status)\
+        .all()
+    db.session.add_all(ShipmentStatusCount(status=status, count=count) for status, count in counts)
+    db.session.commit()
+    return dict(counts)
+
+@app.cli.command('rebuild-status-counts')
+def rebuild_status_counts_command():
+    """Resync the per-status shipment counters with the shipment table"""
+    counts = rebuild_status_counts()
+    print(f'Status counters rebuilt: {sum(counts.values())} shipments in {len(counts)} statuses')
+
+def serialize_tracking(shipment, events):
+    """Build the public tracking payload for a shipment"""
+    return {
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'last_event_id': max((event.id for event in events), default=None),
+        'sender': shipment.sender_name,
+        'receiver': shipment.receiver_name,
+        'pickup_address': shipment.pickup_address,
+        'delivery_address': shipment.delivery_address,
+        'created_at': shipment.created_at.isoformat(),
+        'weight': shipment.weight,
+        'description': shipment.description,
+        'tracking_events': [event.to_dict() for event in events]
+    }
+
+class NotificationOutbox(db.Model):
+    """Customer notifications waiting to be dispatched by the background workers"""
+    __table_args__ = (
+        db.Index('ix_notification_outbox_pending', 'dispatched_at', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    shipment_id = db.Column(db.Integer, db.ForeignKey('shipment.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tracking_number = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    location = db.Column(db.String(200))
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_until = db.Column(db.DateTime)
+    dispatched_at = db.Column(db.DateTime)
+    failed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+# Session user cache: authenticated requests rebuild current_user from a
+# cached snapshot instead of querying the users table. The password hash is
+# never cached. Entries of changed or deleted users are dropped after commit,
+# but only in this process; with a per-process backend other workers keep
+# theirs until USER_CACHE_TTL. Admins are therefore never cached, so a
+# revoked admin loses access on the next request in every worker; a
+# promotion may take up to USER_CACHE_TTL to reach them all.
+USER_CACHE_FIELDS = ('id', 'email', 'name', 'phone', 'is_admin')
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        user = User(**json.loads(cached))
+        make_transient_to_detached(user)
+        return user
+    user = db.read_session.query(User).get(int(user_id))
+    if user is not None and not user.is_admin:
+        user_cache.set(user_id, json.dumps({field: getattr(user, field) for field in USER_CACHE_FIELDS}).encode('utf-8'))
+    return user
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            session.info.setdefault('changed_user_ids', set()).add(str(obj.id))
+
+def mark_user_changed(user_id):
+    """Record a user change made with a bulk statement that bypasses the ORM flush"""
+    db.session().info.setdefault('changed_user_ids', set()).add(str(user_id))
+
+@event.listens_for(db.session, 'after_commit')
+def _after_user_commit(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        user_cache.invalidate_many(changed)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('changed_user_ids', None)
 
 # Routes
 @app.route('/')
+@page_cache.page
 def home():
     return render_template('index.html')
 
+def tracking_validators(tracking_number):
+    """Fetch what the tracking validators are derived from in a single query.
+    
+    Returns None when the shipment does not exist, otherwise a row with the
+    shipment id, status, updated_at, its latest event timestamp and id, and
+    how many of its events are archived.
+    """
+    return tracking_validators_query(tracking_number).first()
+
+def tracking_validators_query(tracking_number):
+    # Live events are always newer than archived ones
+    return db.read_session.query(
+            Shipment.id,
+            Shipment.status,
+            Shipment.updated_at,
+            func.coalesce(func.max(TrackingEvent.timestamp),
+                          func.max(TrackingEventArchive.last_event_at)).label('last_event_at'),
+            func.coalesce(func.max(TrackingEvent.id),
+                          func.max(TrackingEventArchive.last_event_id)).label('last_event_id'),
+            func.max(TrackingEventArchive.event_count).label('archived_events'))\
+        .outerjoin(TrackingEvent, TrackingEvent.shipment_id == Shipment.id)\
+        .outerjoin(TrackingEventArchive, TrackingEventArchive.shipment_id == Shipment.id)\
+        .filter(Shipment.tracking_number == tracking_number)\
+        .group_by(Shipment.id)
+
+def tracking_etag(tracking_number, validators, variant=''):
+    """Strong ETag for one representation of a shipment's tracking state"""
+    state = f'{tracking_number}:{validators.updated_at}:{validators.last_event_at}:' \
+            f'{validators.last_event_id}:{variant}'
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()
+
+def tracking_last_modified(validators):
+    """Last-Modified for a shipment, truncated to HTTP-date resolution"""
+    last_modified = max(filter(None, [validators.updated_at, validators.last_event_at]))
+    return last_modified.replace(microsecond=0)
+
+def is_not_modified(etag, last_modified):
+    """Evaluate If-None-Match / If-Modified-Since against current validators"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def conditional_response(body, etag, last_modified, status=200):
+    """JSON response carrying validators; clients must revalidate before reuse"""
+    if body is None:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def parse_since():
+    """Return the ?since=<event_id> cursor, None if absent, or raise ValueError"""
+    since = request.args.get('since')
+    if since is None:
+        return None
+    since = int(since)
+    if since < 0:
+        raise ValueError(since)
+    return since
+
+def event_order(event):
+    return (event.timestamp or datetime.min, event.id)
+
+def archived_events(shipment_ids):
+    """Archived tracking events by shipment id, latest first
+    
+    The events are transient TrackingEvent objects, so they serialize and
+    render like live ones; they are never added to a session.
+    """
+    history = {}
+    rows = db.read_session.query(TrackingEventArchive.shipment_id, TrackingEventArchive.events)\
+        .filter(TrackingEventArchive.shipment_id.in_(shipment_ids))
+    for shipment_id, blob in rows:
+        events = [TrackingEvent(shipment_id=shipment_id, **event)
+                  for event in archive.unpack_events(blob)]
+        history[shipment_id] = sorted(events, key=event_order, reverse=True)
+    return history
+
+def events_since(shipment_id, since, archived=True):
+    """Tracking events newer than the given event id, latest first
+    
+    Archived events are merged in unless ``archived`` is False, which
+    callers pass when the validators show the shipment has none.
+    """
+    events = db.read_session.query(TrackingEvent)\
+        .filter(TrackingEvent.shipment_id == shipment_id, TrackingEvent.id > since)\
+        .order_by(desc(TrackingEvent.timestamp))\
+        .all()
+    if archived:
+        events += [event for event in archived_events([shipment_id]).get(shipment_id, [])
+                   if event.id > since]
+        events.sort(key=event_order, reverse=True)
+    return events
+
+def replay_frames(channels, last_event_id):
+    """Tracking frames committed after ``last_event_id``, oldest first
+    
+    Only the latest LIVE_UPDATES_REPLAY_LIMIT are returned; a client that
+    missed more reloads the full history anyway.
+    """
+    shipments = db.read_session.query(Shipment.id, Shipment.tracking_number, Shipment.status)\
+        .filter(Shipment.tracking_number.in_(channels))
+    missed = []
+    for shipment_id, tracking_number, status in shipments:
+        missed.extend((event.id, tracking_number, status, event)
+                      for event in events_since(shipment_id, last_event_id))
+    missed.sort(key=lambda item: item[0])
+    return [tracking_frame(tracking_number, status, event.to_dict())
+            for event_id, tracking_number, status, event
+            in missed[-app.config['LIVE_UPDATES_REPLAY_LIMIT']:]]
+
+# Abuse protection for the public tracking endpoints: requests are metered
+# before they reach the database, and unknown tracking numbers are
+# remembered so that enumerating the number space costs one query per miss.
+def client_ip():
+    """The client address, taken from X-Forwarded-For behind trusted proxies"""
+    proxies = app.config['RATE_LIMIT_TRUSTED_PROXIES']
+    route = request.access_route
+    if proxies and request.headers.get('X-Forwarded-For') and len(route) >= proxies:
+        return route[-proxies]
+    return request.remote_addr or 'unknown'
+
+def rate_limit_response(cost=1):
+    """A 401/429 response if the client may not make this request now, else None"""
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return None
+    api_key = request.headers.get('X-API-Key')
+    if api_key and not rate_limiter.is_valid_key(api_key):
+        rate_limiter.reject_invalid_key()
+        return jsonify({'status': 'error', 'message': 'Invalid API key'}), 401
+    decision = rate_limiter.check(client_ip(), api_key, cost)
+    if decision.allowed:
+        return None
+    response = jsonify({'status': 'error', 'message': 'Too many requests, please retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(decision.retry_after)))
+    response.headers['X-RateLimit-Limit'] = str(decision.limit)
+    response.headers['X-RateLimit-Remaining'] = str(decision.remaining)
+    return response
+
+def rate_limited(view):
+    """Charge one token per request to the client's bucket before running ``view``"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return rate_limit_response() or view(*args, **kwargs)
+    return wrapper
+
+def tracking_not_found(tracking_number):
+    tracking_misses.set(tracking_number, b'1')
+    return jsonify({
+        'status': 'not_found',
+        'message': 'No shipment found with this tracking number'
+    }), 404
+
+@app.route('/admin/rate-limit/stats', methods=['GET'])
+@login_required
+def rate_limit_stats():
+    """Served/rejected counters of the tracking rate limiter and the not-found cache"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify({'rate_limit': rate_limiter.stats(), 'not_found_cache': tracking_misses.stats()})
+
 # API endpoint to get tracking information
 @app.route('/api/track/<tracking_number>', methods=['GET'])
+@rate_limited
 def get_tracking(tracking_number):
-    """API endpoint to get tracking information for a shipment"""
+    """API endpoint to get tracking information for a shipment
+    
+    Responses carry a strong ETag and Last-Modified; a matching conditional
+    request is answered with 304 before any tracking events are loaded.
+    ``?since=<event_id>`` returns a compact payload with only newer events.
+    """
     if not tracking_number:
         return jsonify({
             'status': 'error',
             'message': 'Tracking number is required'
         }), 400
     
-    shipment = Shipment.query.filter_by(tracking_number=tracking_number).first()
-    
-    if not shipment:
+    try:
+        since = parse_since()
+    except ValueError:
         return jsonify({
-            'status': 'not_found',
-            'message': 'No shipment found with this tracking number'
-        }), 404
+            'status': 'error',
+            'message': 'since must be a non-negative event id'
+        }), 400
     
-    # Get tracking events
-    tracking_events = [event.to_dict() for event in shipment.tracking_events]
+    if tracking_numbers.is_mistyped(tracking_number) or \
+            tracking_misses.get(tracking_number) is not None:
+        return tracking_not_found(tracking_number)
     
-    # Format the response
-    shipment_data = {
-        'tracking_number': shipment.tracking_number,
-        'status': shipment.status,
-        'sender': shipment.sender_name,
-        'receiver': shipment.receiver_name,
-        'pickup_address': shipment.pickup_address,
-        'delivery_address': shipment.delivery_address,
-        'created_at': shipment.created_at.isoformat(),
-        'weight': shipment.weight,
-        'description': shipment.description,
-        'tracking_events': tracking_events
-    }
+    if since is None:
+        cached = tracking_cache.get(tracking_number)
+        if cached is not None:
+            cached = CachedResponse.from_bytes(cached)
+            if is_not_modified(cached.etag, cached.last_modified):
+                return conditional_response(None, cached.etag, cached.last_modified)
+            return conditional_response(cached.body, cached.etag, cached.last_modified)
     
-    return jsonify({
+    validators = tracking_validators(tracking_number)
+    
+    if not validators:
+        return tracking_not_found(tracking_number)
+    
+    etag = tracking_etag(tracking_number, validators,
+                         variant='' if since is None else f'since={since}')
+    last_modified = tracking_last_modified(validators)
+    if is_not_modified(etag, last_modified):
+        return conditional_response(None, etag, last_modified)
+    
+    if since is not None:
+        # Compact delta: only what a poller needs to update its timeline
+        events = events_since(validators.id, since, archived=bool(validators.archived_events))
+        body = json.dumps({
+            'status': 'success',
+            'data': {
+                'tracking_number': tracking_number,
+                'status': validators.status,
+                'last_event_id': validators.last_event_id,
+                'tracking_events': [event.to_dict() for event in events]
+            }
+        }).encode('utf-8')
+        return conditional_response(body, etag, last_modified)
+    
+    shipment = db.read_session.query(Shipment).get(validators.id)
+    events = events_since(shipment.id, 0, archived=bool(validators.archived_events))
+    
+    # Serialize once and keep the encoded body for subsequent requests
+    body = json.dumps({
         'status': 'success',
-        'data': shipment_data
-    })
+        'data': serialize_tracking(shipment, events)
+    }).encode('utf-8')
+    tracking_cache.set(tracking_number, CachedResponse(etag, last_modified, body).to_bytes())
+    
+    return conditional_response(body, etag, last_modified)
 
 @app.route('/api/track/<tracking_number>/events', methods=['GET'])
+@rate_limited
 def get_tracking_events(tracking_number):
-    """API endpoint to get tracking events for a shipment"""
+    """API endpoint to get tracking events for a shipment
+    
+    Supports the same validators and ``?since=<event_id>`` delta mode as
+    get_tracking.
+    """
     if not tracking_number:
         return jsonify({'error': 'Tracking number is required'}), 400
     
-    shipment = Shipment.query.filter_by(tracking_number=tracking_number).first()
-    if not shipment:
+    try:
+        since = parse_since()
+    except ValueError:
+        return jsonify({'error': 'since must be a non-negative event id'}), 400
+    
+    if tracking_numbers.is_mistyped(tracking_number) or \
+            tracking_misses.get(tracking_number) is not None:
+        return jsonify({'error': 'Shipment not found'}), 404
+    validators = tracking_validators(tracking_number)
+    if not validators:
+        tracking_misses.set(tracking_number, b'1')
         return jsonify({'error': 'Shipment not found'}), 404
     
-    events = [event.to_dict() for event in shipment.tracking_events]
-    return jsonify(events)
+    etag = tracking_etag(tracking_number, validators, variant=f'events:since={since}')
+    last_modified = tracking_last_modified(validators)
+    if is_not_modified(etag, last_modified):
+        return conditional_response(None, etag, last_modified)
+    
+    events = events_since(validators.id, since or 0, archived=bool(validators.archived_events))
+    body = json.dumps([event.to_dict() for event in events]).encode('utf-8')
+    return conditional_response(body, etag, last_modified)
+
+@app.route('/api/track/batch', methods=['POST'])
+def get_tracking_batch():
+    """API endpoint to look up many shipments in one request
+    
+    Expects ``{"tracking_numbers": [...]}`` and streams one JSON object per
+    line (JSON Lines) in request order, including not_found entries. All
+    shipments are resolved with one IN query and their events with one more.
+    The request costs one rate limit token per RATE_LIMIT_BATCH_NUMBERS_PER_TOKEN
+    tracking numbers.
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('tracking_numbers'), list):
+        return jsonify({'error': 'tracking_numbers must be a list'}), 400
+    
+    limit = app.config['TRACKING_BATCH_LIMIT']
+    requested = list(dict.fromkeys(str(n).strip() for n in data['tracking_numbers']))
+    if len(requested) > limit:
+        return jsonify({'error': f'At most {limit} tracking numbers per request'}), 413
+    
+    rejected = rate_limit_response(
+        cost=max(1, math.ceil(len(requested) / app.config['RATE_LIMIT_BATCH_NUMBERS_PER_TOKEN'])))
+    if rejected:
+        return rejected
+    
+    lookup = [number for number in requested
+              if not tracking_numbers.is_mistyped(number) and tracking_misses.get(number) is None]
+    shipments = {
+        shipment.tracking_number: shipment
+        for shipment in db.read_session.query(Shipment)
+            .filter(Shipment.tracking_number.in_(lookup))
+    } if lookup else {}
+    for number in lookup:
+        if number not in shipments:
+            tracking_misses.set(number, b'1')
+    events_by_shipment = {}
+    if shipments:
+        events = db.read_session.query(TrackingEvent)\
+            .filter(TrackingEvent.shipment_id.in_([s.id for s in shipments.values()]))\
+            .order_by(TrackingEvent.shipment_id, desc(TrackingEvent.timestamp))
+        for event in events:
+            events_by_shipment.setdefault(event.shipment_id, []).append(event)
+        for shipment_id, archived in archived_events([s.id for s in shipments.values()]).items():
+            events_by_shipment[shipment_id] = sorted(
+                events_by_shipment.get(shipment_id, []) + archived, key=event_order, reverse=True)
+    
+    def generate():
+        for tracking_number in requested:
+            shipment = shipments.get(tracking_number)
+            if shipment is None:
+                line = {'tracking_number': tracking_number, 'status': 'not_found'}
+            else:
+                line = {
+                    'tracking_number': tracking_number,
+                    'status': 'success',
+                    'data': serialize_tracking(shipment, events_by_shipment.get(shipment.id, []))
+                }
+            yield json.dumps(line) + '\n'
+    
+    return app.response_class(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/track/stream', methods=['GET'])
+@rate_limited
+def stream_tracking():
+    """Server-sent event stream of new tracking events
+    
+    Subscribe with ``?tracking_numbers=SC1,SC2`` (or repeated
+    ``tracking_number`` parameters). Each committed TrackingEvent for those
+    shipments is sent as a ``tracking`` event with the event id; a client
+    reconnecting with ``Last-Event-ID`` first gets the events it missed.
+    Idle streams get a comment line every LIVE_UPDATES_HEARTBEAT seconds.
+    Each open stream holds a
+    request thread, so at most LIVE_UPDATES_MAX_BLOCKING_STREAMS are served
+    per process; large deployments route this path to live_asgi instead.
+    """
+    try:
+        channels = parse_channels(request.args.getlist('tracking_numbers') +
+                                  request.args.getlist('tracking_number'),
+                                  app.config['LIVE_UPDATES_MAX_CHANNELS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        subscription = live_hub.subscribe(channels)
+    except HubFull:
+        return jsonify({'error': 'Too many live connections, please retry later'}), 503
+    
+    heartbeat = app.config['LIVE_UPDATES_HEARTBEAT']
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID'))
+    try:
+        missed = replay_frames(channels, last_event_id) if last_event_id is not None else []
+    except Exception:
+        subscription.close()
+        raise
+    replayed = {frame_id(frame) for frame in missed}
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            yield from missed
+            while True:
+                frame = subscription.get(timeout=heartbeat)
+                # Subscribed before the replay, so an event can arrive both ways
+                if frame is not None and replayed and frame_id(frame) in replayed:
+                    continue
+                yield ': keep-alive\n\n' if frame is None else frame
+        except SubscriptionClosed:
+            pass
+        finally:
+            subscription.close()
+    
+    return app.response_class(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/api/track/<tracking_number>/update', methods=['POST'])
 @login_required
@@ -179,12 +853,15 @@ def update_tracking(tracking_number):
     if not data or 'status' not in data:
         return jsonify({'error': 'Status is required'}), 400
     
+    if tracking_numbers.is_mistyped(tracking_number):
+        return jsonify({'error': 'Shipment not found'}), 404
     shipment = Shipment.query.filter_by(tracking_number=tracking_number).first()
     if not shipment:
         return jsonify({'error': 'Shipment not found'}), 404
     
     # Update shipment status
     shipment.status = data['status']
+    shipment.updated_at = datetime.utcnow()
     
     # Create new tracking event
     event = TrackingEvent(
@@ -195,6 +872,8 @@ def update_tracking(tracking_number):
     )
     
     db.session.add(event)
+    if data.get('notify_customer'):
+        enqueue_shipment_notification(shipment, data['status'], event.location, event.description)
     db.session.commit()
     
     return jsonify({
@@ -203,22 +882,189 @@ def update_tracking(tracking_number):
         'event': event.to_dict()
     })
 
+@app.route('/admin/cache/stats', methods=['GET'])
+@login_required
+def tracking_cache_stats():
+    """Hit/miss/eviction counters for the tracking response cache"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(tracking_cache.stats())
+
+def insert_events(connection, rows):
+    """Insert tracking event rows and return the ids they were given
+    
+    Where the dialect has RETURNING all rows go in one statement that
+    returns the ids. Elsewhere (SQLite) each row is inserted on its own and
+    its id read from the cursor, so the ids are right whether or not
+    transactions start with BEGIN IMMEDIATE; within one transaction that
+    costs about as much as an executemany.
+    """
+    table = TrackingEvent.__table__
+    if getattr(connection.dialect, 'full_returning', False):
+        return [row.id for row in connection.execute(table.insert().values(rows).returning(table.c.id))]
+    return [connection.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+def ingest_scan_chunk(chunk, user_id):
+    """Write one chunk of parsed scans and commit it
+    
+    Tracking numbers are resolved in one query, events are inserted with a
+    single executemany and each shipment is updated once, from its latest
+    scan. Returns ``(accepted, ids of the shipments updated, errors)``.
+    """
+    errors = []
+    numbers = {scan['tracking_number'] for _, scan in chunk}
+    shipments = {
+        row.tracking_number: row
+        for row in db.session.query(Shipment.id, Shipment.tracking_number, Shipment.status,
+                                    Shipment.updated_at)
+            .filter(Shipment.tracking_number.in_(numbers))
+    }
+    
+    now = datetime.utcnow()
+    event_rows = []
+    latest = {}
+    for line_no, scan in chunk:
+        shipment = shipments.get(scan['tracking_number'])
+        if shipment is None:
+            errors.append({'line': line_no, 'error': 'Shipment not found'})
+            continue
+        event_rows.append({
+            'shipment_id': shipment.id,
+            'status': scan['status'],
+            'location': scan['location'],
+            'description': scan['description'],
+            'timestamp': scan['timestamp'] or now,
+            'user_id': user_id
+        })
+        current = latest.get(shipment.id)
+        if current is None or event_rows[-1]['timestamp'] >= current['timestamp']:
+            latest[shipment.id] = event_rows[-1]
+    
+    if not event_rows:
+        return 0, set(), errors
+    
+    # Out-of-order feeds must not move a shipment back to an older status
+    status_rows = []
+    status_deltas = {}
+    for shipment in shipments.values():
+        scan = latest.get(shipment.id)
+        if scan is None or (shipment.updated_at and scan['timestamp'] < shipment.updated_at):
+            continue
+        status_rows.append({'_id': shipment.id, '_status': scan['status'],
+                            '_updated_at': scan['timestamp']})
+        if scan['status'] != shipment.status:
+            status_deltas[shipment.status] = status_deltas.get(shipment.status, 0) - 1
+            status_deltas[scan['status']] = status_deltas.get(scan['status'], 0) + 1
+    
+    try:
+        # Rebuild each shipment's search document once, not once per scan
+        search.defer_refresh(db.session.connection(), list(latest))
+        event_ids = insert_events(db.session.connection(), event_rows)
+        search.refresh_deferred(db.session.connection(), list(latest))
+        if status_rows:
+            apply_status_deltas(db.session.connection(), status_deltas)
+            shipment_table = Shipment.__table__
+            db.session.execute(
+                shipment_table.update()
+                    .where(shipment_table.c.id == bindparam('_id'))
+                    .values(status=bindparam('_status'), updated_at=bindparam('_updated_at')),
+                status_rows)
+        record_event_rollups(db.session.connection(), TrackingEvent.id.in_(event_ids))
+        mark_tracking_changed(number for number, s in shipments.items() if s.id in latest)
+        
+        # Read back the inserted events for live subscribers, still inside the chunk's transaction
+        numbers_by_id = {shipment.id: number for number, shipment in shipments.items()}
+        statuses = {shipment.id: shipment.status for shipment in shipments.values()}
+        statuses.update((row['_id'], row['_status']) for row in status_rows)
+        inserted = TrackingEvent.query\
+            .filter(TrackingEvent.id.in_(event_ids))\
+            .order_by(TrackingEvent.id)
+        for event in inserted:
+            queue_live_event(db.session(), numbers_by_id[event.shipment_id],
+                             statuses[event.shipment_id], event.to_dict())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f'Error ingesting scan chunk: {str(e)}')
+        errors.extend({'line': line_no, 'error': 'Database error'}
+                      for line_no, scan in chunk if scan['tracking_number'] in shipments)
+        return 0, set(), errors
+    
+    return len(event_rows), {row['_id'] for row in status_rows}, errors
+
+@app.route('/api/track/ingest', methods=['POST'])
+@login_required
+def ingest_tracking():
+    """Bulk-ingest scan events from a JSON Lines or CSV feed
+    
+    The feed is sent either as the request body (application/x-ndjson or
+    text/csv) or as a multipart upload in the ``file`` field. Lines that
+    fail validation or reference unknown shipments are reported back
+    without aborting the rest of the batch, as are lines that are not
+    UTF-8: chunks commit as they go, so the summary must cover every line.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    upload = request.files.get('file')
+    if upload:
+        fmt = detect_format(upload.mimetype, upload.filename)
+        stream = upload.stream
+    else:
+        fmt = detect_format(request.mimetype)
+        stream = request.stream
+    if fmt is None:
+        return jsonify({'error': 'Feed must be JSON Lines or CSV'}), 415
+    
+    chunk_size = request.args.get('chunk_size', app.config['INGEST_CHUNK_SIZE'], type=int)
+    if chunk_size < 1:
+        return jsonify({'error': 'chunk_size must be positive'}), 400
+    
+    summary = {'accepted': 0, 'rejected': 0, 'shipments_updated': 0, 'errors': []}
+    # A shipment scanned in several chunks is still one shipment updated
+    updated_ids = set()
+    for lines in chunked(iter_scans(stream, fmt), chunk_size):
+        chunk = []
+        for line_no, scan, error in lines:
+            if error:
+                summary['errors'].append({'line': line_no, 'error': error})
+            else:
+                chunk.append((line_no, scan))
+        if chunk:
+            accepted, updated, errors = ingest_scan_chunk(chunk, current_user.id)
+            summary['accepted'] += accepted
+            updated_ids |= updated
+            summary['errors'].extend(errors)
+    summary['shipments_updated'] = len(updated_ids)
+    summary['errors'].sort(key=lambda error: error['line'])
+    summary['rejected'] = len(summary['errors'])
+    
+    return jsonify({'status': 'success', **summary})
+
 # Track page route
 @app.route('/track', methods=['GET'])
+@rate_limited
+@page_cache.page
 def track():
     """Render the tracking page"""
     tracking_number = request.args.get('tracking_number', '').strip()
-    return render_template('track.html', tracking_number=tracking_number)
+    return render_template('track.html',
+                         tracking_number=tracking_number,
+                         live_stream_url=app.config['LIVE_UPDATES_STREAM_URL'],
+                         poll_interval=app.config['LIVE_UPDATES_POLL_INTERVAL'])
 
 @app.route('/services')
+@page_cache.page
 def services():
     return render_template('services.html')
 
 @app.route('/about')
+@page_cache.page
 def about():
     return render_template('about.html')
 
 @app.route('/contact', methods=['GET', 'POST'])
+@page_cache.page
 def contact():
     if request.method == 'POST':
         # Handle contact form submission
@@ -231,9 +1077,27 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        user = User.query.filter_by(email=email).first()
-        
-        if user and check_password_hash(user.password, password):
+        # Look the user up outside the write session so no transaction is
+        # held open while the hash is checked
+        user = db.read_session.query(User).filter_by(email=email).first()
+        db.read_session.remove()
+
+        try:
+            valid = user is not None and passwords.verify(user.password, password)
+        except HashingBusy:
+            flash('Too many sign-in attempts right now. Please try again in a moment.', 'warning')
+            return render_template('login.html'), 503
+        if valid:
+            if passwords.needs_rehash(user.password):
+                try:
+                    rehashed = passwords.hash(password)
+                except HashingBusy:
+                    rehashed = None  # upgrade on a later sign-in
+                if rehashed is not None:
+                    User.query.filter_by(id=user.id, password=user.password) \
+                        .update({'password': rehashed}, synchronize_session=False)
+                    mark_user_changed(user.id)
+                    db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page or url_for('dashboard'))
@@ -248,30 +1112,54 @@ def register():
         name = request.form.get('name')
         phone = request.form.get('phone')
         
-        if User.query.filter_by(email=email).first():
+        # Check on the read session and hash before the write session
+        # starts, so a taken email costs no hash and no transaction waits on it
+        taken = db.read_session.query(User.id).filter_by(email=email).first() is not None
+        db.read_session.remove()
+        if taken:
             flash('Email already registered', 'danger')
             return redirect(url_for('register'))
-            
-        hashed_password = generate_password_hash(password, method='sha256')
+        try:
+            hashed_password = passwords.hash(password)
+        except HashingBusy:
+            flash('We are busy right now. Please try again in a moment.', 'warning')
+            return render_template('register.html'), 503
+        
         new_user = User(email=email, password=hashed_password, name=name, phone=phone)
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Registered by a concurrent request since the check
+            db.session.rollback()
+            flash('Email already registered', 'danger')
+            return redirect(url_for('register'))
         
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('login'))
     return render_template('register.html')
 
+def allocation_connection():
+    """The session's connection when a block reservation would wait on the session itself
+    
+    db.session transactions on SQLite start with BEGIN IMMEDIATE and hold the
+    database's only write lock, so once one is open the allocator has to
+    reserve inside it rather than on a connection of its own.
+    """
+    session = db.session()
+    if db.engine.dialect.name == 'sqlite' and session.in_transaction():
+        return session.connection()
+    return None
+
 def generate_tracking_number():
-    """Generate a unique tracking number in format SCYYMMDDXXXXX"""
-    date_str = datetime.utcnow().strftime('%y%m%d')
-    random_str = ''.join(random.choices(string.digits, k=5))
-    return f'SC{date_str}{random_str}'
+    """Allocate a unique tracking number, by default SCYYMMDD + 8-digit sequence + check digit"""
+    return tracking_numbers.allocate(allocation_connection())
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
     # Get user's shipments
-    shipments = Shipment.query.filter_by(user_id=current_user.id).order_by(Shipment.created_at.desc()).limit(5).all()
+    shipments = db.read_session.query(Shipment).filter_by(user_id=current_user.id).order_by(Shipment.created_at.desc()).limit(5).all()
     return render_template('dashboard.html', shipments=shipments)
 
 @app.route('/admin/dashboard')
@@ -281,32 +1169,214 @@ def admin_dashboard():
     if not current_user.is_admin:
         abort(403)  # Forbidden
     
-    # Get statistics for the admin dashboard
+    # Get statistics for the admin dashboard from the maintained counters
+    counts = shipment_status_counts()
     stats = {
-        'total_shipments': Shipment.query.count(),
-        'in_transit': Shipment.query.filter_by(status='In Transit').count(),
-        'out_for_delivery': Shipment.query.filter_by(status='Out for Delivery').count(),
-        'delivered': Shipment.query.filter_by(status='Delivered').count(),
-        'pending': Shipment.query.filter_by(status='Processing').count(),
-        'exceptions': Shipment.query.filter_by(status='Exception').count(),
+        'total_shipments': sum(counts.values()),
+        'in_transit': counts.get('In Transit', 0),
+        'out_for_delivery': counts.get('Out for Delivery', 0),
+        'delivered': counts.get('Delivered', 0),
+        'pending': counts.get('Processing', 0),
+        'exceptions': counts.get('Exception', 0),
     }
     
-    # Get recent shipments
-    recent_shipments = Shipment.query\
-        .order_by(Shipment.updated_at.desc())\
-        .limit(10)\
-        .all()
+    # Recent shipments table, re-rendered only when the data behind it changes
+    def render_recent_shipments():
+        recent_shipments = db.read_session.query(Shipment)\
+            .options(selectinload(Shipment.tracking_events))\
+            .order_by(Shipment.updated_at.desc())\
+            .limit(10)\
+            .all()
+        return render_template('admin/recent_shipments.html',
+                               stats=stats,
+                               recent_shipments=recent_shipments)
     
-    # Get recent tracking events
-    recent_events = TrackingEvent.query\
-        .order_by(TrackingEvent.timestamp.desc())\
-        .limit(10)\
-        .all()
+    version = ':'.join(str(value) for value in dashboard_data_version_query().one())
+    recent_shipments_html = page_cache.fragment('admin-recent-shipments',
+                                                f"{version}:{stats['total_shipments']}",
+                                                render_recent_shipments)
     
     return render_template('admin/dashboard.html',
                          stats=stats,
-                         recent_shipments=recent_shipments,
-                         recent_events=recent_events)
+                         recent_shipments_html=recent_shipments_html)
+
+def dashboard_data_version_query():
+    """Latest shipment update, shipment id and event id, read in one statement.
+
+    Any new shipment, status change or new event moves one of them; other
+    changes show up once the fragment's PAGE_CACHE_TTL runs out.
+    """
+    return db.read_session.query(
+        db.read_session.query(func.max(Shipment.updated_at)).scalar_subquery(),
+        db.read_session.query(func.max(Shipment.id)).scalar_subquery(),
+        db.read_session.query(func.max(TrackingEvent.id)).scalar_subquery())
+
+SHIPMENT_SORTS = {
+    'updated_at': Shipment.updated_at,
+    'created_at': Shipment.created_at,
+}
+
+def parse_date_bound(value, end=False):
+    """Parse a from/to filter; a bare date as upper bound covers that whole day"""
+    bound = parse_timestamp(value)
+    if end and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
+
+def shipment_page(args, user_id=None):
+    """One keyset page of shipments matching the listing filters in ``args``
+    
+    ``user_id`` restricts the listing to one customer's shipments. Returns
+    ``(shipments, next_cursor, sort)``; raises ValueError on bad parameters.
+    """
+    sort = args.get('sort', 'updated_at')
+    if sort not in SHIPMENT_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SHIPMENT_SORTS)}")
+    sort_column = SHIPMENT_SORTS[sort]
+    
+    try:
+        limit = int(args.get('limit', app.config['SHIPMENT_PAGE_SIZE']))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= app.config['SHIPMENT_PAGE_SIZE_MAX']:
+        raise ValueError(f"limit must be between 1 and {app.config['SHIPMENT_PAGE_SIZE_MAX']}")
+    
+    query = db.read_session.query(Shipment)
+    if user_id is None and args.get('user_id'):
+        try:
+            user_id = int(args['user_id'])
+        except ValueError:
+            raise ValueError('user_id must be an integer')
+    if user_id is not None:
+        query = query.filter(Shipment.user_id == user_id)
+    
+    statuses = [status.strip() for value in args.getlist('status')
+                for status in value.split(',') if status.strip()]
+    if len(statuses) == 1:
+        query = query.filter(Shipment.status == statuses[0])
+    elif statuses:
+        query = query.filter(Shipment.status.in_(statuses))
+    
+    if args.get('from'):
+        query = query.filter(sort_column >= parse_date_bound(args['from']))
+    if args.get('to'):
+        query = query.filter(sort_column < parse_date_bound(args['to'], end=True))
+    if args.get('sender'):
+        query = query.filter(Shipment.sender_name.ilike(f"%{args['sender']}%"))
+    if args.get('receiver'):
+        query = query.filter(Shipment.receiver_name.ilike(f"%{args['receiver']}%"))
+    
+    after = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+    shipments, next_key = keyset_page(query, sort_column, Shipment.id, limit, after)
+    next_cursor = encode_cursor(sort, *next_key) if next_key else None
+    return shipments, next_cursor, sort
+
+def serialize_shipment_summary(shipment):
+    """Listing row for a shipment, without its tracking events"""
+    return {
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'sender': shipment.sender_name,
+        'receiver': shipment.receiver_name,
+        'pickup_address': shipment.pickup_address,
+        'delivery_address': shipment.delivery_address,
+        'user_id': shipment.user_id,
+        'created_at': shipment.created_at.isoformat(),
+        'updated_at': shipment.updated_at.isoformat()
+    }
+
+@app.route('/api/shipments', methods=['GET'])
+@login_required
+def list_shipments():
+    """Keyset-paginated shipment listing
+    
+    Filters: status (repeatable or comma-separated), user_id (admins only),
+    from/to on the sort column, sender and receiver name. Follow
+    ``next_cursor`` with ``?cursor=`` for the next page.
+    """
+    user_id = None if current_user.is_admin else current_user.id
+    try:
+        shipments, next_cursor, sort = shipment_page(request.args, user_id=user_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'shipments': [serialize_shipment_summary(shipment) for shipment in shipments],
+        'sort': sort,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_shipments():
+    """Ranked full-text search over shipment details and tracking event locations
+    
+    ``q`` matches tracking numbers, sender/receiver names and phones,
+    addresses, descriptions and event locations; ``page`` and ``limit``
+    page through the ranked results up to SEARCH_MAX_RESULTS.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        limit = int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'page and limit must be integers'}), 400
+    max_results = app.config['SEARCH_MAX_RESULTS']
+    if page < 1 or not 1 <= limit <= max_results or page * limit > max_results:
+        return jsonify({'error': f'Only the first {max_results} results can be paged through'}), 400
+    
+    try:
+        hits = search.search_shipment_ids(db.read_session.connection(), query, limit + 1,
+                                          offset=(page - 1) * limit,
+                                          max_terms=app.config['SEARCH_MAX_TERMS'])
+    except search.SearchUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+    
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    shipments = {shipment.id: shipment for shipment in db.read_session.query(Shipment)
+                 .filter(Shipment.id.in_([hit.shipment_id for hit in hits]))}
+    results = []
+    for hit in hits:
+        shipment = shipments.get(hit.shipment_id)
+        if shipment is not None:
+            results.append(dict(serialize_shipment_summary(shipment), score=round(hit.score, 4)))
+    
+    return jsonify({
+        'query': query,
+        'page': page,
+        'results': results,
+        'next_page': page + 1 if has_more and (page + 1) * limit <= max_results else None
+    })
+
+@app.route('/admin/shipments')
+@login_required
+def admin_shipments():
+    """Browse all shipments with filters, one keyset page at a time"""
+    if not current_user.is_admin:
+        abort(403)  # Forbidden
+    
+    try:
+        shipments, next_cursor, sort = shipment_page(request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        shipments, next_cursor, sort = [], None, request.args.get('sort', 'updated_at')
+    
+    # Keep the filters when following the cursor to the next page
+    filters = {key: value for key, value in request.args.items(multi=True) if key != 'cursor'}
+    
+    return render_template('admin/shipments.html',
+                         shipments=shipments,
+                         next_cursor=next_cursor,
+                         sort=sort,
+                         filters=filters,
+                         status_options=['Processing', 'In Transit', 'Out for Delivery',
+                                         'Delivered', 'Exception'])
 
 @app.route('/shipments/create', methods=['GET', 'POST'])
 @login_required
@@ -353,21 +1423,199 @@ def create_shipment():
     
     return render_template('create_shipment.html')
 
+def manifest_result_path(import_id):
+    """Where the row-by-row result file of an import is kept"""
+    directory = app.config['MANIFEST_RESULT_DIR'] or os.path.join(app.instance_path, 'manifests')
+    return os.path.join(directory, f'{import_id}.csv')
+
+def import_manifest_chunk(chunk, user_id):
+    """Create the shipments of one chunk of valid manifest rows and commit them
+    
+    Tracking numbers are allocated for the whole chunk up front, shipments
+    and their initial tracking events go in with one executemany each.
+    Returns ``{row_no: tracking_number}``, empty if the chunk failed.
+    """
+    now = datetime.utcnow()
+    try:
+        numbers = tracking_numbers.allocate_many(len(chunk), allocation_connection())
+        db.session.execute(Shipment.__table__.insert(), [{
+            'tracking_number': number,
+            'sender_name': row['sender_name'],
+            'sender_phone': row['sender_phone'],
+            'receiver_name': row['receiver_name'],
+            'receiver_phone': row['receiver_phone'],
+            'pickup_address': row['pickup_address'],
+            'delivery_address': row['delivery_address'],
+            'weight': row['weight'],
+            'description': row['description'],
+            'status': 'Processing',
+            'created_at': now,
+            'updated_at': now,
+            'user_id': user_id
+        } for number, (_, row) in zip(numbers, chunk)])
+        shipment_ids = dict(db.session.query(Shipment.tracking_number, Shipment.id)
+                            .filter(Shipment.tracking_number.in_(numbers)))
+        db.session.execute(TrackingEvent.__table__.insert(), [{
+            'shipment_id': shipment_ids[number],
+            'status': 'Processing',
+            'location': row['pickup_address'],
+            'description': 'Shipment created and awaiting pickup',
+            'timestamp': now,
+            'user_id': user_id
+        } for number, (_, row) in zip(numbers, chunk)])
+        apply_status_deltas(db.session.connection(), {'Processing': len(chunk)})
+        record_event_rollups(db.session.connection(),
+                             TrackingEvent.shipment_id.in_(list(shipment_ids.values())))
+        mark_tracking_changed(numbers)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f'Error importing manifest chunk: {str(e)}')
+        return {}
+    
+    return {row_no: number for number, (row_no, _) in zip(numbers, chunk)}
+
+def import_manifest(stream, fmt, user_id, filename=None):
+    """Import a manifest in chunks, writing one result line per row
+    
+    Rows are streamed from ``stream`` and written in chunks of
+    MANIFEST_CHUNK_SIZE, so memory stays bounded for any file size. The
+    result file maps every row to its tracking number or error.
+    
+    No transaction is left open between chunks, so each chunk can allocate
+    its tracking numbers without waiting on this session's own lock.
+    """
+    manifest_import = ManifestImport(user_id=user_id, filename=filename, format=fmt)
+    db.session.add(manifest_import)
+    db.session.flush()
+    import_id = manifest_import.id
+    db.session.commit()
+    
+    path = manifest_result_path(import_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    status = 'completed'
+    total = created_total = 0
+    with open(path, 'w', newline='', encoding='utf-8') as result_file:
+        writer = csv.writer(result_file)
+        writer.writerow(['row', 'reference', 'tracking_number', 'error'])
+        try:
+            for rows in chunked(manifest.iter_rows(stream, fmt), app.config['MANIFEST_CHUNK_SIZE']):
+                valid = [(row_no, row) for row_no, row, error in rows if not error]
+                created = import_manifest_chunk(valid, user_id) if valid else {}
+                for row_no, row, error in rows:
+                    number = created.get(row_no)
+                    if number is None and not error:
+                        error = 'Database error'
+                    writer.writerow([row_no, row['reference'] if row else '', number or '', error or ''])
+                total += len(rows)
+                created_total += len(created)
+        except UnicodeDecodeError:
+            writer.writerow(['', '', '', 'Manifest is not valid UTF-8'])
+            status = 'failed'
+    
+    manifest_import = ManifestImport.query.get(import_id)
+    manifest_import.rows = total
+    manifest_import.created = created_total
+    manifest_import.rejected = total - created_total
+    manifest_import.status = status
+    manifest_import.finished_at = datetime.utcnow()
+    db.session.commit()
+    return manifest_import
+
+def manifest_upload():
+    """The uploaded manifest's stream, format and filename from the current request"""
+    upload = request.files.get('file')
+    if upload:
+        return upload.stream, manifest.detect_format(upload.mimetype, upload.filename), upload.filename
+    return request.stream, manifest.detect_format(request.mimetype), None
+
+@app.route('/shipments/import', methods=['GET', 'POST'])
+@login_required
+def import_shipments():
+    """Create shipments in bulk from an uploaded CSV, JSON Lines or JSON manifest"""
+    if request.method == 'POST':
+        if not request.files.get('file'):
+            flash('Please choose a manifest file to upload.', 'danger')
+            return redirect(url_for('import_shipments'))
+        stream, fmt, filename = manifest_upload()
+        if fmt is None:
+            flash('Manifests must be CSV, JSON Lines or JSON files.', 'danger')
+            return redirect(url_for('import_shipments'))
+        
+        result = import_manifest(stream, fmt, current_user.id, filename)
+        flash(f'Manifest imported: {result.created} shipments created, {result.rejected} rows rejected.',
+              'success' if result.status == 'completed' and not result.rejected else 'warning')
+        return redirect(url_for('import_shipments'))
+    
+    imports = db.read_session.query(ManifestImport)\
+        .filter_by(user_id=current_user.id)\
+        .order_by(ManifestImport.created_at.desc())\
+        .limit(10)\
+        .all()
+    return render_template('import_shipments.html', imports=imports)
+
+@app.route('/api/shipments/import', methods=['POST'])
+@login_required
+def import_shipments_api():
+    """Import a manifest sent as the request body or a multipart ``file`` field"""
+    stream, fmt, filename = manifest_upload()
+    if fmt is None:
+        return jsonify({'error': 'Manifest must be CSV, JSON Lines or JSON'}), 415
+    
+    result = import_manifest(stream, fmt, current_user.id, filename)
+    return jsonify({'status': 'success', **result.to_dict()})
+
+@app.route('/shipments/import/<int:import_id>/result')
+@login_required
+def manifest_import_result(import_id):
+    """Download the row-by-row result file of a manifest import"""
+    manifest_import = db.read_session.query(ManifestImport).get(import_id)
+    if manifest_import is None:
+        abort(404)
+    if not current_user.is_admin and manifest_import.user_id != current_user.id:
+        abort(403)
+    path = manifest_result_path(import_id)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name=f'manifest-{import_id}-result.csv')
+
+@app.cli.command('import-manifest')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--email', required=True, help='Merchant account that will own the shipments.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Also copy the result file here.')
+def import_manifest_command(path, email, output):
+    """Create shipments in bulk from a CSV, JSON Lines or JSON manifest"""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+    fmt = manifest.detect_format(None, path)
+    if fmt is None:
+        raise click.ClickException('Manifest must be a .csv, .jsonl, .ndjson or .json file')
+    user_id = user.id
+    db.session.commit()
+    
+    with open(path, 'rb') as stream:
+        result = import_manifest(stream, fmt, user_id, os.path.basename(path))
+    if output:
+        shutil.copyfile(manifest_result_path(result.id), output)
+    print(f'Import {result.id} {result.status}: {result.created} shipments created, '
+          f'{result.rejected} rows rejected')
+    print(f'Result file: {output or manifest_result_path(result.id)}')
+
 @app.route('/tracking/<tracking_number>')
 @login_required
 def track_shipment(tracking_number):
     """View details of a specific shipment"""
-    shipment = Shipment.query.filter_by(tracking_number=tracking_number).first_or_404()
+    shipment = db.read_session.query(Shipment).filter_by(tracking_number=tracking_number).first_or_404()
     
     # Check if the current user is the owner or an admin
     if not current_user.is_admin and shipment.user_id != current_user.id:
         flash('You do not have permission to view this shipment.', 'danger')
         return redirect(url_for('dashboard'))
     
-    # Get tracking events in chronological order
-    tracking_events = TrackingEvent.query.filter_by(shipment_id=shipment.id)\
-        .order_by(TrackingEvent.timestamp.asc())\
-        .all()
+    # Get tracking events, live and archived, in chronological order
+    tracking_events = events_since(shipment.id, 0)[::-1]
     
     return render_template('track.html', 
                          shipment=shipment, 
@@ -380,40 +1628,249 @@ def logout():
     logout_user()
     return redirect(url_for('home'))
 
-def send_shipment_notification(shipment, status, location, notes=None):
-    """Send notification to customer about shipment status update"""
-    try:
-        subject = f"Shipment {shipment.tracking_number} - Status Update: {status}"
-        
-        # In a real app, you would use a proper email template and possibly a background task
-        message = f"""
-        Your shipment {shipment.tracking_number} status has been updated to: {status}
-        
-        Location: {location}
-        
-        """
-        if notes:
-            message += f"Notes: {notes}\n\n"
-            
-        message += "Thank you for using SpeedyCourier!"
-        
-        # Log the notification (in a real app, you would send an email/SMS here)
-        current_app.logger.info(f"Notification sent for shipment {shipment.tracking_number}: {status}")
+def enqueue_shipment_notification(shipment, status, location, notes=None):
+    """Queue a customer notification; it is committed with the caller's transaction"""
+    db.session.add(NotificationOutbox(
+        shipment_id=shipment.id,
+        user_id=shipment.user_id,
+        tracking_number=shipment.tracking_number,
+        status=status,
+        location=location,
+        notes=notes
+    ))
+    db.session().info['notifications_enqueued'] = True
+
+def send_shipment_notification(entry):
+    """Send notification to customer about shipment status update
+    
+    Delivers one outbox entry and returns the Notification row to record for
+    it. Raises on delivery failure so the dispatcher can retry the entry.
+    """
+    subject = f"Shipment {entry.tracking_number} - Status Update: {entry.status}"
+    
+    # In a real app, you would use a proper email template here
+    message = f"""
+    Your shipment {entry.tracking_number} status has been updated to: {entry.status}
+    
+    Location: {entry.location}
+    
+    """
+    if entry.notes:
+        message += f"Notes: {entry.notes}\n\n"
         
-        # Create a notification record in the database
-        notification = Notification(
-            user_id=shipment.user_id,
-            title=f"Shipment {status}",
-            message=f"Your shipment {shipment.tracking_number} is now {status}",
-            shipment_id=shipment.id
-        )
-        db.session.add(notification)
+    message += "Thank you for using SpeedyCourier!"
+    
+    # Log the notification (in a real app, you would send an email/SMS here)
+    current_app.logger.info(f"Notification sent for shipment {entry.tracking_number}: {entry.status}")
+    
+    return {
+        'user_id': entry.user_id,
+        'title': f"Shipment {entry.status}",
+        'message': f"Your shipment {entry.tracking_number} is now {entry.status}",
+        'shipment_id': entry.shipment_id,
+        'is_read': False,
+        'created_at': datetime.utcnow()
+    }
+
+def dispatch_notification_batch(batch_size):
+    """Claim up to batch_size due outbox entries, deliver them and record the results"""
+    now = datetime.utcnow()
+    config = app.config
+    
+    # Claim a batch with a lease so concurrent dispatchers skip these rows
+    entries = NotificationOutbox.query\
+        .filter(NotificationOutbox.dispatched_at.is_(None),
+                NotificationOutbox.failed_at.is_(None),
+                NotificationOutbox.next_attempt_at <= now,
+                or_(NotificationOutbox.claimed_until.is_(None),
+                    NotificationOutbox.claimed_until < now))\
+        .order_by(NotificationOutbox.id)\
+        .limit(batch_size)\
+        .with_for_update(skip_locked=True)\
+        .all()
+    if not entries:
         db.session.commit()
-        
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Error sending notification: {str(e)}")
-        return False
+        return BatchResult(0, 0, 0, 0, [])
+    lease = now + timedelta(seconds=config['NOTIFICATION_DISPATCH_LEASE'])
+    for entry in entries:
+        entry.claimed_until = lease
+    db.session.commit()
+    
+    notifications = []
+    delivered = []
+    retried = failed = 0
+    for entry in entries:
+        try:
+            notifications.append(send_shipment_notification(entry))
+            delivered.append(entry)
+        except Exception as e:
+            app.logger.error(f"Error sending notification: {str(e)}")
+            entry.attempts += 1
+            entry.last_error = str(e)
+            entry.claimed_until = None
+            if entry.attempts >= config['NOTIFICATION_MAX_ATTEMPTS']:
+                entry.failed_at = datetime.utcnow()
+                failed += 1
+            else:
+                entry.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=retry_delay(entry.attempts, base=config['NOTIFICATION_RETRY_BASE']))
+                retried += 1
+    
+    dispatched_at = datetime.utcnow()
+    if notifications:
+        db.session.execute(Notification.__table__.insert(), notifications)
+        unread = {}
+        for notification in notifications:
+            unread[notification['user_id']] = unread.get(notification['user_id'], 0) + 1
+        apply_unread_deltas(db.session.connection(), unread)
+    for entry in delivered:
+        entry.dispatched_at = dispatched_at
+        entry.claimed_until = None
+    db.session.commit()
+    
+    latencies = [(dispatched_at - entry.created_at).total_seconds() for entry in delivered]
+    return BatchResult(len(entries), len(delivered), retried, failed, latencies)
+
+def notification_queue_depth():
+    """Entries still waiting to be dispatched"""
+    return db.read_session.query(func.count(NotificationOutbox.id))\
+        .filter(NotificationOutbox.dispatched_at.is_(None),
+                NotificationOutbox.failed_at.is_(None))\
+        .scalar()
+
+notification_dispatcher = NotificationDispatcher(
+    app,
+    dispatch_notification_batch,
+    notification_queue_depth,
+    workers=app.config['NOTIFICATION_DISPATCH_WORKERS'],
+    batch_size=app.config['NOTIFICATION_DISPATCH_BATCH_SIZE'],
+    poll_interval=app.config['NOTIFICATION_DISPATCH_POLL_INTERVAL']
+)
+
+@app.before_first_request
+def start_notification_dispatcher():
+    if app.config['NOTIFICATION_DISPATCH_MODE'] == 'thread':
+        notification_dispatcher.start()
+
+@app.cli.command('dispatch-notifications')
+@click.option('--once', is_flag=True, help='Drain the outbox once and exit.')
+def dispatch_notifications_command(once):
+    """Run the notification dispatcher in this process"""
+    if once:
+        print(f'Dispatched {notification_dispatcher.drain()} notifications')
+        return
+    notification_dispatcher.start()
+    try:
+        while notification_dispatcher.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        notification_dispatcher.stop()
+
+@app.route('/admin/notifications/metrics', methods=['GET'])
+@login_required
+def notification_dispatch_metrics():
+    """Queue depth, dispatch counters and latency for the notification outbox"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(notification_dispatcher.stats())
+
+# Notification inbox
+@app.route('/api/notifications', methods=['GET'])
+@login_required
+def list_notifications():
+    """Keyset-paginated notification inbox of the current user, newest first
+    
+    ``?unread=1`` lists unread notifications only. Follow ``next_cursor``
+    with ``?cursor=`` for the next page. Every ``time_ago`` in a page is
+    relative to the ``now`` returned with it.
+    """
+    try:
+        limit = int(request.args.get('limit', app.config['NOTIFICATION_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= app.config['NOTIFICATION_PAGE_SIZE_MAX']:
+        return jsonify({'error': f"limit must be between 1 and {app.config['NOTIFICATION_PAGE_SIZE_MAX']}"}), 400
+    
+    query = db.read_session.query(Notification).filter(Notification.user_id == current_user.id)
+    if request.args.get('unread') in ('1', 'true'):
+        query = query.filter(Notification.is_read == false())
+    try:
+        after = decode_cursor(request.args['cursor'], 'created_at') if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    notifications, next_key = keyset_page(query, Notification.created_at, Notification.id, limit, after)
+    
+    now = datetime.utcnow()
+    return jsonify({
+        'notifications': [notification.to_dict(now) for notification in notifications],
+        'next_cursor': encode_cursor('created_at', *next_key) if next_key else None,
+        'now': now.isoformat()
+    })
+
+@app.route('/api/notifications/unread-count', methods=['GET'])
+@login_required
+def unread_notification_count():
+    """Unread notifications of the current user, read from the maintained counter"""
+    count = db.read_session.query(NotificationUnreadCount.count)\
+        .filter(NotificationUnreadCount.user_id == current_user.id)\
+        .scalar()
+    return jsonify({'unread_count': count or 0})
+
+@app.route('/api/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Mark notifications of the current user read with a single UPDATE
+    
+    Body: ``{"ids": [...]}`` for specific notifications or ``{"all": true}``
+    for every unread one. The unread counter drops by the number of rows
+    the statement actually changed.
+    """
+    data = request.get_json(silent=True) or {}
+    table = Notification.__table__
+    stmt = table.update()\
+        .where(table.c.user_id == current_user.id, table.c.is_read == false())\
+        .values(is_read=True)
+    ids = data.get('ids')
+    if data.get('all') is not True:
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return jsonify({'error': 'ids (a list of notification ids) or all is required'}), 400
+        if len(ids) > app.config['NOTIFICATION_MARK_READ_MAX']:
+            return jsonify({'error': f"At most {app.config['NOTIFICATION_MARK_READ_MAX']} ids per request"}), 400
+        stmt = stmt.where(table.c.id.in_(ids))
+    
+    marked = db.session.execute(stmt).rowcount
+    apply_unread_deltas(db.session.connection(), {current_user.id: -marked})
+    unread = db.session.query(NotificationUnreadCount.count)\
+        .filter(NotificationUnreadCount.user_id == current_user.id)\
+        .scalar()
+    db.session.commit()
+    
+    return jsonify({'marked': marked, 'unread_count': unread or 0})
+
+# Metrics
+instrumentation.register_collector('tracking_cache', tracking_cache.stats)
+instrumentation.register_collector('tracking_misses', tracking_misses.stats)
+instrumentation.register_collector('rate_limit', rate_limiter.stats)
+instrumentation.register_collector('user_cache', user_cache.stats)
+instrumentation.register_collector('page_cache', page_cache.stats)
+instrumentation.register_collector('passwords', passwords.stats)
+instrumentation.register_collector('notifications', notification_dispatcher.stats)
+instrumentation.register_collector('live', live_hub.stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, SQL, cache and dispatcher metrics for Prometheus
+    
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``;
+    without a token configured the endpoint is for logged-in admins only.
+    """
+    token = app.config['METRICS_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'error': 'Unauthorized'}), 403
+    return app.response_class(instrumentation.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/admin/shipments/<tracking_number>/update', methods=['GET', 'POST'])
 @login_required
@@ -445,25 +1902,23 @@ def update_shipment_status(tracking_number):
             shipment.updated_at = datetime.utcnow()
         
         db.session.add(event)
-        db.session.commit()
         
-        # Send notification to customer if requested
+        # Queue the customer notification; it commits with the tracking event
         if notify_customer:
-            send_shipment_notification(
+            enqueue_shipment_notification(
                 shipment=shipment,
                 status=status,
                 location=location,
                 notes=description
             )
         
+        db.session.commit()
+        
         flash(f'Shipment status updated successfully!', 'success')
         return redirect(url_for('track_shipment', tracking_number=tracking_number))
     
-    # Get all tracking events for this shipment
-    tracking_events = TrackingEvent.query\
-        .filter_by(shipment_id=shipment.id)\
-        .order_by(TrackingEvent.timestamp.asc())\
-        .all()
+    # Get all tracking events for this shipment, live and archived
+    tracking_events = events_since(shipment.id, 0)[::-1]
     
     # Get available status options
     status_options = [
@@ -479,7 +1934,549 @@ def update_shipment_status(tracking_number):
                          tracking_events=tracking_events,
                          status_options=status_options)
 
+# Tracking event archive
+ARCHIVE_JOB = 'tracking_events'
+
+def archive_candidates(cutoff, after, limit):
+    """Delivered shipments last updated before ``cutoff``, in (updated_at, id) order
+    
+    ``after`` is the (updated_at, id) key to continue after. A shipment only
+    moves forward in this order when it is updated, so a checkpoint on it
+    never skips a shipment that becomes eligible later.
+    """
+    query = db.session.query(Shipment.id, Shipment.updated_at)\
+        .filter(Shipment.status == 'Delivered', Shipment.updated_at < cutoff)
+    if after is not None:
+        query = query.filter(tuple_(Shipment.updated_at, Shipment.id) > tuple_(*after))
+    return query.order_by(Shipment.updated_at, Shipment.id).limit(limit)
+
+def load_archive_checkpoint():
+    checkpoint = db.session.query(ArchiveCheckpoint).get(ARCHIVE_JOB)
+    if checkpoint is None or checkpoint.last_updated_at is None:
+        return None
+    return checkpoint.last_updated_at, checkpoint.last_shipment_id
+
+def save_archive_checkpoint(key):
+    checkpoint = db.session.query(ArchiveCheckpoint).get(ARCHIVE_JOB) or ArchiveCheckpoint(name=ARCHIVE_JOB)
+    checkpoint.last_updated_at, checkpoint.last_shipment_id = key
+    checkpoint.saved_at = datetime.utcnow()
+    db.session.add(checkpoint)
+
+def archive_events_batch(cutoff, after, batch_size):
+    """Move the live events of the next batch of eligible shipments into the archive
+    
+    One short transaction reads the events, merges them into each
+    shipment's archive row, deletes them by id (events written meanwhile
+    stay live) and saves the checkpoint. Returns ``(next_key, shipments,
+    events)``; ``next_key`` is None once no eligible shipments are left.
+    """
+    candidates = archive_candidates(cutoff, after, batch_size).all()
+    if not candidates:
+        db.session.commit()
+        return None, 0, 0
+    
+    event_table = TrackingEvent.__table__
+    archive_table = TrackingEventArchive.__table__
+    live = {}
+    rows = db.session.execute(
+        event_table.select()
+            .where(event_table.c.shipment_id.in_([c.id for c in candidates]))
+            .order_by(event_table.c.shipment_id, event_table.c.timestamp, event_table.c.id))
+    for row in rows.mappings():
+        live.setdefault(row['shipment_id'], []).append(dict(row))
+    existing = dict(db.session.query(TrackingEventArchive.shipment_id, TrackingEventArchive.events)
+                    .filter(TrackingEventArchive.shipment_id.in_(list(live))))
+    
+    # Write the archive rows before deleting, so the search index keeps the event text
+    now = datetime.utcnow()
+    new_rows = []
+    for shipment_id, events in live.items():
+        history = archive.unpack_events(existing[shipment_id]) if shipment_id in existing else []
+        values = dict(archive.summarize(history + events), archived_at=now)
+        if shipment_id in existing:
+            db.session.execute(archive_table.update()
+                               .where(archive_table.c.shipment_id == shipment_id)
+                               .values(**values))
+        else:
+            new_rows.append(dict(values, shipment_id=shipment_id))
+    if new_rows:
+        db.session.execute(archive_table.insert(), new_rows)
+    event_ids = [event['id'] for events in live.values() for event in events]
+    # Rebuild each shipment's search document once, not once per deleted event
+    search.defer_refresh(db.session.connection(), list(live))
+    for chunk in chunked(event_ids, 500):
+        db.session.execute(event_table.delete().where(event_table.c.id.in_(chunk)))
+    search.refresh_deferred(db.session.connection(), list(live))
+    
+    next_key = (candidates[-1].updated_at, candidates[-1].id)
+    save_archive_checkpoint(next_key)
+    db.session.commit()
+    return next_key, len(live), len(event_ids)
+
+@app.cli.command('archive-events')
+@click.option('--older-than-days', type=int, help='Archive shipments delivered longer ago than this. '
+              '[default: ARCHIVE_AFTER_DAYS]')
+@click.option('--batch-size', type=int, help='Shipments per transaction. [default: ARCHIVE_BATCH_SIZE]')
+@click.option('--max-batches', default=0, help='Stop after this many batches (0: until done).')
+@click.option('--pause', type=float, help='Seconds between batches. [default: ARCHIVE_PAUSE]')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and scan from the start.')
+def archive_events_command(older_than_days, batch_size, max_batches, pause, restart):
+    """Move tracking events of long-delivered shipments into the compressed archive
+    
+    Every batch commits together with a checkpoint, so an interrupted run
+    resumes where it stopped and a scheduled run only looks at shipments
+    that became eligible since the last one.
+    """
+    config = app.config
+    older_than_days = older_than_days if older_than_days is not None else config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    pause = pause if pause is not None else config['ARCHIVE_PAUSE']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    after = None if restart else load_archive_checkpoint()
+    db.session.commit()
+    
+    batches = shipments_total = events_total = 0
+    while True:
+        next_key, shipments, events = archive_events_batch(cutoff, after, batch_size)
+        if next_key is None:
+            break
+        after = next_key
+        batches += 1
+        shipments_total += shipments
+        events_total += events
+        print(f'Archived {events} events of {shipments} shipments (through shipment {after[1]})')
+        if max_batches and batches >= max_batches:
+            break
+        time.sleep(pause)
+    print(f'Archived {events_total} events of {shipments_total} shipments in total.')
+
+# Delivery analytics
+ANALYTICS_BACKFILL = 'backfill'
+
+def record_event_rollups(connection, *criteria):
+    """Add the tracking events matching ``criteria`` to the analytics rollups
+    
+    Runs in the caller's transaction, so the rollups commit or roll back
+    together with the events. An event counts as its shipment reaching a
+    status only when it is the shipment's first event (by id) with it.
+    """
+    events = TrackingEvent.__table__
+    shipments = Shipment.__table__
+    earlier = events.alias('earlier')
+    first_id = select(func.min(earlier.c.id))\
+        .where(earlier.c.shipment_id == events.c.shipment_id, earlier.c.status == events.c.status)\
+        .scalar_subquery()
+    rows = connection.execute(
+        select(events.c.status, events.c.location, events.c.timestamp,
+               (events.c.id == first_id).label('first'),
+               shipments.c.created_at, shipments.c.pickup_address, shipments.c.delivery_address)
+            .select_from(events.join(shipments, shipments.c.id == events.c.shipment_id))
+            .where(*criteria))
+    rollup = analytics.Rollup()
+    for row in rows:
+        rollup.add(row.status, row.location, row.timestamp, row.created_at,
+                   analytics.route_of(row.pickup_address, row.delivery_address), first=bool(row.first))
+    apply_rollup(connection, rollup)
+
+def apply_rollup(connection, rollup):
+    add_to_rows(connection, EventRollup.__table__, ('bucket', 'status', 'location'),
+                rollup.event_rows())
+    add_to_rows(connection, TransitionRollup.__table__, ('day', 'route', 'status'),
+                rollup.transition_rows())
+
+# Events added through the ORM are rolled up in the flush that writes them;
+# bulk writers call record_event_rollups themselves.
+@event.listens_for(db.session, 'after_flush')
+def _rollup_new_events(session, flush_context):
+    event_ids = [obj.id for obj in session.new if isinstance(obj, TrackingEvent)]
+    if event_ids:
+        record_event_rollups(session.connection(), TrackingEvent.id.in_(event_ids))
+
+def analytics_range(args):
+    """``[start, end)`` from the ?start= and ?end= days (both inclusive), by default the last ANALYTICS_DEFAULT_DAYS"""
+    try:
+        end = datetime.strptime(args['end'], '%Y-%m-%d') if args.get('end') else \
+            datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        start = datetime.strptime(args['start'], '%Y-%m-%d') if args.get('start') else \
+            end - timedelta(days=app.config['ANALYTICS_DEFAULT_DAYS'] - 1)
+    except ValueError:
+        raise ValueError('start and end must be dates (YYYY-MM-DD)')
+    if start > end:
+        raise ValueError('start must not be after end')
+    if (end - start).days >= app.config['ANALYTICS_MAX_DAYS']:
+        raise ValueError(f"At most {app.config['ANALYTICS_MAX_DAYS']} days at a time")
+    return start, end + timedelta(days=1)
+
+def event_series(start, end, granularity='day', by=('status',), status=None, location=None):
+    """Event counts per hour or day and the ``by`` columns, from the hourly rollup"""
+    query = db.read_session.query(EventRollup.bucket, EventRollup.status, EventRollup.location,
+                                  EventRollup.count)\
+        .filter(EventRollup.bucket >= start, EventRollup.bucket < end)
+    if status:
+        query = query.filter(EventRollup.status == status)
+    if location is not None:
+        query = query.filter(EventRollup.location == location)
+    return analytics.fold_event_rows(query, granularity, by)
+
+def event_totals(start, end, column, status=None, limit=None):
+    """Event counts per status or location over the whole range, largest first"""
+    column = getattr(EventRollup, column)
+    query = db.read_session.query(column, func.sum(EventRollup.count).label('count'))\
+        .filter(EventRollup.bucket >= start, EventRollup.bucket < end)
+    if status:
+        query = query.filter(EventRollup.status == status)
+    query = query.group_by(column).order_by(desc('count'), column)
+    if limit:
+        query = query.limit(limit)
+    return [{column.key: value, 'count': count} for value, count in query]
+
+def transition_stats(start, end, status, by='day'):
+    """Shipments reaching ``status`` and their average time since creation, per day or route"""
+    column = TransitionRollup.day if by == 'day' else TransitionRollup.route
+    rows = db.read_session.query(column, func.sum(TransitionRollup.count),
+                                 func.sum(TransitionRollup.total_seconds))\
+        .filter(TransitionRollup.day >= start.date(), TransitionRollup.day < end.date(),
+                TransitionRollup.status == status)\
+        .group_by(column)\
+        .order_by(column)
+    return [{by: value.isoformat() if by == 'day' else value,
+             'count': count,
+             'avg_seconds': total / count if count else None}
+            for value, count, total in rows]
+
+def transition_durations(start, end, from_status, to_status):
+    """Time between two statuses for shipments reaching ``to_status`` in the range, from raw events
+    
+    For status pairs the rollups do not cover. Only live events are read;
+    archived history belongs to shipments delivered long ago.
+    """
+    reached = select(TrackingEvent.shipment_id)\
+        .where(TrackingEvent.status == to_status,
+               TrackingEvent.timestamp >= start, TrackingEvent.timestamp < end)
+    events = db.read_session.query(TrackingEvent.id, TrackingEvent.shipment_id,
+                                   TrackingEvent.status, TrackingEvent.timestamp)\
+        .filter(TrackingEvent.shipment_id.in_(reached),
+                TrackingEvent.status.in_([from_status, to_status]),
+                TrackingEvent.timestamp.isnot(None))\
+        .all()
+    days, seconds = analytics.transition_durations([tuple(row) for row in events],
+                                                   from_status, to_status, start, end)
+    return {
+        'from': from_status,
+        'to': to_status,
+        'engine': analytics.ENGINE,
+        **analytics.duration_summary(seconds),
+        'days': analytics.durations_by_day(days, seconds),
+    }
+
+@app.route('/admin/analytics')
+@login_required
+def admin_analytics():
+    """Delivery times, exceptions and event volume from the analytics rollups"""
+    if not current_user.is_admin:
+        abort(403)  # Forbidden
+    
+    try:
+        start, end = analytics_range(request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        start, end = analytics_range({})
+    
+    routes = sorted(transition_stats(start, end, 'Delivered', by='route'),
+                    key=lambda row: row['avg_seconds'] or 0, reverse=True)
+    return render_template('admin/analytics.html',
+                         start=start,
+                         end=end - timedelta(days=1),
+                         deliveries=transition_stats(start, end, 'Delivered'),
+                         slowest_routes=routes[:10],
+                         exceptions=event_totals(start, end, 'location', status='Exception', limit=10),
+                         statuses=event_totals(start, end, 'status'))
+
+@app.route('/admin/analytics/events', methods=['GET'])
+@login_required
+def analytics_events():
+    """Event counts per hour or day, by status and/or location
+    
+    ``?granularity=hour|day``, ``?by=status,location``, optional ``?status=``
+    and ``?location=`` filters, and a ``?start=``/``?end=`` day range.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    granularity = request.args.get('granularity', 'day')
+    by = tuple(name for name in request.args.get('by', 'status').split(',') if name)
+    if granularity not in ('hour', 'day') or not set(by) <= {'status', 'location'}:
+        return jsonify({'error': 'granularity must be hour or day; by must name status and/or location'}), 400
+    try:
+        start, end = analytics_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    series = event_series(start, end, granularity, by,
+                          status=request.args.get('status'), location=request.args.get('location'))
+    for row in series:
+        row['period'] = row['period'].isoformat()
+    return jsonify({'start': start.date().isoformat(),
+                    'end': (end - timedelta(days=1)).date().isoformat(),
+                    'granularity': granularity,
+                    'series': series})
+
+@app.route('/admin/analytics/transitions', methods=['GET'])
+@login_required
+def analytics_transitions():
+    """Shipments reaching ``?status=`` (default Delivered) and the average time it took, ``?by=day|route``"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    by = request.args.get('by', 'day')
+    if by not in ('day', 'route'):
+        return jsonify({'error': 'by must be day or route'}), 400
+    try:
+        start, end = analytics_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status = request.args.get('status', 'Delivered')
+    return jsonify({'start': start.date().isoformat(),
+                    'end': (end - timedelta(days=1)).date().isoformat(),
+                    'status': status,
+                    'rows': transition_stats(start, end, status, by)})
+
+@app.route('/admin/analytics/durations', methods=['GET'])
+@login_required
+def analytics_durations():
+    """Count, mean, p50 and p90 of the time from ``?from=`` to ``?to=``, overall and per day"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        start, end = analytics_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(transition_durations(start, end,
+                                        request.args.get('from', 'Processing'),
+                                        request.args.get('to', 'Delivered')))
+
+def load_analytics_checkpoint():
+    return db.session.query(AnalyticsCheckpoint).get(ANALYTICS_BACKFILL) or \
+        AnalyticsCheckpoint(name=ANALYTICS_BACKFILL, last_shipment_id=0, max_event_id=0)
+
+def analytics_backfill_batch(checkpoint, batch_size):
+    """Roll up the events of the next batch of shipments that the live path did not count
+    
+    Covers event ids up to ``checkpoint.max_event_id``, live and archived;
+    later events were rolled up as they were written. The rollups and the
+    checkpoint commit together, so a rerun never counts an event twice.
+    Returns ``(shipments, events)``; no shipments means the backfill is done.
+    """
+    shipments = db.session.query(Shipment.id, Shipment.created_at, Shipment.pickup_address,
+                                 Shipment.delivery_address)\
+        .filter(Shipment.id > checkpoint.last_shipment_id)\
+        .order_by(Shipment.id)\
+        .limit(batch_size)\
+        .all()
+    if not shipments:
+        db.session.commit()
+        return 0, 0
+    
+    shipment_ids = [shipment.id for shipment in shipments]
+    events = {}
+    rows = db.session.query(TrackingEvent.id, TrackingEvent.shipment_id, TrackingEvent.status,
+                            TrackingEvent.location, TrackingEvent.timestamp)\
+        .filter(TrackingEvent.shipment_id.in_(shipment_ids),
+                TrackingEvent.id <= checkpoint.max_event_id)
+    for row in rows:
+        events.setdefault(row.shipment_id, []).append((row.id, row.status, row.location, row.timestamp))
+    archived = db.session.query(TrackingEventArchive.shipment_id, TrackingEventArchive.events)\
+        .filter(TrackingEventArchive.shipment_id.in_(shipment_ids))
+    for shipment_id, blob in archived:
+        events.setdefault(shipment_id, []).extend(
+            (event['id'], event['status'], event['location'], event['timestamp'])
+            for event in archive.unpack_events(blob) if event['id'] <= checkpoint.max_event_id)
+    
+    rollup = analytics.Rollup()
+    counted = 0
+    for shipment in shipments:
+        route = analytics.route_of(shipment.pickup_address, shipment.delivery_address)
+        reached = set()
+        for event_id, status, location, timestamp in sorted(events.get(shipment.id, ())):
+            rollup.add(status, location, timestamp, shipment.created_at, route,
+                       first=status not in reached)
+            reached.add(status)
+            counted += 1
+    apply_rollup(db.session.connection(), rollup)
+    
+    checkpoint.last_shipment_id = shipment_ids[-1]
+    checkpoint.saved_at = datetime.utcnow()
+    db.session.add(checkpoint)
+    db.session.commit()
+    return len(shipments), counted
+
+analytics_cli = AppGroup('analytics', help='Maintain the delivery analytics rollups.')
+app.cli.add_command(analytics_cli)
+
+@analytics_cli.command('backfill')
+@click.option('--batch-size', type=int, help='Shipments per transaction. [default: ANALYTICS_BACKFILL_BATCH_SIZE]')
+@click.option('--max-batches', default=0, help='Stop after this many batches (0: until done).')
+@click.option('--pause', type=float, help='Seconds between batches. [default: ANALYTICS_BACKFILL_PAUSE]')
+@click.option('--restart', is_flag=True, help='Clear the rollups and rebuild them from all events.')
+def analytics_backfill_command(batch_size, max_batches, pause, restart):
+    """Roll up the tracking events written before the rollups were maintained
+    
+    Resumes from its checkpoint. --restart empties the rollups and moves the
+    cutoff to the newest event in the same transaction, so events written
+    afterwards are still counted once, by the live path.
+    """
+    batch_size = batch_size or app.config['ANALYTICS_BACKFILL_BATCH_SIZE']
+    pause = pause if pause is not None else app.config['ANALYTICS_BACKFILL_PAUSE']
+    checkpoint = load_analytics_checkpoint()
+    if restart:
+        db.session.query(EventRollup).delete()
+        db.session.query(TransitionRollup).delete()
+        checkpoint.last_shipment_id = 0
+        checkpoint.max_event_id = max(
+            db.session.query(func.max(TrackingEvent.id)).scalar() or 0,
+            db.session.query(func.max(TrackingEventArchive.last_event_id)).scalar() or 0)
+        checkpoint.saved_at = datetime.utcnow()
+        db.session.add(checkpoint)
+    db.session.commit()
+    
+    batches = shipments_total = events_total = 0
+    while True:
+        shipments, events = analytics_backfill_batch(checkpoint, batch_size)
+        if not shipments:
+            break
+        batches += 1
+        shipments_total += shipments
+        events_total += events
+        print(f'Rolled up {events} events of {shipments} shipments '
+              f'(through shipment {checkpoint.last_shipment_id})')
+        if max_batches and batches >= max_batches:
+            break
+        time.sleep(pause)
+    print(f'Rolled up {events_total} events of {shipments_total} shipments in total.')
+
+# Full-text search index
+search_cli = AppGroup('search', help='Manage the full-text shipment search index.')
+app.cli.add_command(search_cli)
+
+@search_cli.command('reindex')
+@click.option('--batch-size', default=10000, show_default=True, help='Shipments per transaction.')
+@click.option('--start-id', default=0, help='Resume from this shipment id.')
+def search_reindex_command(batch_size, start_id):
+    """Rebuild the search documents of all shipments in id-range batches"""
+    max_id = db.session.query(func.max(Shipment.id)).scalar() or 0
+    db.session.commit()
+    for start in range(start_id, max_id + 1, batch_size):
+        end = min(start + batch_size - 1, max_id)
+        with db.engine.begin() as connection:
+            search.reindex_range(connection, start, end)
+        print(f'Reindexed shipments {start}-{end}')
+    with db.engine.begin() as connection:
+        search.optimize(connection)
+    print('Search index rebuilt.')
+
+# Static assets
+assets_cli = AppGroup('assets', help='Manage static assets.')
+app.cli.add_command(assets_cli)
+
+@assets_cli.command('build')
+def assets_build_command():
+    """Write fingerprinted, precompressed copies of static/ to static/dist"""
+    asset_manifest = static_assets.build()
+    print(f'Built {len(asset_manifest)} static assets into {static_assets.dist_folder}')
+
+# Schema management
+db_cli = AppGroup('db', help='Manage the database schema.')
+app.cli.add_command(db_cli)
+
+def hot_path_queries():
+    """The queries behind the busiest routes, as checked by 'flask db check-indexes'"""
+    return {
+        'get_tracking: shipment by tracking number':
+            Shipment.query.filter_by(tracking_number='SC0000000000').statement,
+        'get_tracking: validators':
+            tracking_validators_query('SC0000000000').statement,
+        'get_tracking: events':
+            TrackingEvent.query.filter_by(shipment_id=1)
+                .order_by(desc(TrackingEvent.timestamp)).statement,
+        'get_tracking: events since':
+            TrackingEvent.query.filter(TrackingEvent.shipment_id == 1, TrackingEvent.id > 0)
+                .order_by(desc(TrackingEvent.timestamp)).statement,
+        'get_tracking_batch: shipments':
+            Shipment.query.filter(Shipment.tracking_number.in_(['SC1', 'SC2'])).statement,
+        'get_tracking_batch: events':
+            TrackingEvent.query.filter(TrackingEvent.shipment_id.in_([1, 2]))
+                .order_by(TrackingEvent.shipment_id, desc(TrackingEvent.timestamp)).statement,
+        'archive-events: candidates':
+            archive_candidates(datetime(2024, 1, 1), (datetime(2023, 1, 1), 1), 500).statement,
+        'dashboard: latest shipments':
+            Shipment.query.filter_by(user_id=1)
+                .order_by(Shipment.created_at.desc()).limit(5).statement,
+        'admin_dashboard: recent shipments':
+            Shipment.query.order_by(Shipment.updated_at.desc()).limit(10).statement,
+        'admin_dashboard: data version':
+            dashboard_data_version_query().statement,
+        'analytics: event rollup range':
+            EventRollup.query.filter(EventRollup.bucket >= datetime(2024, 1, 1),
+                                     EventRollup.bucket < datetime(2024, 2, 1)).statement,
+        'analytics: transition rollup range':
+            TransitionRollup.query.filter(TransitionRollup.day >= datetime(2024, 1, 1).date(),
+                                          TransitionRollup.day < datetime(2024, 2, 1).date(),
+                                          TransitionRollup.status == 'Delivered').statement,
+        'shipments by status':
+            Shipment.query.filter_by(status='In Transit').statement,
+        'list_shipments: page by updated_at':
+            Shipment.query.filter(tuple_(Shipment.updated_at, Shipment.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Shipment.updated_at.desc(), Shipment.id.desc()).limit(51).statement,
+        'list_shipments: page by created_at':
+            Shipment.query.filter(tuple_(Shipment.created_at, Shipment.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Shipment.created_at.desc(), Shipment.id.desc()).limit(51).statement,
+        'list_shipments: status page':
+            Shipment.query.filter(Shipment.status == 'In Transit',
+                                  tuple_(Shipment.updated_at, Shipment.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Shipment.updated_at.desc(), Shipment.id.desc()).limit(51).statement,
+        'list_shipments: customer page':
+            Shipment.query.filter(Shipment.user_id == 1,
+                                  tuple_(Shipment.updated_at, Shipment.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Shipment.updated_at.desc(), Shipment.id.desc()).limit(51).statement,
+        'list_notifications: inbox page':
+            Notification.query.filter(Notification.user_id == 1,
+                                      tuple_(Notification.created_at, Notification.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(21).statement,
+        'list_notifications: unread page':
+            Notification.query.filter(Notification.user_id == 1, Notification.is_read == false(),
+                                      tuple_(Notification.created_at, Notification.id) < (datetime(2024, 1, 1), 1))
+                .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(21).statement,
+    }
+
+@db_cli.command('upgrade')
+@click.option('--revision', default=None, help='Stop after this revision.')
+def db_upgrade_command(revision):
+    """Apply pending migrations"""
+    if not migrations.upgrade(db.engine, target=revision):
+        print('Database is up to date.')
+
+@db_cli.command('downgrade')
+@click.argument('revision')
+def db_downgrade_command(revision):
+    """Revert migrations newer than REVISION (0000 reverts everything)"""
+    migrations.downgrade(db.engine, revision)
+
+@db_cli.command('status')
+def db_status_command():
+    """Show which migrations have been applied"""
+    for migration, applied in migrations.status(db.engine):
+        print(f"[{'x' if applied else ' '}] {migration.revision}_{migration.name}: {migration.description}")
+
+@db_cli.command('check-indexes')
+def db_check_indexes_command():
+    """EXPLAIN the hot route queries and fail if any scans a whole table"""
+    with db.engine.begin() as connection:
+        results = check_queries(connection, hot_path_queries())
+    for name, ok, plan in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        for line in plan:
+            print(f'       {line}')
+    if not all(ok for _, ok, _ in results):
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrations.upgrade(db.engine)
     app.run(debug=True, port=5001)
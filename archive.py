@@ -0,0 +1,54 @@
+"""Compressed per-shipment archive of tracking event history.
+
+Events of shipments delivered long ago leave the live ``tracking_event``
+table for one ``tracking_event_archive`` row per shipment, which holds the
+whole history as zlib-compressed JSON plus the text the search index needs.
+A shipment's history is then one primary key read and a decompress instead
+of an index range over the hot table, and the hot table and its indexes only
+hold events that are still being written and polled.
+"""
+from datetime import datetime
+import json
+import zlib
+
+# Stored per event, in this order
+FIELDS = ('id', 'status', 'location', 'description', 'timestamp', 'user_id')
+
+
+def pack_events(events):
+    """Compress event mappings (with the FIELDS keys) into an archive blob"""
+    rows = []
+    for event in events:
+        row = [event[field] for field in FIELDS]
+        row[4] = row[4].isoformat() if row[4] is not None else None
+        rows.append(row)
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_events(blob):
+    """Event dicts stored in an archive blob, in the order they were packed"""
+    events = []
+    for row in json.loads(zlib.decompress(blob)):
+        event = dict(zip(FIELDS, row))
+        if event['timestamp'] is not None:
+            event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+        events.append(event)
+    return events
+
+
+def search_text(events):
+    """Locations and descriptions of the events, as the search index stores them"""
+    return ' '.join(f"{event['location'] or ''} {event['description'] or ''}" for event in events)
+
+
+def summarize(events):
+    """Archive row columns describing a complete, ordered event history"""
+    timestamps = [event['timestamp'] for event in events if event['timestamp'] is not None]
+    return {
+        'events': pack_events(events),
+        'event_count': len(events),
+        'first_event_at': min(timestamps) if timestamps else None,
+        'last_event_at': max(timestamps) if timestamps else None,
+        'last_event_id': max(event['id'] for event in events),
+        'search_text': search_text(events),
+    }
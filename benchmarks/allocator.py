@@ -0,0 +1,194 @@
+"""Load test: create shipments from several processes with allocated tracking numbers.
+
+``--workers`` processes each allocate tracking numbers one at a time from
+their own reserved blocks and insert shipments in ``--batch``-sized
+transactions, as concurrent app workers would. A unique constraint
+violation is counted as a retry; the run passes with zero retries and as
+many distinct tracking numbers as shipments.
+
+    python benchmarks/allocator.py
+    python benchmarks/allocator.py --shipments 100000 --workers 8 --block-size 100
+    python benchmarks/allocator.py --database-url postgresql://localhost/couriers_bench
+
+For comparison it also reports how many collisions the old generator
+(5 random digits per day) would have produced for the same daily volume.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    sys.path.insert(0, ROOT)
+    import app as courier
+    return courier
+
+
+def run_setup(args):
+    """Migrate the database and create the owner of the benchmark shipments"""
+    from werkzeug.security import generate_password_hash
+    courier = load_app()
+    import migrations
+    with courier.app.app_context():
+        migrations.upgrade(courier.db.engine, log=lambda message: None)
+        user = courier.User(email=f'allocator-{int(time.time())}@bench.local',
+                            password=generate_password_hash('bench'), name='Allocator Bench')
+        courier.db.session.add(user)
+        courier.db.session.commit()
+        print(user.id)
+
+
+def run_worker(args):
+    """Allocate and insert this worker's share of the shipments"""
+    from sqlalchemy.exc import IntegrityError
+    courier = load_app()
+    app, db = courier.app, courier.db
+    allocator = courier.tracking_numbers
+    allocator.block_size = args.block_size
+    table = courier.Shipment.__table__
+    retries = 0
+    started = time.perf_counter()
+    with app.app_context():
+        remaining = args.shipments
+        while remaining:
+            size = min(args.batch, remaining)
+            now = courier.datetime.utcnow()
+            rows = [{
+                'tracking_number': allocator.allocate(),
+                'sender_name': 'Bench Sender', 'sender_phone': '0',
+                'receiver_name': 'Bench Receiver', 'receiver_phone': '0',
+                'pickup_address': 'Origin', 'delivery_address': 'Destination',
+                'status': 'Processing', 'created_at': now, 'updated_at': now,
+                'user_id': args.user_id,
+            } for _ in range(size)]
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert(), rows)
+                    courier.apply_status_deltas(connection, {'Processing': size})
+            except IntegrityError:
+                retries += 1
+                continue
+            remaining -= size
+    print(json.dumps({
+        'created': args.shipments,
+        'retries': retries,
+        'blocks_reserved': allocator.blocks_reserved,
+        'duration_s': round(time.perf_counter() - started, 3),
+    }))
+
+
+def run_verify(args):
+    """Count shipments and distinct tracking numbers for the benchmark user"""
+    from sqlalchemy import func
+    courier = load_app()
+    from tracking_numbers import has_valid_check_digit
+    Shipment = courier.Shipment
+    with courier.app.app_context():
+        total, distinct = courier.db.session.query(
+            func.count(Shipment.id), func.count(func.distinct(Shipment.tracking_number)))\
+            .filter(Shipment.user_id == args.user_id)\
+            .one()
+        sample = courier.db.session.query(Shipment.tracking_number)\
+            .filter(Shipment.user_id == args.user_id)\
+            .limit(10000)\
+            .all()
+    bad_checksums = sum(1 for (number,) in sample if not has_valid_check_digit(number))
+    print(json.dumps({'shipments': total, 'distinct': distinct, 'bad_checksums_in_sample': bad_checksums}))
+
+
+def legacy_collisions(per_day, days=1):
+    """Shipments that would hit the unique constraint with 5 random digits per day"""
+    collisions = 0
+    for _ in range(days):
+        seen = set()
+        for _ in range(per_day):
+            number = random.randrange(100000)
+            if number in seen:
+                collisions += 1
+            seen.add(number)
+    return collisions
+
+
+def spawn(args, env, *extra):
+    command = [sys.executable, os.path.abspath(__file__), *extra,
+               '--batch', str(args.batch), '--block-size', str(args.block_size)]
+    return subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True)
+
+
+def finish(process):
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise SystemExit(stderr.strip())
+    return stdout.strip().splitlines()[-1]
+
+
+def run(args, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, TRACKING_CACHE_BACKEND='none',
+               NOTIFICATION_DISPATCH_MODE='external', SQLITE_BUSY_TIMEOUT_MS='60000')
+    user_id = finish(spawn(args, env, '--setup'))
+
+    per_worker = args.shipments // args.workers
+    shares = [per_worker + (1 if i < args.shipments % args.workers else 0)
+              for i in range(args.workers)]
+    started = time.perf_counter()
+    processes = [spawn(args, env, '--worker', '--user-id', user_id, '--shipments', str(share))
+                 for share in shares]
+    results = [json.loads(finish(process)) for process in processes]
+    duration = time.perf_counter() - started
+    verify = json.loads(finish(spawn(args, env, '--verify', '--user-id', user_id)))
+
+    print(json.dumps({
+        'shipments': args.shipments,
+        'workers': args.workers,
+        'block_size': args.block_size,
+        'retries': sum(result['retries'] for result in results),
+        'blocks_reserved': sum(result['blocks_reserved'] for result in results),
+        'distinct_tracking_numbers': verify['distinct'],
+        'bad_checksums_in_sample': verify['bad_checksums_in_sample'],
+        'duration_s': round(duration, 3),
+        'shipments_per_s': round(args.shipments / duration, 1),
+    }))
+    print(json.dumps({
+        'legacy_generator': 'SC + yymmdd + 5 random digits',
+        'shipments_per_day': args.legacy_per_day,
+        'collisions_per_day': legacy_collisions(args.legacy_per_day),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shipments', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=1000, help='shipments per insert transaction')
+    parser.add_argument('--block-size', type=int, default=1000, help='sequence values reserved per block')
+    parser.add_argument('--legacy-per-day', type=int, default=10000)
+    parser.add_argument('--database-url', help='benchmark against this database instead of a temporary SQLite file')
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--verify', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        run_setup(args)
+    elif args.worker:
+        run_worker(args)
+    elif args.verify:
+        run_verify(args)
+    elif args.database_url:
+        run(args, args.database_url)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(args, f"sqlite:///{os.path.join(tmp, 'allocator.db')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: cost of request and SQL instrumentation on tracking lookups.
+
+Times the same GET /api/track/<number> requests through Flask's test client
+in fresh processes with INSTRUMENTATION_ENABLED=0 and =1, alternating the
+two for ``--rounds`` rounds so drift affects both equally. Each process
+reports its fastest batch of ``--batch`` requests, as timeit does; the
+result is the median of those per setting and the overhead in percent.
+Lookups are measured with the tracking response cache (no SQL) and without
+it (``--no-cache``: the lookup queries run, so the per-statement hooks are
+exercised too).
+
+    python benchmarks/instrumentation.py
+    python benchmarks/instrumentation.py --requests 20000 --rounds 7 --no-cache
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    sys.path.insert(0, ROOT)
+    import app as courier
+    return courier
+
+
+def run_setup(args):
+    """Migrate the database and create the shipment that is looked up"""
+    courier = load_app()
+    import migrations
+    with courier.app.app_context():
+        migrations.upgrade(courier.db.engine, log=lambda message: None)
+        user = courier.User(email=f'instrumentation-{int(time.time())}@bench.local',
+                            password='bench', name='Instrumentation Bench')
+        courier.db.session.add(user)
+        courier.db.session.flush()
+        number = courier.generate_tracking_number()
+        shipment = courier.Shipment(
+            tracking_number=number, sender_name='Bench Sender', sender_phone='0',
+            receiver_name='Bench Receiver', receiver_phone='0',
+            pickup_address='Origin', delivery_address='Destination', user_id=user.id)
+        courier.db.session.add(shipment)
+        courier.db.session.flush()
+        for status in ('Processing', 'In Transit', 'Out for Delivery'):
+            courier.db.session.add(courier.TrackingEvent(shipment_id=shipment.id, status=status,
+                                                         location='Hub'))
+        courier.db.session.commit()
+    print(number)
+
+
+def run_worker(args):
+    """Time ``--requests`` lookups of one tracking number in this process"""
+    courier = load_app()
+    client = courier.app.test_client()
+    url = f'/api/track/{args.tracking_number}'
+    for _ in range(args.warmup):
+        assert client.get(url).status_code == 200
+    fastest = None
+    for _ in range(max(1, args.requests // args.batch)):
+        started = time.perf_counter()
+        for _ in range(args.batch):
+            client.get(url)
+        duration = time.perf_counter() - started
+        fastest = duration if fastest is None else min(fastest, duration)
+    print(json.dumps({'per_request_us': fastest / args.batch * 1e6}))
+
+
+def spawn(env, *extra):
+    command = [sys.executable, os.path.abspath(__file__), *extra]
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise SystemExit(process.stderr.strip())
+    return process.stdout.strip().splitlines()[-1]
+
+
+def run(args, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, NOTIFICATION_DISPATCH_MODE='external',
+               RATE_LIMIT_ENABLED='0', TRACKING_CACHE_BACKEND='none' if args.no_cache else 'memory')
+    number = spawn(env, '--setup')
+
+    timings = {'0': [], '1': []}
+    for _ in range(args.rounds):
+        for enabled in timings:
+            result = spawn(dict(env, INSTRUMENTATION_ENABLED=enabled), '--worker',
+                           '--tracking-number', number, '--requests', str(args.requests),
+                           '--batch', str(args.batch), '--warmup', str(args.warmup))
+            timings[enabled].append(json.loads(result)['per_request_us'])
+
+    off, on = statistics.median(timings['0']), statistics.median(timings['1'])
+    print(json.dumps({
+        'tracking_cache': 'none' if args.no_cache else 'memory',
+        'requests': args.requests,
+        'rounds': args.rounds,
+        'disabled_us_per_request': round(off, 1),
+        'enabled_us_per_request': round(on, 1),
+        'overhead_pct': round((on - off) / off * 100, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000, help='timed lookups per process')
+    parser.add_argument('--batch', type=int, default=500, help='lookups per timed batch')
+    parser.add_argument('--warmup', type=int, default=200, help='untimed lookups per process')
+    parser.add_argument('--rounds', type=int, default=5, help='processes per setting')
+    parser.add_argument('--no-cache', action='store_true', help='disable the tracking response cache')
+    parser.add_argument('--database-url', help='benchmark against this database instead of a temporary SQLite file')
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--tracking-number', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        run_setup(args)
+    elif args.worker:
+        run_worker(args)
+    elif args.database_url:
+        run(args, args.database_url)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(args, f"sqlite:///{os.path.join(tmp, 'instrumentation.db')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,450 @@
+"""Benchmark suite: seed a synthetic dataset, drive the app routes, compare runs.
+
+``seed`` fills a database with ``--users`` customers, ``--shipments``
+shipments and about ``--events-per-shipment`` tracking events each, from a
+fixed random seed, and writes a dataset file describing what it created.
+``run`` then drives the real routes (get_tracking, get_tracking_events,
+update_tracking, create_shipment, admin_dashboard, dashboard) with
+``--clients`` concurrent clients per scenario and writes latency
+percentiles and throughput as JSON. ``compare`` diffs two result files and
+exits non-zero when a scenario regressed by more than ``--threshold``
+percent.
+
+    python benchmarks/suite.py seed --database-url sqlite:////tmp/bench.db --shipments 1000000
+    python benchmarks/suite.py run --output before.json
+    python benchmarks/suite.py run --output after.json
+    python benchmarks/suite.py compare before.json after.json
+
+By default the routes are called in-process through Flask's test client,
+which measures the application without a web server in front of it; with
+``--base-url`` the same requests go over HTTP to a running deployment that
+uses the seeded database and runs with RATE_LIMIT_ENABLED=0, since all
+clients share one address. update_tracking and create_shipment write to the
+database, so seed a fresh copy (or copy the seeded SQLite file) before
+runs that are meant to be compared.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'bench'
+ADMIN_EMAIL = 'bench-admin@bench.local'
+TRACKING_PREFIX = 'BM'
+LIFECYCLE = ['Processing', 'In Transit', 'Out for Delivery', 'Delivered']
+CITIES = ['Lagos', 'Abuja', 'Kano', 'Ibadan', 'Port Harcourt', 'Enugu', 'Kaduna', 'Benin City']
+
+
+def load_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('NOTIFICATION_DISPATCH_MODE', 'external')
+    # Every simulated client shares one address; measure the routes, not the limiter
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    sys.path.insert(0, ROOT)
+    import app as courier
+    return courier
+
+
+def user_email(index):
+    return f'bench-user-{index}@bench.local'
+
+
+def tracking_number(index):
+    return f'{TRACKING_PREFIX}{index:012d}'
+
+
+# Seeding
+
+def seed_shipment(rng, index, shipment_id, user_ids, started, events_per_shipment):
+    """Rows for one shipment and its events, moving it along the lifecycle"""
+    created_at = started + timedelta(seconds=index * 30 + rng.randrange(30))
+    event_count = rng.randint(1, max(1, 2 * events_per_shipment - 1))
+    pickup, delivery = rng.sample(CITIES, 2)
+    events = []
+    timestamp = created_at
+    status = 'Processing'
+    for n in range(event_count):
+        if n:
+            timestamp += timedelta(minutes=rng.randint(10, 600))
+            step = min(len(LIFECYCLE) - 1, n * len(LIFECYCLE) // event_count + 1)
+            status = 'Exception' if rng.random() < 0.01 else LIFECYCLE[step]
+        events.append({
+            'shipment_id': shipment_id,
+            'status': status,
+            'location': rng.choice(CITIES),
+            'description': f'{status} scan',
+            'timestamp': timestamp,
+        })
+    shipment = {
+        'id': shipment_id,
+        'tracking_number': tracking_number(index),
+        'sender_name': f'Sender {rng.randrange(10000)}',
+        'sender_phone': f'080{rng.randrange(10 ** 8):08d}',
+        'receiver_name': f'Receiver {rng.randrange(10000)}',
+        'receiver_phone': f'081{rng.randrange(10 ** 8):08d}',
+        'pickup_address': f'{rng.randint(1, 200)} Market Road, {pickup}',
+        'delivery_address': f'{rng.randint(1, 200)} Station Road, {delivery}',
+        'weight': round(rng.uniform(0.1, 30), 2),
+        'description': 'Benchmark parcel',
+        'status': status,
+        'created_at': created_at,
+        'updated_at': timestamp,
+        'user_id': rng.choice(user_ids),
+    }
+    return shipment, events
+
+
+def run_seed(args):
+    from sqlalchemy import func
+    courier = load_app(args.database_url)
+    import migrations
+    app, db = courier.app, courier.db
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with app.app_context():
+        migrations.upgrade(db.engine, log=lambda message: None)
+        if db.session.query(courier.User.id).filter_by(email=ADMIN_EMAIL).first():
+            raise SystemExit(f'{args.database_url} is already seeded; seed a fresh database')
+        password = courier.passwords.hash(PASSWORD)
+        db.session.add(courier.User(email=ADMIN_EMAIL, password=password, name='Bench Admin',
+                                    is_admin=True))
+        db.session.add_all(courier.User(email=user_email(i), password=password,
+                                        name=f'Bench User {i}', phone=f'090{i:08d}')
+                           for i in range(args.users))
+        db.session.commit()
+        user_ids = [user_id for (user_id,) in db.session.query(courier.User.id)
+                    .filter(courier.User.email.like('bench-user-%'))
+                    .order_by(courier.User.id)]
+        next_id = (db.session.query(func.max(courier.Shipment.id)).scalar() or 0) + 1
+        db.session.remove()
+
+        shipment_table = courier.Shipment.__table__
+        event_table = courier.TrackingEvent.__table__
+        start_date = datetime(2024, 1, 1)
+        events_total = 0
+        for offset in range(0, args.shipments, args.chunk_size):
+            shipments, events, deltas = [], [], {}
+            for index in range(offset, min(offset + args.chunk_size, args.shipments)):
+                shipment, shipment_events = seed_shipment(
+                    rng, index, next_id + index, user_ids, start_date, args.events_per_shipment)
+                shipments.append(shipment)
+                events.extend(shipment_events)
+                deltas[shipment['status']] = deltas.get(shipment['status'], 0) + 1
+            with db.engine.begin() as connection:
+                connection.execute(shipment_table.insert(), shipments)
+                connection.execute(event_table.insert(), events)
+                courier.apply_status_deltas(connection, deltas)
+            events_total += len(events)
+            print(f'Seeded {offset + len(shipments)}/{args.shipments} shipments, '
+                  f'{events_total} events', file=sys.stderr)
+
+    dataset = {
+        'database_url': args.database_url,
+        'seed': args.seed,
+        'users': args.users,
+        'shipments': args.shipments,
+        'events': events_total,
+        'seeded_at': datetime.utcnow().isoformat(),
+        'duration_s': round(time.perf_counter() - started, 3),
+    }
+    with open(args.dataset, 'w') as f:
+        json.dump(dataset, f, indent=2)
+    print(json.dumps(dataset))
+
+
+# Clients
+
+class AppClient:
+    """Calls the app in-process through Flask's test client"""
+
+    def __init__(self, app):
+        self.http = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.http.open(path, method=method, data=form, json=json_body)
+        response.get_data()
+        return response.status_code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Calls a running deployment over HTTP, keeping its session cookie"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers,
+                                         method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+# Scenarios: each returns (method, path, form, json_body) for the next request
+
+def get_tracking(rng, dataset):
+    return 'GET', f"/api/track/{tracking_number(rng.randrange(dataset['shipments']))}", None, None
+
+
+def get_tracking_events(rng, dataset):
+    number = tracking_number(rng.randrange(dataset['shipments']))
+    return 'GET', f'/api/track/{number}/events', None, None
+
+
+def update_tracking(rng, dataset):
+    number = tracking_number(rng.randrange(dataset['shipments']))
+    return 'POST', f'/api/track/{number}/update', None, {
+        'status': rng.choice(LIFECYCLE[1:]),
+        'location': rng.choice(CITIES),
+        'description': 'Benchmark scan',
+    }
+
+
+def create_shipment(rng, dataset):
+    return 'POST', '/shipments/create', {
+        'sender_name': 'Bench Sender',
+        'sender_phone': '08000000000',
+        'receiver_name': 'Bench Receiver',
+        'receiver_phone': '08100000000',
+        'pickup_address': f'1 Market Road, {rng.choice(CITIES)}',
+        'delivery_address': f'2 Station Road, {rng.choice(CITIES)}',
+        'weight': '1.5',
+        'description': 'Benchmark parcel',
+    }, None
+
+
+def admin_dashboard(rng, dataset):
+    return 'GET', '/admin/dashboard', None, None
+
+
+def dashboard(rng, dataset):
+    return 'GET', '/dashboard', None, None
+
+
+# name -> (request builder, who the client logs in as, expected status codes)
+SCENARIOS = {
+    'get_tracking': (get_tracking, None, (200,)),
+    'get_tracking_events': (get_tracking_events, None, (200,)),
+    'update_tracking': (update_tracking, 'admin', (200,)),
+    'create_shipment': (create_shipment, 'user', (302,)),
+    'admin_dashboard': (admin_dashboard, 'admin', (200,)),
+    'dashboard': (dashboard, 'user', (200,)),
+}
+
+
+def run_scenario(name, make_client, dataset, args):
+    """Drive one scenario with concurrent clients; returns its summary"""
+    sys.path.insert(0, ROOT)
+    from analytics import percentile
+    build, login_as, expected = SCENARIOS[name]
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    window = {}
+
+    def open_window():
+        # Runs once every client has warmed up; measure from here
+        window['start'] = time.perf_counter()
+        window['end'] = window['start'] + args.duration
+
+    ready = threading.Barrier(args.clients + 1, action=open_window)
+
+    def client(index):
+        rng = random.Random(f'{args.seed}:{name}:{index}')
+        http = make_client()
+        if login_as == 'admin':
+            http.request('POST', '/login', form={'email': ADMIN_EMAIL, 'password': PASSWORD})
+        elif login_as == 'user':
+            email = user_email(rng.randrange(dataset['users']))
+            http.request('POST', '/login', form={'email': email, 'password': PASSWORD})
+        warmup_end = time.perf_counter() + args.warmup
+        while time.perf_counter() < warmup_end:
+            http.request(*build(rng, dataset))
+        ready.wait()
+        local_latencies = []
+        local_errors = {}
+        while time.perf_counter() < window['end']:
+            method, path, form, json_body = build(rng, dataset)
+            started = time.perf_counter()
+            status = http.request(method, path, form, json_body)
+            elapsed = time.perf_counter() - started
+            if status in expected:
+                local_latencies.append(elapsed)
+            else:
+                local_errors[status] = local_errors.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_errors.items():
+                errors[status] = errors.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - window['start']
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    latencies.sort()
+    return {
+        'clients': args.clients,
+        'requests': len(latencies) + sum(errors.values()),
+        'errors': sum(errors.values()),
+        'error_statuses': {str(status): count for status, count in sorted(errors.items())},
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    with open(args.dataset) as f:
+        dataset = json.load(f)
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.base_url:
+        target = args.base_url
+
+        def make_client():
+            return HttpClient(args.base_url)
+    else:
+        courier = load_app(dataset['database_url'])
+        target = 'in-process'
+
+        def make_client():
+            return AppClient(courier.app)
+
+    results = {}
+    for name in scenarios:
+        results[name] = run_scenario(name, make_client, dataset, args)
+        print(f"{name}: {results[name]['throughput_rps']} req/s, "
+              f"p95 {results[name]['p95_ms']} ms, {results[name]['errors']} errors", file=sys.stderr)
+
+    report = {
+        'commit': git_commit(),
+        'recorded_at': datetime.utcnow().isoformat(),
+        'target': target,
+        'python': platform.python_version(),
+        'dataset': dataset,
+        'parameters': {'clients': args.clients, 'duration_s': args.duration,
+                       'warmup_s': args.warmup, 'seed': args.seed},
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+def run_compare(args):
+    """Per-scenario change from ``baseline`` to ``candidate``; exit 1 on a regression"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)['scenarios']
+    with open(args.candidate) as f:
+        candidate = json.load(f)['scenarios']
+    regressed = False
+    for name in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[name], candidate[name]
+        change = {}
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before.get(key) and after.get(key) is not None:
+                change[key] = round((after[key] - before[key]) / before[key] * 100, 1)
+        scenario_regressed = (change.get('p95_ms', 0) > args.threshold
+                              or change.get('throughput_rps', 0) < -args.threshold
+                              or after['errors'] > before['errors'])
+        regressed = regressed or scenario_regressed
+        print(json.dumps({'scenario': name, 'change_pct': change,
+                          'errors': [before['errors'], after['errors']],
+                          'regressed': scenario_regressed}))
+    sys.exit(1 if regressed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='create the synthetic dataset')
+    seed.add_argument('--database-url', required=True)
+    seed.add_argument('--users', type=int, default=1000)
+    seed.add_argument('--shipments', type=int, default=1000000)
+    seed.add_argument('--events-per-shipment', type=int, default=10, help='average events per shipment')
+    seed.add_argument('--chunk-size', type=int, default=5000, help='shipments per insert transaction')
+    seed.add_argument('--seed', type=int, default=42)
+    seed.add_argument('--dataset', default='bench-dataset.json', help='where to describe the dataset')
+
+    run = commands.add_parser('run', help='drive the app routes and record latencies')
+    run.add_argument('--dataset', default='bench-dataset.json')
+    run.add_argument('--scenarios', help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    run.add_argument('--clients', type=int, default=8, help='concurrent clients per scenario')
+    run.add_argument('--duration', type=float, default=10, help='measured seconds per scenario')
+    run.add_argument('--warmup', type=float, default=2, help='unmeasured seconds per scenario')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--base-url', help='benchmark a running deployment instead of the app in-process')
+    run.add_argument('--output', help='also write the JSON report to this file')
+
+    compare = commands.add_parser('compare', help='diff two run reports')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.add_argument('--threshold', type=float, default=10,
+                         help='percent change in p95 latency or throughput counted as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        run_seed(args)
+    elif args.command == 'run':
+        run_benchmark(args)
+    else:
+        run_compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Load test: write throughput of concurrent update_tracking calls per engine profile.
+
+Each profile runs in its own process, because the engine configuration is
+read from the environment when the app is imported. Within a profile,
+``--threads`` clients each post ``--updates`` status updates through the
+real /api/track/<tracking_number>/update route.
+
+    python benchmarks/write_throughput.py
+    python benchmarks/write_throughput.py --postgres-url postgresql://localhost/couriers_bench
+
+Prints one JSON object per profile with throughput, error count and latency
+percentiles.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SQLITE_PROFILES = {
+    # Rollback journal, full fsync, deferred transactions: the pre-tuning setup
+    'sqlite-default': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BEGIN_IMMEDIATE': '0',
+        'DB_READ_POOL': '0',
+    },
+    'sqlite-wal': {
+        'SQLITE_JOURNAL_MODE': 'WAL',
+        'SQLITE_SYNCHRONOUS': 'NORMAL',
+        'SQLITE_BEGIN_IMMEDIATE': '1',
+        'DB_READ_POOL': '1',
+    },
+}
+
+
+def run_worker(args):
+    """Seed the database and hammer update_tracking; runs inside the profile's process"""
+    sys.path.insert(0, ROOT)
+    from werkzeug.security import generate_password_hash
+    import app as courier
+    from analytics import percentile
+    import migrations
+
+    app, db = courier.app, courier.db
+    app.config['TRACKING_CACHE_BACKEND'] = 'none'
+    prefix = f'LT{int(time.time()) % 100000:05d}'
+    with app.app_context():
+        migrations.upgrade(db.engine, log=lambda message: None)
+        email = f'{prefix.lower()}@bench.local'
+        admin = courier.User(email=email, password=generate_password_hash('bench'),
+                             name='Load Test', is_admin=True)
+        db.session.add(admin)
+        db.session.flush()
+        tracking_numbers = [f'{prefix}{i:06d}' for i in range(args.shipments)]
+        db.session.add_all(courier.Shipment(
+            tracking_number=number, sender_name='Sender', sender_phone='0',
+            receiver_name='Receiver', receiver_phone='0', pickup_address='Origin',
+            delivery_address='Destination', status='Processing', user_id=admin.id)
+            for number in tracking_numbers)
+        db.session.commit()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.threads)
+
+    def client(index):
+        http = app.test_client()
+        http.post('/login', data={'email': email, 'password': 'bench'})
+        start_barrier.wait()
+        for i in range(args.updates):
+            number = tracking_numbers[(index * args.updates + i) % len(tracking_numbers)]
+            started = time.perf_counter()
+            response = http.post(f'/api/track/{number}/update',
+                                 json={'status': 'In Transit', 'location': f'Hub {index}'})
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    latencies.sort()
+
+    print(json.dumps({
+        'profile': args.profile,
+        'threads': args.threads,
+        'updates': len(latencies) + len(errors),
+        'errors': len(errors),
+        'duration_s': round(duration, 3),
+        'writes_per_s': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }))
+
+
+def run_profile(profile, env_overrides, args):
+    env = dict(os.environ, **env_overrides)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--profile', profile,
+               '--threads', str(args.threads), '--updates', str(args.updates),
+               '--shipments', str(args.shipments)]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'profile': profile, 'error': result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--updates', type=int, default=200, help='updates per thread')
+    parser.add_argument('--shipments', type=int, default=500)
+    parser.add_argument('--postgres-url', help='also run the PostgreSQL profile against this database')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile, overrides in SQLITE_PROFILES.items():
+            url = f'sqlite:///{os.path.join(tmp, profile)}.db'
+            print(json.dumps(run_profile(profile, dict(overrides, DATABASE_URL=url), args)))
+    if args.postgres_url:
+        print(json.dumps(run_profile('postgresql', {'DATABASE_URL': args.postgres_url}, args)))
+
+
+if __name__ == '__main__':
+    main()
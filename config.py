@@ -0,0 +1,272 @@
+"""Application configuration, read from the environment.
+
+``DATABASE_URL`` selects the database. PostgreSQL gets a tuned connection
+pool with pre-ping; SQLite gets WAL journaling, a busy timeout,
+synchronous=NORMAL and BEGIN IMMEDIATE write transactions. Read-only GET
+routes use a separate pool (see database.py), pointed at
+``DATABASE_READ_URL`` when set.
+"""
+import os
+
+from sqlalchemy.pool import QueuePool
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def normalize_database_url(url):
+    """Accept the postgres:// scheme many hosting providers still hand out"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def load_secret_key(path):
+    """Secret key stored at ``path``, created on first use.
+
+    Every process that reads the same file signs sessions with the same key,
+    so sessions survive restarts and work across workers.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    key = os.urandom(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it first
+        with open(path, 'rb') as f:
+            return f.read()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def is_sqlite(url):
+    return url.startswith('sqlite')
+
+
+def engine_options(url, pool_size, max_overflow, pool_recycle, pool_timeout,
+                   pool_pre_ping, sqlite_busy_timeout_ms):
+    """Keyword arguments for create_engine tuned for the database in ``url``"""
+    if is_sqlite(url):
+        options = {
+            'connect_args': {
+                'timeout': sqlite_busy_timeout_ms / 1000,
+                'check_same_thread': False,
+            },
+        }
+        if url not in ('sqlite://', 'sqlite:///:memory:'):
+            # Keep connections (and their PRAGMAs) instead of reopening the file
+            options['poolclass'] = QueuePool
+            options['pool_size'] = pool_size
+            options['max_overflow'] = max_overflow
+            options['pool_timeout'] = pool_timeout
+        return options
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': pool_recycle,
+        'pool_timeout': pool_timeout,
+        'pool_pre_ping': pool_pre_ping,
+    }
+
+
+class Config:
+    # Set SECRET_KEY (or SECRET_KEY_FILE) when running more than one process;
+    # a random per-process key signs out anyone routed to another worker
+    SECRET_KEY = os.environ.get('SECRET_KEY') or (
+        load_secret_key(os.environ['SECRET_KEY_FILE']) if os.environ.get('SECRET_KEY_FILE')
+        else os.urandom(24))
+
+    SQLALCHEMY_DATABASE_URI = normalize_database_url(
+        os.environ.get('DATABASE_URL', 'sqlite:///logistics.db'))
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool (PostgreSQL, and file-backed SQLite)
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_PRE_PING = env_bool('DB_POOL_PRE_PING', True)
+
+    # SQLite write profile
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_BEGIN_IMMEDIATE = env_bool('SQLITE_BEGIN_IMMEDIATE', True)
+
+    # Read-only pool for GET routes
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    DB_READ_POOL = env_bool('DB_READ_POOL', True)
+    DB_READ_POOL_SIZE = env_int('DB_READ_POOL_SIZE', 10)
+
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+        DB_POOL_TIMEOUT, DB_POOL_PRE_PING, SQLITE_BUSY_TIMEOUT_MS)
+
+    # Tracking API
+    TRACKING_CACHE_BACKEND = os.environ.get('TRACKING_CACHE_BACKEND', 'memory')
+    TRACKING_CACHE_URL = os.environ.get('TRACKING_CACHE_URL')
+    TRACKING_CACHE_SIZE = env_int('TRACKING_CACHE_SIZE', 1024)
+    TRACKING_CACHE_TTL = env_int('TRACKING_CACHE_TTL', 30)
+    TRACKING_BATCH_LIMIT = env_int('TRACKING_BATCH_LIMIT', 5000)
+    INGEST_CHUNK_SIZE = env_int('INGEST_CHUNK_SIZE', 1000)
+
+    # Unknown tracking numbers, remembered so repeated misses skip the database.
+    # Entries are dropped when a shipment with the number is committed, but only
+    # in the committing worker's memory backend; the short TTL bounds how long
+    # other workers keep answering 404 for a number that now exists
+    TRACKING_MISS_CACHE_BACKEND = os.environ.get('TRACKING_MISS_CACHE_BACKEND', 'memory')
+    TRACKING_MISS_CACHE_URL = os.environ.get('TRACKING_MISS_CACHE_URL')
+    TRACKING_MISS_CACHE_SIZE = env_int('TRACKING_MISS_CACHE_SIZE', 65536)
+    TRACKING_MISS_CACHE_TTL = env_int('TRACKING_MISS_CACHE_TTL', 5)
+
+    # Rate limits on the public tracking endpoints (rate_limit.py): token buckets
+    # per client IP, or per key for requests with a RATE_LIMIT_API_KEYS key in
+    # the X-API-Key header. Stores: 'memory' (per process), 'local-shared' or
+    # 'redis' (RATE_LIMIT_URL), which all workers share. Behind a reverse proxy
+    # set RATE_LIMIT_TRUSTED_PROXIES to the number of proxies adding X-Forwarded-For.
+    RATE_LIMIT_ENABLED = env_bool('RATE_LIMIT_ENABLED', True)
+    RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+    RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL')
+    RATE_LIMIT_MAX_BUCKETS = env_int('RATE_LIMIT_MAX_BUCKETS', 100000)
+    RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', 1.0))
+    RATE_LIMIT_BURST = env_int('RATE_LIMIT_BURST', 60)
+    RATE_LIMIT_KEY_RATE = float(os.environ.get('RATE_LIMIT_KEY_RATE', 20.0))
+    RATE_LIMIT_KEY_BURST = env_int('RATE_LIMIT_KEY_BURST', 1000)
+    RATE_LIMIT_API_KEYS = [key.strip() for key in os.environ.get('RATE_LIMIT_API_KEYS', '').split(',')
+                           if key.strip()]
+    RATE_LIMIT_TRUSTED_PROXIES = env_int('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    # A batch lookup costs one token per this many tracking numbers
+    RATE_LIMIT_BATCH_NUMBERS_PER_TOKEN = env_int('RATE_LIMIT_BATCH_NUMBERS_PER_TOKEN', 50)
+
+    # Signed-in users, cached between requests so loading the session user
+    # skips the users query; entries are dropped when the user row changes.
+    # Same backends as the tracking cache; use 'redis' with several processes,
+    # where a per-process backend lets other workers see profile changes up
+    # to USER_CACHE_TTL seconds late. Admins are never cached.
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'memory')
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL')
+    USER_CACHE_SIZE = env_int('USER_CACHE_SIZE', 4096)
+    USER_CACHE_TTL = env_int('USER_CACHE_TTL', 60)
+
+    # Password hashing: 'scrypt' or 'pbkdf2'. Hashes written with another
+    # method or cost are upgraded when their owner next signs in. At most
+    # PASSWORD_HASH_WORKERS hashes run at once and PASSWORD_HASH_QUEUE more may
+    # wait; further sign-ins get a 503 instead of occupying request threads.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_PBKDF2_ITERATIONS = env_int('PASSWORD_PBKDF2_ITERATIONS', 600000)
+    PASSWORD_SCRYPT_N = env_int('PASSWORD_SCRYPT_N', 32768)
+    PASSWORD_SCRYPT_R = env_int('PASSWORD_SCRYPT_R', 8)
+    PASSWORD_SCRYPT_P = env_int('PASSWORD_SCRYPT_P', 1)
+    PASSWORD_HASH_WORKERS = env_int('PASSWORD_HASH_WORKERS', 4)
+    PASSWORD_HASH_QUEUE = env_int('PASSWORD_HASH_QUEUE', 32)
+    PASSWORD_HASH_TIMEOUT = env_int('PASSWORD_HASH_TIMEOUT', 10)
+
+    # Page rendering (page_cache.py): public pages are cached as encoded bytes,
+    # one variant per sign-in state, and anonymous visitors may reuse them for
+    # PAGE_MAX_AGE seconds; admin dashboard fragments are cached per data version.
+    # Fingerprinted static assets ('flask assets build') are cached for STATIC_MAX_AGE.
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_URL = os.environ.get('PAGE_CACHE_URL')
+    PAGE_CACHE_SIZE = env_int('PAGE_CACHE_SIZE', 256)
+    PAGE_CACHE_TTL = env_int('PAGE_CACHE_TTL', 300)
+    PAGE_MAX_AGE = env_int('PAGE_MAX_AGE', 300)
+    STATIC_MAX_AGE = env_int('STATIC_MAX_AGE', 31536000)
+
+    # Tracking number allocation: blocks of sequence values reserved per process.
+    # The format may use {prefix}, {date} and {sequence}; a Luhn check digit is appended.
+    TRACKING_NUMBER_PREFIX = os.environ.get('TRACKING_NUMBER_PREFIX', 'SC')
+    TRACKING_NUMBER_FORMAT = os.environ.get('TRACKING_NUMBER_FORMAT', '{prefix}{date:%y%m%d}{sequence:08d}')
+    TRACKING_NUMBER_BLOCK_SIZE = env_int('TRACKING_NUMBER_BLOCK_SIZE', 1000)
+
+    # Tracking event archive ('flask archive-events'): events of shipments
+    # delivered more than ARCHIVE_AFTER_DAYS ago move to compressed storage
+    ARCHIVE_AFTER_DAYS = env_int('ARCHIVE_AFTER_DAYS', 365)
+    ARCHIVE_BATCH_SIZE = env_int('ARCHIVE_BATCH_SIZE', 500)
+    ARCHIVE_PAUSE = float(os.environ.get('ARCHIVE_PAUSE', 0.1))
+
+    # Delivery analytics (/admin/analytics): date ranges and the rollup backfill
+    ANALYTICS_DEFAULT_DAYS = env_int('ANALYTICS_DEFAULT_DAYS', 30)
+    ANALYTICS_MAX_DAYS = env_int('ANALYTICS_MAX_DAYS', 366)
+    ANALYTICS_BACKFILL_BATCH_SIZE = env_int('ANALYTICS_BACKFILL_BATCH_SIZE', 500)
+    ANALYTICS_BACKFILL_PAUSE = float(os.environ.get('ANALYTICS_BACKFILL_PAUSE', 0.1))
+
+    # Manifest imports; result files default to <instance>/manifests
+    MANIFEST_CHUNK_SIZE = env_int('MANIFEST_CHUNK_SIZE', 1000)
+    MANIFEST_RESULT_DIR = os.environ.get('MANIFEST_RESULT_DIR')
+
+    # Shipment listings (/api/shipments, /admin/shipments)
+    SHIPMENT_PAGE_SIZE = env_int('SHIPMENT_PAGE_SIZE', 50)
+    SHIPMENT_PAGE_SIZE_MAX = env_int('SHIPMENT_PAGE_SIZE_MAX', 200)
+
+    # Full-text shipment search (/api/search)
+    SEARCH_PAGE_SIZE = env_int('SEARCH_PAGE_SIZE', 20)
+    SEARCH_MAX_RESULTS = env_int('SEARCH_MAX_RESULTS', 1000)
+    SEARCH_MAX_TERMS = env_int('SEARCH_MAX_TERMS', 8)
+
+    # Instrumentation: per-endpoint latency and SQL statistics on /metrics.
+    # The debug header adds Server-Timing and X-Query-Count to every response.
+    INSTRUMENTATION_ENABLED = env_bool('INSTRUMENTATION_ENABLED', True)
+    INSTRUMENTATION_DEBUG_HEADER = env_bool('INSTRUMENTATION_DEBUG_HEADER', False)
+    SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+    N_PLUS_ONE_THRESHOLD = env_int('N_PLUS_ONE_THRESHOLD', 10)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Notification inbox (/api/notifications)
+    NOTIFICATION_PAGE_SIZE = env_int('NOTIFICATION_PAGE_SIZE', 20)
+    NOTIFICATION_PAGE_SIZE_MAX = env_int('NOTIFICATION_PAGE_SIZE_MAX', 100)
+    NOTIFICATION_MARK_READ_MAX = env_int('NOTIFICATION_MARK_READ_MAX', 1000)
+
+    # Notification dispatch: 'thread' runs workers inside each app process,
+    # 'external' leaves the outbox to 'flask dispatch-notifications'
+    NOTIFICATION_DISPATCH_MODE = os.environ.get('NOTIFICATION_DISPATCH_MODE', 'thread')
+    NOTIFICATION_DISPATCH_WORKERS = env_int('NOTIFICATION_DISPATCH_WORKERS', 2)
+    NOTIFICATION_DISPATCH_BATCH_SIZE = env_int('NOTIFICATION_DISPATCH_BATCH_SIZE', 100)
+    NOTIFICATION_DISPATCH_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_DISPATCH_POLL_INTERVAL', 5))
+    NOTIFICATION_DISPATCH_LEASE = env_int('NOTIFICATION_DISPATCH_LEASE', 60)
+    NOTIFICATION_MAX_ATTEMPTS = env_int('NOTIFICATION_MAX_ATTEMPTS', 5)
+    NOTIFICATION_RETRY_BASE = env_int('NOTIFICATION_RETRY_BASE', 5)
+
+    # Production server (serve.py): preforked gunicorn workers with threads.
+    # Each worker has its own database pools, so the database sees up to
+    # SERVER_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+    SERVER_WORKERS = env_int('SERVER_WORKERS', 2 * (os.cpu_count() or 1) + 1)
+    SERVER_THREADS = env_int('SERVER_THREADS', 4)
+    SERVER_TIMEOUT = env_int('SERVER_TIMEOUT', 30)
+    SERVER_GRACEFUL_TIMEOUT = env_int('SERVER_GRACEFUL_TIMEOUT', 30)
+    SERVER_KEEPALIVE = env_int('SERVER_KEEPALIVE', 5)
+    SERVER_MAX_REQUESTS = env_int('SERVER_MAX_REQUESTS', 0)
+    SERVER_PRELOAD = env_bool('SERVER_PRELOAD', True)
+
+    # Live tracking streams. Under threaded workers each open stream on the
+    # Flask endpoint holds a request thread, so at most
+    # LIVE_UPDATES_MAX_BLOCKING_STREAMS are served per process (raise it under
+    # gevent). Tracking pages only open a stream when LIVE_UPDATES_STREAM_URL
+    # names one, normally /api/track/stream routed to 'uvicorn live_asgi:app'
+    # with LIVE_UPDATES_BROKER=redis; otherwise they poll every
+    # LIVE_UPDATES_POLL_INTERVAL seconds (0: never). A reconnecting client is
+    # sent at most LIVE_UPDATES_REPLAY_LIMIT of the events it missed.
+    LIVE_UPDATES_STREAM_URL = os.environ.get('LIVE_UPDATES_STREAM_URL', '')
+    LIVE_UPDATES_POLL_INTERVAL = env_int('LIVE_UPDATES_POLL_INTERVAL', 30)
+    LIVE_UPDATES_MAX_BLOCKING_STREAMS = env_int('LIVE_UPDATES_MAX_BLOCKING_STREAMS', SERVER_THREADS // 2)
+    LIVE_UPDATES_BROKER = os.environ.get('LIVE_UPDATES_BROKER', 'local')
+    LIVE_UPDATES_URL = os.environ.get('LIVE_UPDATES_URL')
+    LIVE_UPDATES_MAX_SUBSCRIBERS = env_int('LIVE_UPDATES_MAX_SUBSCRIBERS', 10000)
+    LIVE_UPDATES_MAX_CHANNELS = env_int('LIVE_UPDATES_MAX_CHANNELS', 100)
+    LIVE_UPDATES_QUEUE_SIZE = env_int('LIVE_UPDATES_QUEUE_SIZE', 100)
+    LIVE_UPDATES_HEARTBEAT = env_int('LIVE_UPDATES_HEARTBEAT', 15)
+    LIVE_UPDATES_REPLAY_LIMIT = env_int('LIVE_UPDATES_REPLAY_LIMIT', 100)
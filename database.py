@@ -0,0 +1,145 @@
+"""Database engines and sessions.
+
+``Database`` is Flask-SQLAlchemy with two additions: SQLite connections get
+the PRAGMAs from the config (WAL, synchronous, busy timeout) and optionally
+BEGIN IMMEDIATE transactions, so concurrent writers queue on the busy
+timeout instead of failing on a lock upgrade; and ``db.read_session`` is a
+second scoped session on a read-only pool for routes that never write.
+"""
+import os
+import threading
+
+from flask import _app_ctx_stack
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session
+from sqlalchemy.pool import QueuePool
+
+
+def configure_sqlite(engine, config, read_only=False):
+    """Apply the SQLite PRAGMA profile to every new connection of ``engine``"""
+    begin_immediate = config['SQLITE_BEGIN_IMMEDIATE'] and not read_only
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if begin_immediate:
+            # Let SQLAlchemy, not the driver, decide when transactions begin
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if read_only:
+            cursor.execute('PRAGMA query_only = ON')
+        else:
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+            cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.close()
+
+    if begin_immediate:
+        @event.listens_for(engine, 'begin')
+        def begin_sqlite_immediate(connection):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def add_to_rows(connection, table, key_columns, rows):
+    """Insert ``rows``, or add their other values onto existing rows with the same key, in one statement"""
+    if not rows:
+        return
+    value_columns = [name for name in rows[0] if name not in key_columns]
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        if connection.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key_columns],
+            set_={name: table.c[name] + stmt.excluded[name] for name in value_columns})
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        result = connection.execute(
+            table.update()
+                .where(*[table.c[name] == row[name] for name in key_columns])
+                .values({name: table.c[name] + row[name] for name in value_columns}))
+        if not result.rowcount:
+            connection.execute(table.insert(), row)
+
+
+class Database(SQLAlchemy):
+    """Flask-SQLAlchemy with the engine profiles from config.py"""
+
+    def __init__(self, app=None, **kwargs):
+        self._read_engine = None
+        self._read_engine_lock = threading.Lock()
+        self.read_session = scoped_session(self._create_read_session,
+                                           scopefunc=_app_ctx_stack.__ident_func__)
+        super().__init__(app, **kwargs)
+
+    def init_app(self, app):
+        super().init_app(app)
+
+        @app.teardown_appcontext
+        def remove_read_session(exception):
+            self.read_session.remove()
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if engine.dialect.name == 'sqlite':
+            configure_sqlite(engine, self.get_app().config)
+        return engine
+
+    def get_read_engine(self):
+        """Engine for the read-only pool, or None when reads share the main pool"""
+        app = self.get_app()
+        config = app.config
+        if not config['DB_READ_POOL']:
+            return None
+        with self._read_engine_lock:
+            if self._read_engine is None:
+                self._read_engine = self._build_read_engine(app, config)
+            return self._read_engine or None
+
+    def _build_read_engine(self, app, config):
+        url = make_url(config['DATABASE_READ_URL'] or config['SQLALCHEMY_DATABASE_URI'])
+        if url.drivername.startswith('sqlite'):
+            if url.database in (None, '', ':memory:'):
+                return False
+            path = os.path.join(app.root_path, url.database)
+            engine = create_engine(
+                f'sqlite:///file:{path}?mode=ro&uri=true',
+                poolclass=QueuePool,
+                pool_size=config['DB_READ_POOL_SIZE'],
+                max_overflow=config['DB_MAX_OVERFLOW'],
+                pool_timeout=config['DB_POOL_TIMEOUT'],
+                connect_args={'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                              'check_same_thread': False})
+            configure_sqlite(engine, config, read_only=True)
+            return engine
+        connect_args = {}
+        if url.drivername.startswith('postgresql'):
+            connect_args['options'] = '-c default_transaction_read_only=on'
+        return create_engine(
+            url,
+            pool_size=config['DB_READ_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_pre_ping=config['DB_POOL_PRE_PING'],
+            connect_args=connect_args)
+
+    def _create_read_session(self):
+        engine = self.get_read_engine()
+        if engine is None:
+            return self.session()
+        return SignallingSession(self, bind=engine, binds={}, query_cls=self.Query)
+
+    def dispose_engines(self, close=True):
+        """Drop pooled connections, e.g. in a worker process right after fork.
+
+        A forked child passes ``close=False``: the inherited connections are
+        only forgotten, since closing them would also close the parent's.
+        """
+        self.engine.dispose(close=close)
+        if self._read_engine:
+            self._read_engine.dispose(close=close)
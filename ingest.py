@@ -0,0 +1,117 @@
+"""Parsing helpers for bulk scan ingestion from scanner and hub feeds.
+
+Feeds arrive as JSON Lines or CSV with the columns tracking_number, status,
+location, description and an optional ISO 8601 timestamp. Input is read
+and decoded line by line so memory stays bounded by the chunk size, not
+the upload.
+"""
+from datetime import datetime, timezone
+from itertools import islice
+import csv
+import json
+
+FIELDS = ('tracking_number', 'status', 'location', 'description', 'timestamp')
+
+
+class IngestError(ValueError):
+    """A single feed line could not be accepted"""
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise IngestError(f'Invalid timestamp: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def normalize_scan(record):
+    """Validate a raw record and return a scan dict with the known fields"""
+    if not isinstance(record, dict):
+        raise IngestError('Each line must be an object')
+    scan = {field: (str(record.get(field) or '')).strip() for field in FIELDS}
+    if not scan['tracking_number']:
+        raise IngestError('tracking_number is required')
+    if not scan['status']:
+        raise IngestError('status is required')
+    scan['timestamp'] = parse_timestamp(scan['timestamp']) if scan['timestamp'] else None
+    return scan
+
+
+def iter_jsonl(lines):
+    for line_no, line in enumerate(lines, 1):
+        try:
+            line = line.decode('utf-8')
+        except UnicodeDecodeError:
+            yield line_no, None, 'Line is not valid UTF-8'
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_no, normalize_scan(json.loads(line)), None
+        except json.JSONDecodeError as e:
+            yield line_no, None, f'Invalid JSON: {e.msg}'
+        except IngestError as e:
+            yield line_no, None, str(e)
+
+
+def iter_csv(lines):
+    reader = csv.DictReader(line.decode('utf-8') for line in lines)
+    try:
+        missing = {'tracking_number', 'status'} - set(reader.fieldnames or ())
+        if missing:
+            yield 1, None, f'Missing CSV columns: {", ".join(sorted(missing))}'
+            return
+        for record in reader:
+            try:
+                yield reader.line_num, normalize_scan(record), None
+            except IngestError as e:
+                yield reader.line_num, None, str(e)
+    except UnicodeDecodeError:
+        # A quoted field may span lines, so reading cannot resume after a bad one
+        yield reader.line_num + 1, None, 'Line is not valid UTF-8; the rest of the feed was not read'
+    except csv.Error as e:
+        yield reader.line_num, None, f'Invalid CSV: {e}; the rest of the feed was not read'
+
+
+def iter_scans(stream, fmt):
+    """Yield ``(line_no, scan, error)`` for every line of a binary stream
+
+    Lines are decoded one at a time, so bytes that are not UTF-8 only
+    reject their own line (in CSV, where records may span lines, they end
+    the feed) and never raise half way through an ingest.
+    """
+    if fmt == 'csv':
+        return iter_csv(stream)
+    if fmt == 'jsonl':
+        return iter_jsonl(stream)
+    raise ValueError(f'Unsupported feed format: {fmt}')
+
+
+def detect_format(content_type, filename=None):
+    """Pick the feed format from an upload's filename or content type"""
+    if filename:
+        if filename.lower().endswith('.csv'):
+            return 'csv'
+        if filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+            return 'jsonl'
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/json-lines'):
+        return 'jsonl'
+    return None
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most ``size`` items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
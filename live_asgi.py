@@ -0,0 +1,51 @@
+"""ASGI entry point for live tracking streams.
+
+    uvicorn live_asgi:app
+
+Serves /api/track/stream from an asyncio server, where each open stream is
+a coroutine rather than a thread. It does not load the Flask app; events
+reach it through the shared broker (LIVE_UPDATES_BROKER=redis), so the WSGI
+workers must be configured with the same broker. Events a reconnecting
+client missed are read straight from the database; archived history is
+left to the Flask endpoint.
+"""
+import sqlalchemy as sa
+
+from config import Config
+from live_updates import asgi_app, create_hub, tracking_frame
+
+config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+
+tracking_event = sa.table('tracking_event', sa.column('id'), sa.column('shipment_id'),
+                          sa.column('status'), sa.column('location'), sa.column('description'),
+                          sa.column('timestamp', sa.DateTime))
+shipment = sa.table('shipment', sa.column('id'), sa.column('tracking_number'), sa.column('status'))
+
+engine = sa.create_engine(config['SQLALCHEMY_DATABASE_URI'], **config['SQLALCHEMY_ENGINE_OPTIONS'])
+
+
+def replay(channels, last_event_id):
+    """Frames for the latest events committed after ``last_event_id``, oldest first"""
+    query = sa.select(tracking_event.c.id, tracking_event.c.status, tracking_event.c.location,
+                      tracking_event.c.description, tracking_event.c.timestamp,
+                      shipment.c.tracking_number, shipment.c.status.label('shipment_status'))\
+        .select_from(tracking_event.join(shipment, shipment.c.id == tracking_event.c.shipment_id))\
+        .where(shipment.c.tracking_number.in_(channels), tracking_event.c.id > last_event_id)\
+        .order_by(tracking_event.c.id.desc())\
+        .limit(config['LIVE_UPDATES_REPLAY_LIMIT'])
+    with engine.connect() as connection:
+        rows = connection.execute(query).all()
+    return [tracking_frame(row.tracking_number, row.shipment_status, {
+        'id': row.id,
+        'status': row.status,
+        'location': row.location,
+        'description': row.description,
+        'timestamp': row.timestamp.isoformat()
+    }) for row in reversed(rows)]
+
+
+hub = create_hub(config)
+app = asgi_app(hub,
+               heartbeat=config['LIVE_UPDATES_HEARTBEAT'],
+               max_channels=config['LIVE_UPDATES_MAX_CHANNELS'],
+               replay=replay)
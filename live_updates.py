@@ -0,0 +1,371 @@
+"""Live tracking updates pushed to clients as server-sent events.
+
+Committed tracking events are published on a per-tracking-number channel.
+A ``LiveHub`` in every process fans messages out to its local subscribers;
+a broker carries publishes between processes: ``LocalBroker`` is the
+single-process stand-in, ``RedisBroker`` uses Redis pub/sub. Messages are
+rendered to an SSE frame once at publish time, so fan-out only copies a
+string reference per subscriber. Every tracking frame carries the event
+id, so a reconnecting client's ``Last-Event-ID`` header says where to
+resume; the missed events are replayed from the database before the
+stream continues with live ones.
+
+An idle subscriber is one small queue. Under a threaded WSGI worker each
+open stream still holds a thread, so the hub caps blocking subscriptions
+at ``max_blocking`` per process; for thousands of connections per worker
+serve streams from ``asgi_app`` on an asyncio server, where a connection
+is a coroutine, or run the Flask endpoint under gevent.
+"""
+from collections import defaultdict
+from urllib.parse import parse_qs
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class HubFull(Exception):
+    """The process already holds its maximum number of subscribers"""
+
+
+class SubscriptionClosed(Exception):
+    """The subscriber fell too far behind and was disconnected"""
+
+
+def format_sse(data, event=None, event_id=None):
+    """Render one server-sent event frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+def tracking_frame(tracking_number, status, event_data):
+    """The ``tracking`` frame for one tracking event, identified by its id"""
+    return format_sse(json.dumps({'tracking_number': tracking_number, 'status': status,
+                                  'event': event_data}),
+                      event='tracking',
+                      event_id=event_data['id'])
+
+
+def frame_id(frame):
+    """The id line of a rendered frame as an int, or None"""
+    if not frame.startswith('id: '):
+        return None
+    return int(frame[4:frame.index('\n')])
+
+
+def parse_last_event_id(value):
+    """The event id a reconnecting client last received, or None"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+class Subscription:
+    """Blocking subscription for WSGI request threads (or greenlets)"""
+
+    def __init__(self, hub, channels, maxsize):
+        self.hub = hub
+        self.channels = channels
+        self.closed = False
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def deliver(self, frame):
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self.overflowed = True
+            self.close()
+
+    def get(self, timeout=None):
+        """Next frame, or None on timeout; raises SubscriptionClosed on overflow"""
+        if self.overflowed:
+            raise SubscriptionClosed()
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """Subscription consumed from an asyncio event loop"""
+
+    def __init__(self, hub, channels, maxsize, loop):
+        super().__init__(hub, channels, maxsize)
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize)
+
+    def deliver(self, frame):
+        self._loop.call_soon_threadsafe(self._put, frame)
+
+    def _put(self, frame):
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+
+    async def get(self, timeout=None):
+        if self.overflowed:
+            raise SubscriptionClosed()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveHub:
+    """Per-process registry of subscribers, keyed by channel"""
+
+    def __init__(self, broker, max_subscribers=10000, queue_size=100, max_blocking=None):
+        self.broker = broker
+        self.max_subscribers = max_subscribers
+        self.max_blocking = max_blocking
+        self.queue_size = queue_size
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self._channels = defaultdict(set)
+        self._count = 0
+        self._blocking = 0
+        self._lock = threading.Lock()
+        broker.attach(self)
+
+    def _register(self, subscription):
+        blocking = not isinstance(subscription, AsyncSubscription)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise HubFull()
+            if blocking and self.max_blocking is not None and self._blocking >= self.max_blocking:
+                raise HubFull()
+            self._count += 1
+            self._blocking += blocking
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+        self.broker.start()
+        return subscription
+
+    def subscribe(self, channels):
+        return self._register(Subscription(self, list(channels), self.queue_size))
+
+    def subscribe_async(self, channels, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        return self._register(AsyncSubscription(self, list(channels), self.queue_size, loop))
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            # Closed from the request thread and on overflow; count it once
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._count -= 1
+            self._blocking -= not isinstance(subscription, AsyncSubscription)
+            if subscription.overflowed:
+                self.dropped += 1
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel, frame):
+        self.published += 1
+        self.broker.publish(channel, frame)
+
+    def dispatch(self, channel, frame):
+        """Deliver a frame from the broker to this process's subscribers"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(frame)
+        self.delivered += len(subscribers)
+
+    def stats(self):
+        return {
+            'broker': type(self.broker).__name__,
+            'subscribers': self._count,
+            'blocking_subscribers': self._blocking,
+            'channels': len(self._channels),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+        }
+
+
+class LocalBroker:
+    """Single-process stand-in: publishes go straight to the local hub"""
+
+    def attach(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, channel, frame):
+        self.hub.dispatch(channel, frame)
+
+
+class RedisBroker:
+    """Carries publishes between processes over Redis pub/sub"""
+
+    def __init__(self, url, prefix='live:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for the redis live update broker')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def attach(self, hub):
+        self.hub = hub
+
+    def start(self):
+        # Started lazily so that forked workers each get their own listener
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='live-updates-redis',
+                                                  daemon=True)
+                self._listener.start()
+
+    def publish(self, channel, frame):
+        self.client.publish(self.prefix + channel, frame)
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.prefix + '*')
+        for message in pubsub.listen():
+            try:
+                channel = message['channel'].decode('utf-8')[len(self.prefix):]
+                self.hub.dispatch(channel, message['data'].decode('utf-8'))
+            except Exception:
+                logger.exception('Failed to dispatch live update')
+
+
+def create_hub(config):
+    """Build the hub with the broker selected by LIVE_UPDATES_BROKER"""
+    kind = config.get('LIVE_UPDATES_BROKER', 'local')
+    if kind == 'local':
+        broker = LocalBroker()
+    elif kind == 'redis':
+        broker = RedisBroker(config['LIVE_UPDATES_URL'])
+    else:
+        raise ValueError(f'Unknown live updates broker: {kind}')
+    return LiveHub(broker,
+                   max_subscribers=config.get('LIVE_UPDATES_MAX_SUBSCRIBERS', 10000),
+                   queue_size=config.get('LIVE_UPDATES_QUEUE_SIZE', 100),
+                   max_blocking=config.get('LIVE_UPDATES_MAX_BLOCKING_STREAMS'))
+
+
+def parse_channels(values, limit):
+    """Tracking numbers from comma-separated query values, de-duplicated"""
+    channels = []
+    for value in values:
+        channels.extend(part.strip() for part in value.split(',') if part.strip())
+    channels = list(dict.fromkeys(channels))
+    if not channels:
+        raise ValueError('At least one tracking number is required')
+    if len(channels) > limit:
+        raise ValueError(f'At most {limit} tracking numbers per stream')
+    return channels
+
+
+def asgi_app(hub, path='/api/track/stream', heartbeat=15, max_channels=100, replay=None):
+    """ASGI application serving the same stream as the Flask endpoint
+
+    Run it on an asyncio server (e.g. ``uvicorn live_asgi:app``) with a
+    shared broker, so events committed by the WSGI workers reach it.
+    ``replay(channels, last_event_id)`` returns the frames a reconnecting
+    client missed; it blocks, so it runs in the default executor.
+    """
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http' or scope['path'] != path:
+            await _send_error(send, 404, 'Not found')
+            return
+        query = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+        try:
+            channels = parse_channels(query.get('tracking_numbers', []) +
+                                      query.get('tracking_number', []), max_channels)
+            subscription = hub.subscribe_async(channels)
+        except ValueError as e:
+            await _send_error(send, 400, str(e))
+            return
+        except HubFull:
+            await _send_error(send, 503, 'Too many live connections')
+            return
+
+        headers = dict(scope.get('headers', ()))
+        last_event_id = parse_last_event_id(headers.get(b'last-event-id', b'').decode('latin-1'))
+        missed = []
+        if replay is not None and last_event_id is not None:
+            try:
+                missed = await asyncio.get_running_loop().run_in_executor(
+                    None, replay, channels, last_event_id)
+            except Exception:
+                subscription.close()
+                raise
+        replayed = {frame_id(frame) for frame in missed}
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+            for frame in missed:
+                await send({'type': 'http.response.body', 'body': frame.encode('utf-8'),
+                            'more_body': True})
+            while not disconnected.is_set():
+                frame = await subscription.get(timeout=heartbeat)
+                # Subscribed before the replay, so an event can arrive both ways
+                if frame is not None and replayed and frame_id(frame) in replayed:
+                    continue
+                body = ': keep-alive\n\n' if frame is None else frame
+                await send({'type': 'http.response.body', 'body': body.encode('utf-8'),
+                            'more_body': True})
+        except SubscriptionClosed:
+            pass
+        finally:
+            watcher.cancel()
+            subscription.close()
+
+    return app
+
+
+async def _send_error(send, status, message):
+    body = json.dumps({'error': message}).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,173 @@
+"""Parsing helpers for merchant shipment manifests.
+
+A manifest lists one shipment per row with the same fields as the create
+shipment form, plus an optional merchant ``reference``. It arrives as CSV,
+JSON Lines or a JSON array of objects; all three are read incrementally, so
+memory is bounded by the import chunk size rather than the file size. Rows
+are numbered from 1 in file order (the CSV header does not count).
+"""
+from json import JSONDecodeError, JSONDecoder
+import csv
+import io
+
+# Field name -> maximum length, matching the shipment columns
+FIELDS = {
+    'reference': 100,
+    'sender_name': 100,
+    'sender_phone': 20,
+    'receiver_name': 100,
+    'receiver_phone': 20,
+    'pickup_address': 200,
+    'delivery_address': 200,
+    'weight': None,
+    'description': None,
+}
+
+REQUIRED = ('sender_name', 'sender_phone', 'receiver_name', 'receiver_phone',
+            'pickup_address', 'delivery_address')
+
+# A JSON array element larger than this is treated as malformed input
+MAX_ITEM_CHARS = 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+class ManifestError(ValueError):
+    """A manifest row could not be accepted"""
+
+
+def normalize_row(record):
+    """Validate a raw record and return a row dict with the known fields"""
+    if not isinstance(record, dict):
+        raise ManifestError('Each row must be an object')
+    row = {field: str(record.get(field) or '').strip() for field in FIELDS}
+    missing = [field for field in REQUIRED if not row[field]]
+    if missing:
+        raise ManifestError(f"Missing {', '.join(missing)}")
+    for field, max_length in FIELDS.items():
+        if max_length and len(row[field]) > max_length:
+            raise ManifestError(f'{field} is longer than {max_length} characters')
+    if row['weight']:
+        try:
+            row['weight'] = float(row['weight'])
+        except ValueError:
+            raise ManifestError(f"Invalid weight: {row['weight']}")
+        if row['weight'] < 0:
+            raise ManifestError('weight must not be negative')
+    else:
+        row['weight'] = 0.0
+    return row
+
+
+def _validated(records):
+    for row_no, record in records:
+        try:
+            yield row_no, normalize_row(record), None
+        except ManifestError as e:
+            # Keep the merchant's reference so rejected rows can be matched up
+            reference = record.get('reference') if isinstance(record, dict) else None
+            yield row_no, {'reference': str(reference or '')[:100]}, str(e)
+
+
+def iter_csv(lines):
+    reader = csv.DictReader(lines)
+    missing = set(REQUIRED) - set(reader.fieldnames or ())
+    if missing:
+        yield 0, None, f'Missing CSV columns: {", ".join(sorted(missing))}'
+        return
+    yield from _validated(enumerate(reader, 1))
+
+
+def iter_jsonl(lines):
+    row_no = 0
+    decoder = JSONDecoder()
+    for line in lines:
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = decoder.decode(line)
+        except JSONDecodeError as e:
+            yield row_no, None, f'Invalid JSON: {e.msg}'
+            continue
+        yield from _validated([(row_no, record)])
+
+
+def iter_json_array(text):
+    """Decode the elements of a top-level JSON array one at a time"""
+    decoder = JSONDecoder()
+    buffer = text.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        yield 0, None, 'Expected a JSON array of shipments'
+        return
+    buffer = buffer[1:]
+    row_no = 0
+    eof = False
+    # 'first': an element or ']'; 'element': an element; 'separator': ',' or ']'
+    state = 'first'
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer and not eof:
+            data = text.read(READ_SIZE)
+            eof = not data
+            buffer += data
+            continue
+        if state != 'element' and buffer.startswith(']'):
+            return
+        if state == 'separator':
+            if not buffer.startswith(','):
+                yield row_no + 1, None, "Invalid JSON: Expecting ',' delimiter"
+                return
+            buffer = buffer[1:]
+            state = 'element'
+            continue
+        try:
+            if not buffer:
+                raise JSONDecodeError('Incomplete', buffer, 0)
+            record, end = decoder.raw_decode(buffer)
+        except JSONDecodeError as e:
+            if eof or len(buffer) > MAX_ITEM_CHARS:
+                yield row_no + 1, None, f'Invalid JSON: {e.msg}'
+                return
+            data = text.read(READ_SIZE)
+            eof = not data
+            buffer += data
+            continue
+        row_no += 1
+        buffer = buffer[end:]
+        state = 'separator'
+        yield from _validated([(row_no, record)])
+
+
+def iter_rows(stream, fmt):
+    """Yield ``(row_no, row, error)`` for every row of a binary stream
+
+    ``row`` is the validated row, or on error a dict with just the row's
+    ``reference`` when it could be read, or None.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        return iter_csv(text)
+    if fmt == 'jsonl':
+        return iter_jsonl(text)
+    if fmt == 'json':
+        return iter_json_array(text)
+    raise ValueError(f'Unsupported manifest format: {fmt}')
+
+
+def detect_format(content_type, filename=None):
+    """Pick the manifest format from an upload's filename or content type"""
+    if filename:
+        name = filename.lower()
+        if name.endswith('.csv'):
+            return 'csv'
+        if name.endswith(('.jsonl', '.ndjson')):
+            return 'jsonl'
+        if name.endswith('.json'):
+            return 'json'
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/json-lines'):
+        return 'jsonl'
+    if content_type == 'application/json':
+        return 'json'
+    return None
@@ -0,0 +1,116 @@
+"""Versioned schema migrations.
+
+Each migration is a module in ``migrations/versions`` named
+``NNNN_short_name.py`` that defines ``upgrade(connection)`` and, where it
+can be undone, ``downgrade(connection)``. The module docstring is used as
+its description. Applied revisions are recorded in the ``schema_version``
+table and every migration runs in its own transaction.
+"""
+from datetime import datetime
+import importlib
+import os
+import re
+
+import sqlalchemy as sa
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+VERSION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+metadata = sa.MetaData()
+schema_version = sa.Table(
+    'schema_version', metadata,
+    sa.Column('revision', sa.String(4), primary_key=True),
+    sa.Column('name', sa.String(100), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+
+class Migration:
+    """A single migration module on disk"""
+
+    def __init__(self, revision, name):
+        self.revision = revision
+        self.name = name
+        self.module = importlib.import_module(f'migrations.versions.{revision}_{name}')
+
+    @property
+    def description(self):
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+    def upgrade(self, connection):
+        self.module.upgrade(connection)
+
+    def downgrade(self, connection):
+        if not hasattr(self.module, 'downgrade'):
+            raise RuntimeError(f'Migration {self.revision} cannot be downgraded')
+        self.module.downgrade(connection)
+
+    def __repr__(self):
+        return f'<Migration {self.revision}_{self.name}>'
+
+
+def discover():
+    """All migrations on disk, ordered by revision"""
+    migrations = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        match = VERSION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(*match.groups()))
+    return migrations
+
+
+def applied_revisions(connection):
+    """Revisions already recorded in schema_version"""
+    schema_version.create(connection, checkfirst=True)
+    return {row.revision for row in connection.execute(sa.select(schema_version.c.revision))}
+
+
+def current_revision(engine):
+    with engine.begin() as connection:
+        applied = applied_revisions(connection)
+    return max(applied) if applied else None
+
+
+def upgrade(engine, target=None, log=print):
+    """Apply pending migrations up to and including ``target`` (default: latest)"""
+    with engine.begin() as connection:
+        applied = applied_revisions(connection)
+    count = 0
+    for migration in discover():
+        if target is not None and migration.revision > target:
+            break
+        if migration.revision in applied:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(schema_version.insert().values(
+                revision=migration.revision,
+                name=migration.name,
+                applied_at=datetime.utcnow()))
+        log(f'Applied {migration.revision}_{migration.name}: {migration.description}')
+        count += 1
+    return count
+
+
+def downgrade(engine, target, log=print):
+    """Revert applied migrations newer than ``target`` (use '0000' to revert all)"""
+    with engine.begin() as connection:
+        applied = applied_revisions(connection)
+    count = 0
+    for migration in reversed(discover()):
+        if migration.revision <= target or migration.revision not in applied:
+            continue
+        with engine.begin() as connection:
+            migration.downgrade(connection)
+            connection.execute(schema_version.delete()
+                               .where(schema_version.c.revision == migration.revision))
+        log(f'Reverted {migration.revision}_{migration.name}')
+        count += 1
+    return count
+
+
+def status(engine):
+    """List of ``(migration, applied)`` pairs for every migration on disk"""
+    with engine.begin() as connection:
+        applied = applied_revisions(connection)
+    return [(migration, migration.revision in applied) for migration in discover()]
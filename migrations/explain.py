@@ -0,0 +1,44 @@
+"""EXPLAIN-based check that hot route queries are served by an index.
+
+Each query is explained on the live database. On SQLite a plan line that
+scans a table without an index (``SCAN shipment``) fails the check; on
+PostgreSQL any ``Seq Scan`` does. PostgreSQL is asked with sequential scans
+disabled, since on a small development table it would rightly prefer one.
+Other dialects are refused with a ClickException, which the CLI reports as
+an error message rather than a traceback.
+"""
+import click
+
+
+def explain(connection, statement):
+    """Return the query plan for a SQLAlchemy statement as a list of lines"""
+    compiled = statement.compile(dialect=connection.dialect,
+                                 compile_kwargs={'render_postcompile': True})
+    if connection.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return [row[-1] for row in rows]
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+        return [row[0] for row in rows]
+    raise click.ClickException(f'The index check supports SQLite and PostgreSQL, not {connection.dialect.name}')
+
+
+def full_scans(dialect_name, plan):
+    """Plan lines that read a whole table instead of going through an index"""
+    if dialect_name == 'sqlite':
+        # SCAN CONSTANT ROW is the row a SELECT without FROM produces, not a table
+        return [line for line in plan
+                if line.strip().startswith('SCAN ') and ' USING ' not in line
+                and line.strip() != 'SCAN CONSTANT ROW']
+    return [line for line in plan if 'Seq Scan' in line]
+
+
+def check_queries(connection, queries):
+    """Explain every ``name -> statement`` and return ``(name, ok, plan)`` tuples"""
+    results = []
+    for name, statement in queries.items():
+        plan = explain(connection, statement)
+        results.append((name, not full_scans(connection.dialect.name, plan), plan))
+    return results
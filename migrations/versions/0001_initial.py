@@ -0,0 +1,66 @@
+"""Create the user, shipment, tracking_event and notification tables
+
+Tables are created with checkfirst, so databases that were set up with
+db.create_all() before migrations existed are adopted as-is.
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+user = sa.Table(
+    'user', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('email', sa.String(100), unique=True, nullable=False),
+    sa.Column('password', sa.String(200), nullable=False),
+    sa.Column('name', sa.String(100), nullable=False),
+    sa.Column('phone', sa.String(20)),
+    sa.Column('is_admin', sa.Boolean),
+)
+
+shipment = sa.Table(
+    'shipment', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('tracking_number', sa.String(20), unique=True, nullable=False),
+    sa.Column('sender_name', sa.String(100), nullable=False),
+    sa.Column('sender_phone', sa.String(20), nullable=False),
+    sa.Column('receiver_name', sa.String(100), nullable=False),
+    sa.Column('receiver_phone', sa.String(20), nullable=False),
+    sa.Column('pickup_address', sa.String(200), nullable=False),
+    sa.Column('delivery_address', sa.String(200), nullable=False),
+    sa.Column('status', sa.String(50)),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('updated_at', sa.DateTime),
+    sa.Column('weight', sa.Float),
+    sa.Column('description', sa.Text),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+)
+
+tracking_event = sa.Table(
+    'tracking_event', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('shipment_id', sa.Integer, sa.ForeignKey('shipment.id'), nullable=False),
+    sa.Column('status', sa.String(50), nullable=False),
+    sa.Column('location', sa.String(200)),
+    sa.Column('description', sa.Text),
+    sa.Column('timestamp', sa.DateTime),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id')),
+)
+
+notification = sa.Table(
+    'notification', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    sa.Column('title', sa.String(100), nullable=False),
+    sa.Column('message', sa.Text, nullable=False),
+    sa.Column('is_read', sa.Boolean),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('shipment_id', sa.Integer, sa.ForeignKey('shipment.id')),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    metadata.drop_all(connection, checkfirst=True)
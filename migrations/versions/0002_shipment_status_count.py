@@ -0,0 +1,25 @@
+"""Add the per-status shipment counters used by the admin dashboard
+
+The table is backfilled from a single grouped aggregate over shipment.
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+shipment_status_count = sa.Table(
+    'shipment_status_count', metadata,
+    sa.Column('status', sa.String(50), primary_key=True),
+    sa.Column('count', sa.Integer, nullable=False),
+)
+
+
+def upgrade(connection):
+    shipment_status_count.create(connection, checkfirst=True)
+    connection.execute(shipment_status_count.delete())
+    connection.execute(sa.text(
+        'INSERT INTO shipment_status_count (status, count) '
+        'SELECT status, COUNT(*) FROM shipment WHERE status IS NOT NULL GROUP BY status'))
+
+
+def downgrade(connection):
+    shipment_status_count.drop(connection, checkfirst=True)
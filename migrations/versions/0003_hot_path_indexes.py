@@ -0,0 +1,56 @@
+"""Index the columns the dashboard, admin and tracking routes filter and sort on
+
+- shipment (user_id, created_at): a customer's latest shipments on /dashboard
+- shipment (status): per-status filters
+- shipment (updated_at): recently updated shipments on /admin/dashboard
+- tracking_event (shipment_id, timestamp): every tracking view and the
+  ETag validator query
+- tracking_event (timestamp): recent events on /admin/dashboard
+- notification (user_id, is_read): a user's unread notifications
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+shipment = sa.Table(
+    'shipment', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(50)),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('updated_at', sa.DateTime),
+)
+
+tracking_event = sa.Table(
+    'tracking_event', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('shipment_id', sa.Integer),
+    sa.Column('timestamp', sa.DateTime),
+)
+
+notification = sa.Table(
+    'notification', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('is_read', sa.Boolean),
+)
+
+indexes = [
+    sa.Index('ix_shipment_user_id_created_at', shipment.c.user_id, shipment.c.created_at),
+    sa.Index('ix_shipment_status', shipment.c.status),
+    sa.Index('ix_shipment_updated_at', shipment.c.updated_at),
+    sa.Index('ix_tracking_event_shipment_id_timestamp',
+             tracking_event.c.shipment_id, tracking_event.c.timestamp),
+    sa.Index('ix_tracking_event_timestamp', tracking_event.c.timestamp),
+    sa.Index('ix_notification_user_id_is_read', notification.c.user_id, notification.c.is_read),
+]
+
+
+def upgrade(connection):
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    for index in reversed(indexes):
+        index.drop(connection, checkfirst=True)
@@ -0,0 +1,35 @@
+"""Add the notification outbox drained by the background dispatcher"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+notification_outbox = sa.Table(
+    'notification_outbox', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('shipment_id', sa.Integer, sa.ForeignKey('shipment.id'), nullable=False),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    sa.Column('tracking_number', sa.String(20), nullable=False),
+    sa.Column('status', sa.String(50), nullable=False),
+    sa.Column('location', sa.String(200)),
+    sa.Column('notes', sa.Text),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('attempts', sa.Integer, nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime),
+    sa.Column('claimed_until', sa.DateTime),
+    sa.Column('dispatched_at', sa.DateTime),
+    sa.Column('failed_at', sa.DateTime),
+    sa.Column('last_error', sa.Text),
+    sa.Index('ix_notification_outbox_pending', 'dispatched_at', 'next_attempt_at'),
+)
+
+# Referenced by the foreign keys above
+sa.Table('shipment', metadata, sa.Column('id', sa.Integer, primary_key=True))
+sa.Table('user', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+
+def upgrade(connection):
+    notification_outbox.create(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    notification_outbox.drop(connection, checkfirst=True)
@@ -0,0 +1,63 @@
+"""Composite indexes for keyset pagination of the shipment listing
+
+Pages are ordered by (updated_at, id) or (created_at, id), optionally
+within one status or one customer:
+
+- shipment (updated_at, id) and (created_at, id): unfiltered listings
+- shipment (status, updated_at, id): status filter, also serves the plain
+  status lookups that ix_shipment_status covered
+- shipment (user_id, updated_at, id): a customer's shipments by last
+  update; by creation date is served by ix_shipment_user_id_created_at
+
+The single-column (updated_at) and (status) indexes are superseded and
+dropped. Rows with a NULL timestamp would fall out of keyset pages, so
+they are backfilled first.
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+shipment = sa.Table(
+    'shipment', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(50)),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('updated_at', sa.DateTime),
+)
+
+indexes = [
+    sa.Index('ix_shipment_updated_at_id', shipment.c.updated_at, shipment.c.id),
+    sa.Index('ix_shipment_created_at_id', shipment.c.created_at, shipment.c.id),
+    sa.Index('ix_shipment_status_updated_at_id',
+             shipment.c.status, shipment.c.updated_at, shipment.c.id),
+    sa.Index('ix_shipment_user_id_updated_at_id',
+             shipment.c.user_id, shipment.c.updated_at, shipment.c.id),
+]
+
+superseded = [
+    sa.Index('ix_shipment_status', shipment.c.status),
+    sa.Index('ix_shipment_updated_at', shipment.c.updated_at),
+]
+
+
+def upgrade(connection):
+    connection.execute(
+        shipment.update()
+            .where(shipment.c.created_at.is_(None))
+            .values(created_at=sa.func.coalesce(shipment.c.updated_at, sa.func.current_timestamp())))
+    connection.execute(
+        shipment.update()
+            .where(shipment.c.updated_at.is_(None))
+            .values(updated_at=shipment.c.created_at))
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+    for index in superseded:
+        index.drop(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    for index in superseded:
+        index.create(connection, checkfirst=True)
+    for index in reversed(indexes):
+        index.drop(connection, checkfirst=True)
@@ -0,0 +1,165 @@
+"""Add the full-text search index over shipments and their tracking events
+
+One search document per shipment holds its tracking number, sender and
+receiver names, phone digits, addresses, description and the locations and
+descriptions of all its tracking events. On SQLite it is an FTS5 table keyed
+by the shipment id; on PostgreSQL a tsvector column with a GIN index. Both
+are kept in sync by triggers, so every write path (ORM, bulk Core statements,
+manual SQL) updates the index in the same transaction. Status-only updates
+do not touch the search columns and do not fire the triggers.
+"""
+import sqlalchemy as sa
+
+SEARCHED_SHIPMENT_COLUMNS = ('tracking_number, sender_name, sender_phone, receiver_name, '
+                             'receiver_phone, pickup_address, delivery_address, description')
+
+
+# Stripped from phone numbers so they are indexed as digits only
+PHONE_PUNCTUATION = (' ', '-', '+', '(', ')', '.')
+
+
+def sqlite_digits(column):
+    value = f"coalesce({column}, '')"
+    for char in PHONE_PUNCTUATION:
+        value = f"replace({value}, '{char}', '')"
+    return value
+
+
+def sqlite_refresh(shipment_id):
+    return f"""
+    DELETE FROM shipment_search WHERE rowid = {shipment_id};
+    INSERT INTO shipment_search (rowid, tracking_number, names, phones, addresses, description, events)
+    SELECT s.id, s.tracking_number,
+           s.sender_name || ' ' || s.receiver_name,
+           {sqlite_digits('s.sender_phone')} || ' ' || {sqlite_digits('s.receiver_phone')},
+           s.pickup_address || ' ' || s.delivery_address,
+           coalesce(s.description, ''),
+           coalesce((SELECT group_concat(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                     FROM tracking_event e WHERE e.shipment_id = s.id), '')
+    FROM shipment s WHERE s.id = {shipment_id};"""
+
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS shipment_search USING fts5("
+    "tracking_number, names, phones, addresses, description, events, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_shipment_insert
+    AFTER INSERT ON shipment BEGIN {sqlite_refresh('NEW.id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_shipment_update
+    AFTER UPDATE OF {SEARCHED_SHIPMENT_COLUMNS} ON shipment BEGIN {sqlite_refresh('NEW.id')}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shipment_search_shipment_delete
+    AFTER DELETE ON shipment BEGIN
+    DELETE FROM shipment_search WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_event_insert
+    AFTER INSERT ON tracking_event BEGIN {sqlite_refresh('NEW.shipment_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_event_update
+    AFTER UPDATE OF shipment_id, location, description ON tracking_event BEGIN
+    {sqlite_refresh('OLD.shipment_id')}
+    {sqlite_refresh('NEW.shipment_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_event_delete
+    AFTER DELETE ON tracking_event BEGIN {sqlite_refresh('OLD.shipment_id')}
+    END""",
+    # Backfill existing shipments
+    f"""INSERT INTO shipment_search (rowid, tracking_number, names, phones, addresses, description, events)
+    SELECT s.id, s.tracking_number,
+           s.sender_name || ' ' || s.receiver_name,
+           {sqlite_digits('s.sender_phone')} || ' ' || {sqlite_digits('s.receiver_phone')},
+           s.pickup_address || ' ' || s.delivery_address,
+           coalesce(s.description, ''),
+           coalesce((SELECT group_concat(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                     FROM tracking_event e WHERE e.shipment_id = s.id), '')
+    FROM shipment s""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_event_delete',
+    'DROP TRIGGER IF EXISTS shipment_search_event_update',
+    'DROP TRIGGER IF EXISTS shipment_search_event_insert',
+    'DROP TRIGGER IF EXISTS shipment_search_shipment_delete',
+    'DROP TRIGGER IF EXISTS shipment_search_shipment_update',
+    'DROP TRIGGER IF EXISTS shipment_search_shipment_insert',
+    'DROP TABLE IF EXISTS shipment_search',
+]
+
+POSTGRESQL_UPGRADE = [
+    """CREATE TABLE IF NOT EXISTS shipment_search (
+        shipment_id integer PRIMARY KEY REFERENCES shipment (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )""",
+    'CREATE INDEX IF NOT EXISTS ix_shipment_search_document ON shipment_search USING gin (document)',
+    r"""CREATE OR REPLACE FUNCTION shipment_search_refresh(sid integer) RETURNS void AS $$
+    BEGIN
+        INSERT INTO shipment_search (shipment_id, document)
+        SELECT s.id,
+               setweight(to_tsvector('simple', s.tracking_number), 'A') ||
+               setweight(to_tsvector('simple', s.sender_name || ' ' || s.receiver_name || ' ' ||
+                   regexp_replace(coalesce(s.sender_phone, ''), '\D', '', 'g') || ' ' ||
+                   regexp_replace(coalesce(s.receiver_phone, ''), '\D', '', 'g')), 'A') ||
+               setweight(to_tsvector('simple', s.pickup_address || ' ' || s.delivery_address), 'B') ||
+               setweight(to_tsvector('simple', coalesce(s.description, '') || ' ' ||
+                   coalesce((SELECT string_agg(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                             FROM tracking_event e WHERE e.shipment_id = s.id), '')), 'C')
+        FROM shipment s WHERE s.id = sid
+        ON CONFLICT (shipment_id) DO UPDATE SET document = EXCLUDED.document;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION shipment_search_shipment_trigger() RETURNS trigger AS $$
+    BEGIN
+        PERFORM shipment_search_refresh(NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION shipment_search_event_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM shipment_search_refresh(OLD.shipment_id);
+        END IF;
+        IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.shipment_id <> OLD.shipment_id) THEN
+            PERFORM shipment_search_refresh(NEW.shipment_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS shipment_search_shipment ON shipment',
+    f"""CREATE TRIGGER shipment_search_shipment
+    AFTER INSERT OR UPDATE OF {SEARCHED_SHIPMENT_COLUMNS} ON shipment
+    FOR EACH ROW EXECUTE FUNCTION shipment_search_shipment_trigger()""",
+    'DROP TRIGGER IF EXISTS shipment_search_event ON tracking_event',
+    """CREATE TRIGGER shipment_search_event
+    AFTER INSERT OR DELETE OR UPDATE OF shipment_id, location, description ON tracking_event
+    FOR EACH ROW EXECUTE FUNCTION shipment_search_event_trigger()""",
+    'SELECT shipment_search_refresh(id) FROM shipment',
+]
+
+POSTGRESQL_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_event ON tracking_event',
+    'DROP TRIGGER IF EXISTS shipment_search_shipment ON shipment',
+    'DROP FUNCTION IF EXISTS shipment_search_event_trigger()',
+    'DROP FUNCTION IF EXISTS shipment_search_shipment_trigger()',
+    'DROP FUNCTION IF EXISTS shipment_search_refresh(integer)',
+    'DROP TABLE IF EXISTS shipment_search',
+]
+
+
+def run(connection, statements):
+    for statement in statements:
+        connection.execute(sa.text(statement))
+
+
+def upgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_UPGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_UPGRADE)
+
+
+def downgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_DOWNGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_DOWNGRADE)
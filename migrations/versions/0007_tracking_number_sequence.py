@@ -0,0 +1,21 @@
+"""Add the sequence that tracking numbers are allocated from in blocks"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+tracking_number_sequence = sa.Table(
+    'tracking_number_sequence', metadata,
+    sa.Column('name', sa.String(50), primary_key=True),
+    sa.Column('next_value', sa.BigInteger, nullable=False),
+)
+
+
+def upgrade(connection):
+    tracking_number_sequence.create(connection, checkfirst=True)
+    if connection.execute(tracking_number_sequence.select()).first() is None:
+        connection.execute(tracking_number_sequence.insert(),
+                           {'name': 'tracking_number', 'next_value': 1})
+
+
+def downgrade(connection):
+    tracking_number_sequence.drop(connection, checkfirst=True)
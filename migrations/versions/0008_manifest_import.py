@@ -0,0 +1,30 @@
+"""Add the record of merchant manifest imports and their result files"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+manifest_import = sa.Table(
+    'manifest_import', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    sa.Column('filename', sa.String(200)),
+    sa.Column('format', sa.String(10), nullable=False),
+    sa.Column('status', sa.String(20), nullable=False),
+    sa.Column('rows', sa.Integer, nullable=False),
+    sa.Column('created', sa.Integer, nullable=False),
+    sa.Column('rejected', sa.Integer, nullable=False),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('finished_at', sa.DateTime),
+    sa.Index('ix_manifest_import_user_id_created_at', 'user_id', 'created_at'),
+)
+
+# Referenced by the foreign key above
+sa.Table('user', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+
+def upgrade(connection):
+    manifest_import.create(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    manifest_import.drop(connection, checkfirst=True)
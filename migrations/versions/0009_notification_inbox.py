@@ -0,0 +1,76 @@
+"""Indexes and per-user unread counters for the notification inbox
+
+- notification (user_id, created_at, id): a user's inbox, newest first
+- notification (user_id, is_read, created_at, id): the unread-only inbox
+  and batch mark-read; supersedes ix_notification_user_id_is_read
+- notification_unread_count: unread notifications per user, kept in step
+  with inserts and mark-read so the badge count is a primary key lookup
+
+NULL created_at/is_read would fall out of keyset pages and the counters,
+so they are backfilled first. The counters are backfilled from a single
+grouped aggregate over notification.
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+notification = sa.Table(
+    'notification', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('is_read', sa.Boolean),
+    sa.Column('created_at', sa.DateTime),
+)
+
+notification_unread_count = sa.Table(
+    'notification_unread_count', metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), primary_key=True),
+    sa.Column('count', sa.Integer, nullable=False),
+)
+
+# Referenced by the foreign key above
+sa.Table('user', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+indexes = [
+    sa.Index('ix_notification_user_id_created_at_id',
+             notification.c.user_id, notification.c.created_at, notification.c.id),
+    sa.Index('ix_notification_user_id_is_read_created_at_id',
+             notification.c.user_id, notification.c.is_read, notification.c.created_at,
+             notification.c.id),
+]
+
+superseded = [
+    sa.Index('ix_notification_user_id_is_read', notification.c.user_id, notification.c.is_read),
+]
+
+
+def upgrade(connection):
+    connection.execute(
+        notification.update()
+            .where(notification.c.created_at.is_(None))
+            .values(created_at=sa.func.current_timestamp()))
+    connection.execute(
+        notification.update()
+            .where(notification.c.is_read.is_(None))
+            .values(is_read=False))
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+    for index in superseded:
+        index.drop(connection, checkfirst=True)
+
+    notification_unread_count.create(connection, checkfirst=True)
+    connection.execute(notification_unread_count.delete())
+    connection.execute(
+        notification_unread_count.insert().from_select(
+            ['user_id', 'count'],
+            sa.select(notification.c.user_id, sa.func.count())
+                .where(notification.c.is_read == sa.false())
+                .group_by(notification.c.user_id)))
+
+
+def downgrade(connection):
+    notification_unread_count.drop(connection, checkfirst=True)
+    for index in superseded:
+        index.create(connection, checkfirst=True)
+    for index in reversed(indexes):
+        index.drop(connection, checkfirst=True)
@@ -0,0 +1,159 @@
+"""Add the compressed tracking event archive and the archival job checkpoint
+
+- tracking_event_archive: one row per shipment whose events were moved out
+  of tracking_event, with the history as compressed JSON (see archive.py)
+- archive_checkpoint: how far ``flask archive-events`` has got
+
+The search index document of a shipment now also includes the event text
+kept in its archive row, so archiving events does not drop them from
+search: the SQLite triggers are recreated and the PostgreSQL refresh
+function replaced. Downgrading moves archived events back into
+tracking_event first.
+"""
+import importlib
+
+import sqlalchemy as sa
+
+import archive
+
+search_0006 = importlib.import_module('migrations.versions.0006_shipment_search')
+sqlite_digits = search_0006.sqlite_digits
+
+metadata = sa.MetaData()
+
+tracking_event_archive = sa.Table(
+    'tracking_event_archive', metadata,
+    sa.Column('shipment_id', sa.Integer, sa.ForeignKey('shipment.id'), primary_key=True),
+    sa.Column('event_count', sa.Integer, nullable=False),
+    sa.Column('first_event_at', sa.DateTime),
+    sa.Column('last_event_at', sa.DateTime),
+    sa.Column('last_event_id', sa.Integer),
+    sa.Column('search_text', sa.Text, nullable=False),
+    sa.Column('events', sa.LargeBinary, nullable=False),
+    sa.Column('archived_at', sa.DateTime),
+)
+
+archive_checkpoint = sa.Table(
+    'archive_checkpoint', metadata,
+    sa.Column('name', sa.String(50), primary_key=True),
+    sa.Column('last_updated_at', sa.DateTime),
+    sa.Column('last_shipment_id', sa.Integer),
+    sa.Column('saved_at', sa.DateTime),
+)
+
+tracking_event = sa.Table(
+    'tracking_event', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('shipment_id', sa.Integer, sa.ForeignKey('shipment.id')),
+    sa.Column('status', sa.String(50)),
+    sa.Column('location', sa.String(200)),
+    sa.Column('description', sa.Text),
+    sa.Column('timestamp', sa.DateTime),
+    sa.Column('user_id', sa.Integer),
+)
+
+# Referenced by the foreign keys above
+sa.Table('shipment', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+SQLITE_EVENTS_TEXT = """
+           coalesce((SELECT group_concat(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                     FROM tracking_event e WHERE e.shipment_id = s.id), '') || ' ' ||
+           coalesce((SELECT a.search_text FROM tracking_event_archive a WHERE a.shipment_id = s.id), '')"""
+
+
+def sqlite_refresh(shipment_id):
+    return f"""
+    DELETE FROM shipment_search WHERE rowid = {shipment_id};
+    INSERT INTO shipment_search (rowid, tracking_number, names, phones, addresses, description, events)
+    SELECT s.id, s.tracking_number,
+           s.sender_name || ' ' || s.receiver_name,
+           {sqlite_digits('s.sender_phone')} || ' ' || {sqlite_digits('s.receiver_phone')},
+           s.pickup_address || ' ' || s.delivery_address,
+           coalesce(s.description, ''),{SQLITE_EVENTS_TEXT}
+    FROM shipment s WHERE s.id = {shipment_id};"""
+
+
+SQLITE_TRIGGERS = ['shipment_search_shipment_insert', 'shipment_search_shipment_update',
+                   'shipment_search_event_insert', 'shipment_search_event_update',
+                   'shipment_search_event_delete']
+
+SQLITE_UPGRADE = [f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_TRIGGERS] + [
+    f"""CREATE TRIGGER shipment_search_shipment_insert
+    AFTER INSERT ON shipment BEGIN {sqlite_refresh('NEW.id')}
+    END""",
+    f"""CREATE TRIGGER shipment_search_shipment_update
+    AFTER UPDATE OF {search_0006.SEARCHED_SHIPMENT_COLUMNS} ON shipment BEGIN {sqlite_refresh('NEW.id')}
+    END""",
+    f"""CREATE TRIGGER shipment_search_event_insert
+    AFTER INSERT ON tracking_event BEGIN {sqlite_refresh('NEW.shipment_id')}
+    END""",
+    f"""CREATE TRIGGER shipment_search_event_update
+    AFTER UPDATE OF shipment_id, location, description ON tracking_event BEGIN
+    {sqlite_refresh('OLD.shipment_id')}
+    {sqlite_refresh('NEW.shipment_id')}
+    END""",
+    f"""CREATE TRIGGER shipment_search_event_delete
+    AFTER DELETE ON tracking_event BEGIN {sqlite_refresh('OLD.shipment_id')}
+    END""",
+]
+
+SQLITE_DOWNGRADE = [f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_TRIGGERS] + [
+    statement.replace('CREATE TRIGGER IF NOT EXISTS', 'CREATE TRIGGER')
+    for statement in search_0006.SQLITE_UPGRADE
+    if any(f'TRIGGER IF NOT EXISTS {name}\n' in statement for name in SQLITE_TRIGGERS)
+]
+
+POSTGRESQL_UPGRADE = [
+    r"""CREATE OR REPLACE FUNCTION shipment_search_refresh(sid integer) RETURNS void AS $$
+    BEGIN
+        INSERT INTO shipment_search (shipment_id, document)
+        SELECT s.id,
+               setweight(to_tsvector('simple', s.tracking_number), 'A') ||
+               setweight(to_tsvector('simple', s.sender_name || ' ' || s.receiver_name || ' ' ||
+                   regexp_replace(coalesce(s.sender_phone, ''), '\D', '', 'g') || ' ' ||
+                   regexp_replace(coalesce(s.receiver_phone, ''), '\D', '', 'g')), 'A') ||
+               setweight(to_tsvector('simple', s.pickup_address || ' ' || s.delivery_address), 'B') ||
+               setweight(to_tsvector('simple', coalesce(s.description, '') || ' ' ||
+                   coalesce((SELECT string_agg(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                             FROM tracking_event e WHERE e.shipment_id = s.id), '') || ' ' ||
+                   coalesce((SELECT a.search_text FROM tracking_event_archive a
+                             WHERE a.shipment_id = s.id), '')), 'C')
+        FROM shipment s WHERE s.id = sid
+        ON CONFLICT (shipment_id) DO UPDATE SET document = EXCLUDED.document;
+    END
+    $$ LANGUAGE plpgsql""",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    statement for statement in search_0006.POSTGRESQL_UPGRADE
+    if 'FUNCTION shipment_search_refresh' in statement
+]
+
+
+def run(connection, statements):
+    for statement in statements:
+        connection.execute(sa.text(statement))
+
+
+def upgrade(connection):
+    tracking_event_archive.create(connection, checkfirst=True)
+    archive_checkpoint.create(connection, checkfirst=True)
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_UPGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_UPGRADE)
+
+
+def downgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_DOWNGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_DOWNGRADE)
+    if tracking_event_archive.exists(connection):
+        rows = connection.execute(
+            sa.select(tracking_event_archive.c.shipment_id, tracking_event_archive.c.events))
+        for shipment_id, blob in rows.fetchall():
+            events = [dict(event, shipment_id=shipment_id) for event in archive.unpack_events(blob)]
+            connection.execute(tracking_event.insert(), events)
+    archive_checkpoint.drop(connection, checkfirst=True)
+    tracking_event_archive.drop(connection, checkfirst=True)
@@ -0,0 +1,70 @@
+"""Time-bucketed analytics rollups of tracking events
+
+- event_rollup: events per hour, status and location
+- transition_rollup: shipments first reaching a status per day and route,
+  with the total seconds taken since the shipment was created
+- analytics_checkpoint: progress of 'flask analytics backfill'
+
+From this revision on the app adds every new event to the rollups. Events
+already written are left to the backfill, which covers event ids up to the
+highest one at upgrade time, so no event is counted twice.
+"""
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+event_rollup = sa.Table(
+    'event_rollup', metadata,
+    sa.Column('bucket', sa.DateTime, primary_key=True),
+    sa.Column('status', sa.String(50), primary_key=True),
+    sa.Column('location', sa.String(200), primary_key=True),
+    sa.Column('count', sa.Integer, nullable=False),
+)
+
+transition_rollup = sa.Table(
+    'transition_rollup', metadata,
+    sa.Column('day', sa.Date, primary_key=True),
+    sa.Column('route', sa.String(200), primary_key=True),
+    sa.Column('status', sa.String(50), primary_key=True),
+    sa.Column('count', sa.Integer, nullable=False),
+    sa.Column('total_seconds', sa.Float, nullable=False),
+)
+
+analytics_checkpoint = sa.Table(
+    'analytics_checkpoint', metadata,
+    sa.Column('name', sa.String(50), primary_key=True),
+    sa.Column('last_shipment_id', sa.Integer, nullable=False),
+    sa.Column('max_event_id', sa.Integer, nullable=False),
+    sa.Column('saved_at', sa.DateTime),
+)
+
+tracking_event = sa.Table(
+    'tracking_event', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+)
+
+tracking_event_archive = sa.Table(
+    'tracking_event_archive', metadata,
+    sa.Column('shipment_id', sa.Integer, primary_key=True),
+    sa.Column('last_event_id', sa.Integer),
+)
+
+
+def upgrade(connection):
+    event_rollup.create(connection, checkfirst=True)
+    transition_rollup.create(connection, checkfirst=True)
+    analytics_checkpoint.create(connection, checkfirst=True)
+    # Archived events count too; their ids come from the same sequence
+    max_event_id = max(
+        connection.execute(sa.select(sa.func.max(tracking_event.c.id))).scalar() or 0,
+        connection.execute(sa.select(sa.func.max(tracking_event_archive.c.last_event_id))).scalar() or 0)
+    connection.execute(analytics_checkpoint.delete())
+    connection.execute(analytics_checkpoint.insert(), {
+        'name': 'backfill', 'last_shipment_id': 0, 'max_event_id': max_event_id,
+        'saved_at': None})
+
+
+def downgrade(connection):
+    analytics_checkpoint.drop(connection, checkfirst=True)
+    transition_rollup.drop(connection, checkfirst=True)
+    event_rollup.drop(connection, checkfirst=True)
@@ -0,0 +1,98 @@
+"""Let bulk event deletes refresh each shipment's search document once
+
+The search triggers rebuild a shipment's whole document for every deleted
+tracking event, re-reading all of its remaining events each time, so
+archiving n events of a shipment cost O(n²). A row in
+shipment_search_deferred now suppresses that per-row refresh for its
+shipment, and deleting the row refreshes the shipment once:
+
+    INSERT INTO shipment_search_deferred (shipment_id) ...
+    DELETE FROM tracking_event WHERE ...          -- no refreshes
+    DELETE FROM shipment_search_deferred WHERE ...  -- one refresh per shipment
+
+Writers insert and delete the rows in the same transaction, so other
+transactions never see them.
+"""
+import importlib
+
+import sqlalchemy as sa
+
+search_0006 = importlib.import_module('migrations.versions.0006_shipment_search')
+archive_0010 = importlib.import_module('migrations.versions.0010_tracking_event_archive')
+
+metadata = sa.MetaData()
+
+shipment_search_deferred = sa.Table(
+    'shipment_search_deferred', metadata,
+    sa.Column('shipment_id', sa.Integer, primary_key=True),
+)
+
+SQLITE_UPGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_event_delete',
+    f"""CREATE TRIGGER shipment_search_event_delete
+    AFTER DELETE ON tracking_event
+    WHEN NOT EXISTS (SELECT 1 FROM shipment_search_deferred WHERE shipment_id = OLD.shipment_id)
+    BEGIN {archive_0010.sqlite_refresh('OLD.shipment_id')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shipment_search_deferred_delete
+    AFTER DELETE ON shipment_search_deferred BEGIN {archive_0010.sqlite_refresh('OLD.shipment_id')}
+    END""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_deferred_delete',
+    'DROP TRIGGER IF EXISTS shipment_search_event_delete',
+] + [statement for statement in archive_0010.SQLITE_UPGRADE
+     if statement.startswith('CREATE TRIGGER shipment_search_event_delete\n')]
+
+POSTGRESQL_UPGRADE = [
+    """CREATE OR REPLACE FUNCTION shipment_search_event_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND NOT (TG_OP = 'DELETE' AND EXISTS (
+                SELECT 1 FROM shipment_search_deferred WHERE shipment_id = OLD.shipment_id)) THEN
+            PERFORM shipment_search_refresh(OLD.shipment_id);
+        END IF;
+        IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.shipment_id <> OLD.shipment_id) THEN
+            PERFORM shipment_search_refresh(NEW.shipment_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION shipment_search_deferred_trigger() RETURNS trigger AS $$
+    BEGIN
+        PERFORM shipment_search_refresh(OLD.shipment_id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    'DROP TRIGGER IF EXISTS shipment_search_deferred ON shipment_search_deferred',
+    """CREATE TRIGGER shipment_search_deferred
+    AFTER DELETE ON shipment_search_deferred
+    FOR EACH ROW EXECUTE FUNCTION shipment_search_deferred_trigger()""",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_deferred ON shipment_search_deferred',
+    'DROP FUNCTION IF EXISTS shipment_search_deferred_trigger()',
+] + [statement for statement in search_0006.POSTGRESQL_UPGRADE
+     if 'FUNCTION shipment_search_event_trigger' in statement]
+
+
+def run(connection, statements):
+    for statement in statements:
+        connection.execute(sa.text(statement))
+
+
+def upgrade(connection):
+    shipment_search_deferred.create(connection, checkfirst=True)
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_UPGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_UPGRADE)
+
+
+def downgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_DOWNGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_DOWNGRADE)
+    shipment_search_deferred.drop(connection, checkfirst=True)
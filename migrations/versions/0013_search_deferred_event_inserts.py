@@ -0,0 +1,102 @@
+"""Let bulk event inserts refresh each shipment's search document once
+
+Like deletes before migration 0012, every inserted tracking event rebuilt
+its shipment's whole document, re-reading all of its events, so a feed
+with n scans of one shipment cost O(n²). A row in shipment_search_deferred
+now suppresses the per-row refresh on insert too; deleting the row still
+refreshes the shipment once.
+"""
+import sqlalchemy as sa
+
+# Frozen copy of the document SQL as of this migration
+PHONE_PUNCTUATION = (' ', '-', '+', '(', ')', '.')
+
+
+def sqlite_digits(column):
+    value = f"coalesce({column}, '')"
+    for char in PHONE_PUNCTUATION:
+        value = f"replace({value}, '{char}', '')"
+    return value
+
+
+def sqlite_refresh(shipment_id):
+    return f"""
+    DELETE FROM shipment_search WHERE rowid = {shipment_id};
+    INSERT INTO shipment_search (rowid, tracking_number, names, phones, addresses, description, events)
+    SELECT s.id, s.tracking_number,
+           s.sender_name || ' ' || s.receiver_name,
+           {sqlite_digits('s.sender_phone')} || ' ' || {sqlite_digits('s.receiver_phone')},
+           s.pickup_address || ' ' || s.delivery_address,
+           coalesce(s.description, ''),
+           coalesce((SELECT group_concat(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                     FROM tracking_event e WHERE e.shipment_id = s.id), '') || ' ' ||
+           coalesce((SELECT a.search_text FROM tracking_event_archive a WHERE a.shipment_id = s.id), '')
+    FROM shipment s WHERE s.id = {shipment_id};"""
+
+
+SQLITE_UPGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_event_insert',
+    f"""CREATE TRIGGER shipment_search_event_insert
+    AFTER INSERT ON tracking_event
+    WHEN NOT EXISTS (SELECT 1 FROM shipment_search_deferred WHERE shipment_id = NEW.shipment_id)
+    BEGIN {sqlite_refresh('NEW.shipment_id')}
+    END""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS shipment_search_event_insert',
+    f"""CREATE TRIGGER shipment_search_event_insert
+    AFTER INSERT ON tracking_event BEGIN {sqlite_refresh('NEW.shipment_id')}
+    END""",
+]
+
+POSTGRESQL_UPGRADE = [
+    """CREATE OR REPLACE FUNCTION shipment_search_event_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND NOT (TG_OP = 'DELETE' AND EXISTS (
+                SELECT 1 FROM shipment_search_deferred WHERE shipment_id = OLD.shipment_id)) THEN
+            PERFORM shipment_search_refresh(OLD.shipment_id);
+        END IF;
+        IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.shipment_id <> OLD.shipment_id)
+                AND NOT (TG_OP = 'INSERT' AND EXISTS (
+                    SELECT 1 FROM shipment_search_deferred WHERE shipment_id = NEW.shipment_id)) THEN
+            PERFORM shipment_search_refresh(NEW.shipment_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    """CREATE OR REPLACE FUNCTION shipment_search_event_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND NOT (TG_OP = 'DELETE' AND EXISTS (
+                SELECT 1 FROM shipment_search_deferred WHERE shipment_id = OLD.shipment_id)) THEN
+            PERFORM shipment_search_refresh(OLD.shipment_id);
+        END IF;
+        IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.shipment_id <> OLD.shipment_id) THEN
+            PERFORM shipment_search_refresh(NEW.shipment_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+]
+
+
+def run(connection, statements):
+    for statement in statements:
+        connection.execute(sa.text(statement))
+
+
+def upgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_UPGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_UPGRADE)
+
+
+def downgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        run(connection, SQLITE_DOWNGRADE)
+    elif connection.dialect.name == 'postgresql':
+        run(connection, POSTGRESQL_DOWNGRADE)
@@ -0,0 +1,145 @@
+"""Background dispatch of queued customer notifications.
+
+Update routes write an outbox row in the same transaction as the tracking
+event and return immediately. A small pool of dispatcher threads (or a
+separate ``flask dispatch-notifications`` process) claims pending rows in
+batches, delivers them and records the results; failures are retried with
+exponential backoff. The database work itself is supplied by the app as a
+``dispatch_batch(batch_size)`` callable returning a ``BatchResult``.
+"""
+from collections import namedtuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+BatchResult = namedtuple('BatchResult', 'claimed dispatched retried failed latencies')
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, float('inf'))
+
+
+def retry_delay(attempts, base=5, cap=900):
+    """Seconds to wait before the next attempt after ``attempts`` failures"""
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+
+class DispatchMetrics:
+    """Counters and a dispatch latency histogram (enqueue to delivery, seconds)"""
+
+    def __init__(self):
+        self.dispatched = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.batches += 1
+            self.dispatched += result.dispatched
+            self.retried += result.retried
+            self.failed += result.failed
+            for latency in result.latencies:
+                self.latency_count += 1
+                self.latency_sum += latency
+                self.latency_max = max(self.latency_max, latency)
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if latency <= bound:
+                        self.latency_buckets[i] += 1
+                        break
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'dispatched': self.dispatched,
+                'retried': self.retried,
+                'failed': self.failed,
+                'batches': self.batches,
+                'latency_avg_s': round(self.latency_sum / self.latency_count, 3)
+                                 if self.latency_count else None,
+                'latency_max_s': round(self.latency_max, 3),
+                'latency_buckets': {
+                    ('+Inf' if bound == float('inf') else str(bound)): count
+                    for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)
+                },
+            }
+
+
+class NotificationDispatcher:
+    """Pool of worker threads draining the notification outbox"""
+
+    def __init__(self, app, dispatch_batch, queue_depth, workers=2, batch_size=100,
+                 poll_interval=5.0):
+        self.app = app
+        self.dispatch_batch = dispatch_batch
+        self.queue_depth = queue_depth
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.metrics = DispatchMetrics()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'notification-dispatch-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake the workers because new entries were committed"""
+        self._wakeup.set()
+
+    def run_once(self):
+        """Dispatch one batch in the current thread and return its BatchResult"""
+        with self.app.app_context():
+            result = self.dispatch_batch(self.batch_size)
+        self.metrics.record(result)
+        return result
+
+    def drain(self):
+        """Dispatch until nothing is due; returns the number of entries handled"""
+        handled = 0
+        while True:
+            result = self.run_once()
+            handled += result.claimed
+            if result.claimed < self.batch_size:
+                return handled
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception('Notification dispatch failed')
+                self._stopping.wait(self.poll_interval)
+
+    def stats(self):
+        with self.app.app_context():
+            depth = self.queue_depth()
+        return dict(self.metrics.as_dict(), queue_depth=depth, workers_running=self.running)
@@ -0,0 +1,85 @@
+"""Cached rendering of public pages and of page fragments.
+
+Pages that render the same HTML for every visitor are kept as encoded bytes
+and sent with an ETag, so a hit runs neither Jinja nor the encoder and a
+revalidating browser gets a 304. The only per-visitor parts of such pages
+are the navigation links, which depend on whether someone is signed in, and
+flashed messages: each page has one cached variant per sign-in state, and
+requests with a query string or pending flashed messages are rendered as
+usual.
+
+Fragments are rendered template snippets cached under a key that includes a
+version of the data they show, so changed data selects a new entry rather
+than needing an invalidation; stale versions age out through the TTL.
+"""
+from datetime import datetime
+from functools import wraps
+import hashlib
+
+from flask import current_app, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+from tracking_cache import CachedResponse, ResponseCache
+
+
+class PageCache:
+    """Caches whole pages and fragments as bytes in a tracking_cache backend"""
+
+    def __init__(self, backend, max_age=300):
+        self.cache = ResponseCache(backend)
+        self.max_age = max_age
+
+    @staticmethod
+    def active():
+        # Templates are reloaded on change in debug mode; always render there
+        return not current_app.debug
+
+    def page(self, view):
+        """Decorator for views whose HTML depends only on the sign-in state"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method != 'GET' or request.args or '_flashes' in session
+                    or not self.active()):
+                return view(*args, **kwargs)
+            signed_in = current_user.is_authenticated
+            key = f"{request.endpoint}:{'user' if signed_in else 'anonymous'}"
+            cached = self.cache.get(key)
+            if cached is not None:
+                entry = CachedResponse.from_bytes(cached)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(hashlib.sha1(body).hexdigest(),
+                                       datetime.utcnow().replace(microsecond=0), body)
+                self.cache.set(key, entry.to_bytes())
+
+            response = current_app.response_class(entry.body, mimetype='text/html')
+            response.set_etag(entry.etag)
+            response.last_modified = entry.last_modified
+            response.vary.add('Cookie')
+            if signed_in:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            else:
+                response.cache_control.public = True
+                response.cache_control.max_age = self.max_age
+            return response.make_conditional(request)
+        return wrapper
+
+    def fragment(self, key, version, render):
+        """Markup from ``render()``, reused while ``version`` is unchanged"""
+        if not self.active():
+            return Markup(render())
+        key = f'fragment:{key}:{version}'
+        cached = self.cache.get(key)
+        if cached is not None:
+            return Markup(cached.decode('utf-8'))
+        html = render()
+        self.cache.set(key, html.encode('utf-8'))
+        return Markup(html)
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,54 @@
+"""Keyset (cursor) pagination.
+
+Instead of skipping OFFSET rows, each page continues from the sort key of
+the last row of the previous page, ``WHERE (sort_col, id) < (:last, :id)``.
+With an index on ``(..., sort_col, id)`` every page is one index range read,
+so page N costs the same as page 1. Cursors are opaque URL-safe tokens
+holding that key.
+"""
+from datetime import datetime
+import base64
+import json
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or belongs to a different ordering"""
+
+
+def encode_cursor(sort, value, row_id):
+    """Opaque token for continuing after the row with this sort key"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Return the (value, id) key stored in a cursor issued for ``sort``"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        value = datetime.fromisoformat(value)
+        row_id = int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if cursor_sort != sort:
+        raise InvalidCursor('Cursor does not match the requested sort')
+    return value, row_id
+
+
+def keyset_page(query, sort_column, id_column, limit, after=None):
+    """Fetch one page ordered by (sort_column, id_column) descending.
+
+    Returns ``(rows, next_key)`` where ``next_key`` is the key of the last
+    row, or None when this is the final page.
+    """
+    if after is not None:
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(*after))
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (getattr(rows[-1], sort_column.key), getattr(rows[-1], id_column.key))
@@ -0,0 +1,128 @@
+"""Password hashing with a configurable scheme and a bounded hashing pool.
+
+Hashes are stored in Werkzeug's ``method$salt$hash`` format. New hashes use
+scrypt (``scrypt:N:r:p``, the format Werkzeug 3 writes) or PBKDF2-SHA256
+(``pbkdf2:sha256:iterations``) with the configured cost; older formats,
+including the salted ``sha256`` hashes written before, are still verified,
+and ``needs_rehash`` tells the login path to upgrade them.
+
+Hashing is deliberately slow, so it runs on a small worker pool: at most
+``workers`` hashes are computed at once and at most ``max_pending`` more
+wait. Beyond that ``HashingBusy`` is raised straight away, so a login storm
+turns into fast "try again" responses instead of tying up every request
+thread. hashlib releases the GIL while hashing, so the pool does not stall
+other requests.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+SALT_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+class HashingBusy(RuntimeError):
+    """The hashing pool is saturated; the caller should ask the client to retry"""
+
+
+def scrypt_hex(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'), n=n, r=r, p=p,
+                          maxmem=132 * n * r * p).hex()
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded pool of worker threads"""
+
+    def __init__(self, method='scrypt', pbkdf2_iterations=600000, scrypt_n=32768, scrypt_r=8,
+                 scrypt_p=1, salt_length=16, workers=4, max_pending=32, timeout=10):
+        if method not in ('scrypt', 'pbkdf2'):
+            raise ValueError(f'Unknown password hash method: {method}')
+        if method == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+            raise RuntimeError('hashlib.scrypt is unavailable; use PASSWORD_HASH_METHOD=pbkdf2')
+        self.method = method
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rejected = 0
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # Pool threads do not survive a fork; start a fresh pool in the child
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+
+    @property
+    def scheme(self):
+        """Method string new hashes are written with"""
+        if self.method == 'scrypt':
+            return 'scrypt:{}:{}:{}'.format(*self.scrypt_params)
+        return f'pbkdf2:sha256:{self.pbkdf2_iterations}'
+
+    def _hash(self, password):
+        if self.method == 'pbkdf2':
+            return generate_password_hash(password, method=self.scheme,
+                                          salt_length=self.salt_length)
+        salt = ''.join(secrets.choice(SALT_CHARS) for _ in range(self.salt_length))
+        return f'{self.scheme}${salt}${scrypt_hex(password, salt, *self.scrypt_params)}'
+
+    @staticmethod
+    def _verify(stored, password):
+        if not stored or stored.count('$') < 2:
+            return False
+        if stored.startswith('scrypt:'):
+            method, salt, expected = stored.split('$', 2)
+            try:
+                n, r, p = (int(value) for value in method.split(':')[1:])
+            except ValueError:
+                return False
+            return hmac.compare_digest(scrypt_hex(password, salt, n, r, p), expected)
+        return check_password_hash(stored, password)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy('Too many password hashes in progress')
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hash')
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy('Password hashing timed out')
+
+    def hash(self, password):
+        """A new hash of ``password`` with the configured scheme"""
+        return self._run(self._hash, password)
+
+    def verify(self, stored, password):
+        """True when ``password`` matches the stored hash, in any supported format"""
+        return self._run(self._verify, stored, password)
+
+    def needs_rehash(self, stored):
+        """True when the stored hash was not written with the configured scheme and cost"""
+        return stored.split('$', 1)[0] != self.scheme
+
+    def stats(self):
+        return {
+            'method': self.scheme,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,248 @@
+"""Token-bucket rate limiting for the public tracking endpoints.
+
+Each client gets a bucket of ``burst`` tokens refilled at ``rate`` tokens per
+second; a request takes one token (or more, for batch lookups) and is
+rejected while the bucket is empty. Anonymous clients are limited per IP
+address, requests carrying a configured API key per key, with its own,
+usually larger, allowance.
+
+Stores are pluggable like the tracking cache backends: an in-process store
+(the default, one set of buckets per worker), an in-process stand-in for a
+shared key/value store, and Redis, where all workers share the buckets.
+"""
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+import time
+
+
+class Decision(namedtuple('Decision', 'allowed limit remaining retry_after')):
+    """Outcome of taking tokens from a bucket; ``retry_after`` is in seconds"""
+
+
+def refill(tokens, updated, now, rate, burst):
+    """Tokens in a bucket at ``now`` that held ``tokens`` at ``updated``"""
+    return min(burst, tokens + max(now - updated, 0) * rate)
+
+
+def take_tokens(tokens, cost, rate):
+    """``(allowed, tokens left, seconds until cost tokens are available)``"""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate if rate > 0 else float('inf')
+
+
+class MemoryBucketStore:
+    """Buckets in this process, least recently used ones dropped beyond ``maxsize``
+
+    A dropped bucket is simply full again, which is what an idle client's
+    bucket would be anyway.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            allowed, tokens, retry_after = take_tokens(refill(tokens, updated, now, rate, burst), cost, rate)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        return allowed, tokens, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LocalSharedBucketStore:
+    """Stand-in for a shared store: buckets kept as bytes with an expiry, as in Redis
+
+    Uses wall-clock time like RedisBucketStore, so code that works against
+    this store works against Redis unchanged. Holds at most ``maxsize``
+    buckets: beyond that, expired (full) buckets are swept out first, then
+    the least recently used ones are dropped.
+    """
+
+    def __init__(self, prefix='ratelimit:', maxsize=100000):
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        now = time.time()
+        key = self.prefix + key
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                tokens, updated = burst, now
+            else:
+                tokens, updated = (float(part) for part in item[1].split(b' '))
+            allowed, tokens, retry_after = take_tokens(refill(tokens, updated, now, rate, burst), cost, rate)
+            # Expire once the bucket would be full again
+            expires_at = now + (burst - tokens) / rate + 1 if rate > 0 else float('inf')
+            # Re-inserted so the dict stays ordered by when buckets were used
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, f'{tokens!r} {now!r}'.encode('ascii'))
+            if len(self._data) > self.maxsize:
+                self._sweep(now)
+        return allowed, tokens, retry_after
+
+    def _sweep(self, now):
+        for key in [key for key, (expires_at, _) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        while len(self._data) > self.maxsize:
+            del self._data[next(iter(self._data))]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Refill and take atomically on the Redis server; mirrors refill() and take_tokens()
+REDIS_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local burst = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Buckets in Redis, shared by every worker and server"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for the redis rate limit store')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+        self._take = self.client.register_script(REDIS_TAKE_SCRIPT)
+
+    def take(self, key, cost, rate, burst):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[time.time(), cost, rate, burst])
+        tokens = float(tokens)
+        return bool(allowed), tokens, 0.0 if allowed else (cost - tokens) / rate
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class RateLimiter:
+    """Per-IP and per-API-key token buckets with served/rejected counters"""
+
+    def __init__(self, store, rate=1.0, burst=60, key_rate=20.0, key_burst=1000, api_keys=()):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self._api_keys = {self.key_id(key) for key in api_keys if key}
+        self.served = {'ip': 0, 'key': 0}
+        self.rejected = {'ip': 0, 'key': 0}
+        self.invalid_keys = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_id(api_key):
+        # Buckets are named after a digest so raw keys never reach the store
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+
+    def is_valid_key(self, api_key):
+        return self.key_id(api_key) in self._api_keys
+
+    def reject_invalid_key(self):
+        with self._lock:
+            self.invalid_keys += 1
+
+    def check(self, client_ip, api_key=None, cost=1):
+        """Take ``cost`` tokens from the client's bucket
+
+        ``api_key`` must be one the limiter was configured with; check
+        is_valid_key first. Costs above the bucket size take the whole bucket.
+        """
+        if api_key:
+            scope, name, rate, burst = 'key', 'key:' + self.key_id(api_key), self.key_rate, self.key_burst
+        else:
+            scope, name, rate, burst = 'ip', 'ip:' + client_ip, self.rate, self.burst
+        allowed, tokens, retry_after = self.store.take(name, min(cost, burst), rate, burst)
+        with self._lock:
+            (self.served if allowed else self.rejected)[scope] += 1
+        return Decision(allowed, burst, int(tokens), retry_after)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        served = sum(self.served.values())
+        rejected = sum(self.rejected.values())
+        return {
+            'store': type(self.store).__name__,
+            'buckets': len(self.store),
+            'evictions': self.store.evictions,
+            'served': served,
+            'rejected': rejected,
+            'served_ip': self.served['ip'],
+            'rejected_ip': self.rejected['ip'],
+            'served_key': self.served['key'],
+            'rejected_key': self.rejected['key'],
+            'invalid_keys': self.invalid_keys,
+            'rejected_ratio': round(rejected / (served + rejected), 4) if served + rejected else 0.0,
+        }
+
+
+def create_store(config):
+    """Build the bucket store selected by RATE_LIMIT_STORE"""
+    kind = config.get('RATE_LIMIT_STORE', 'memory')
+    if kind == 'memory':
+        return MemoryBucketStore(maxsize=config.get('RATE_LIMIT_MAX_BUCKETS', 100000))
+    if kind == 'local-shared':
+        return LocalSharedBucketStore(maxsize=config.get('RATE_LIMIT_MAX_BUCKETS', 100000))
+    if kind == 'redis':
+        return RedisBucketStore(config['RATE_LIMIT_URL'])
+    raise ValueError(f'Unknown rate limit store: {kind}')
+
+
+def create_rate_limiter(config):
+    """Create the limiter for the public tracking endpoints from the RATE_LIMIT_* settings"""
+    return RateLimiter(create_store(config),
+                       rate=config.get('RATE_LIMIT_RATE', 1.0),
+                       burst=config.get('RATE_LIMIT_BURST', 60),
+                       key_rate=config.get('RATE_LIMIT_KEY_RATE', 20.0),
+                       key_burst=config.get('RATE_LIMIT_KEY_BURST', 1000),
+                       api_keys=config.get('RATE_LIMIT_API_KEYS', ()))
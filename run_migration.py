@@ -1,18 +1,18 @@
 from app import app, db
+import migrations
 
 with app.app_context():
-    # Create all database tables
-    db.create_all()
-    print("Database tables created successfully.")
+    # Bring the schema up to the latest migration
+    migrations.upgrade(db.engine)
+    print("Database schema is up to date.")
 
     # Add a test admin user if not exists
-    from app import User
-    from werkzeug.security import generate_password_hash
+    from app import User, passwords
     
     if not User.query.filter_by(email='admin@speedycourier.com').first():
         admin = User(
             email='admin@speedycourier.com',
-            password=generate_password_hash('admin123', method='sha256'),
+            password=passwords.hash('admin123'),
             name='Admin User',
             phone='+1234567890',
             is_admin=True
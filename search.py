@@ -0,0 +1,142 @@
+"""Full-text search over shipments and their tracking events.
+
+The index is the ``shipment_search`` table created by migration 0006: one
+document per shipment, including the text of its archived tracking events
+(migration 0010), kept current by database triggers. This module turns
+free text into a safe match expression, runs ranked queries against the
+index and rebuilds it in id-range batches (``flask search reindex``).
+Bulk event inserts and deletes refresh each shipment's document once when
+wrapped in ``defer_refresh`` and ``refresh_deferred`` (migrations 0012 and
+0013). The SQL here matches what the latest triggers build; migrations
+keep frozen copies of the SQL they applied and are never imported at
+runtime.
+
+Every term must match (prefix match), in any searched field; phone numbers
+are indexed as digits only, so "+254 712-345 678" finds 254712345678.
+Ranking has to score every match before the best ones are known, so results
+are paged by offset up to a fixed depth rather than with a keyset cursor.
+"""
+import re
+
+from sqlalchemy import bindparam, text
+
+# Stripped from phone numbers so they are indexed as digits only
+PHONE_SEPARATORS = (' ', '-', '+', '(', ')', '.')
+
+TERM = re.compile(r'\w+', re.UNICODE)
+PHONE_PUNCTUATION = re.compile('[\\s' + re.escape(''.join(PHONE_SEPARATORS)) + ']')
+
+# bm25 column weights: tracking_number, names, phones, addresses, description, events
+SQLITE_WEIGHTS = '10.0, 5.0, 5.0, 2.0, 1.0, 1.0'
+
+
+def sqlite_digits(column):
+    """SQL expression for a phone column with the separators removed"""
+    value = f"coalesce({column}, '')"
+    for char in PHONE_SEPARATORS:
+        value = f"replace({value}, '{char}', '')"
+    return value
+
+
+class SearchUnavailable(RuntimeError):
+    """The database has no full-text search index"""
+
+
+def search_terms(query, max_terms=8):
+    """Split free text into index terms; a phone number becomes one digits-only term"""
+    compact = PHONE_PUNCTUATION.sub('', query)
+    if len(compact) >= 4 and compact.isdigit():
+        return [compact]
+    return [term.lower() for term in TERM.findall(query)][:max_terms]
+
+
+def match_expression(terms, dialect):
+    """Match expression requiring every term as a prefix"""
+    if dialect == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_shipment_ids(connection, query, limit, offset=0, max_terms=8):
+    """Ranked ``(shipment_id, score)`` rows for a free-text query, best first"""
+    terms = search_terms(query, max_terms)
+    if not terms:
+        return []
+    dialect = connection.dialect.name
+    params = {'match': match_expression(terms, dialect), 'limit': limit, 'offset': offset}
+    if dialect == 'sqlite':
+        statement = text(f"""
+            SELECT rowid AS shipment_id, bm25(shipment_search, {SQLITE_WEIGHTS}) AS score
+            FROM shipment_search
+            WHERE shipment_search MATCH :match
+            ORDER BY score, rowid
+            LIMIT :limit OFFSET :offset""")
+    elif dialect == 'postgresql':
+        statement = text("""
+            SELECT shipment_id, ts_rank_cd(document, query) AS score
+            FROM shipment_search, to_tsquery('simple', :match) AS query
+            WHERE document @@ query
+            ORDER BY score DESC, shipment_id
+            LIMIT :limit OFFSET :offset""")
+    else:
+        raise SearchUnavailable(f'Full-text search is not supported on {dialect}')
+    return connection.execute(statement, params).fetchall()
+
+
+# One document per shipment, with the text of its live and archived events
+SQLITE_DOCUMENTS = f"""
+    SELECT s.id, s.tracking_number,
+           s.sender_name || ' ' || s.receiver_name,
+           {sqlite_digits('s.sender_phone')} || ' ' || {sqlite_digits('s.receiver_phone')},
+           s.pickup_address || ' ' || s.delivery_address,
+           coalesce(s.description, ''),
+           coalesce((SELECT group_concat(coalesce(e.location, '') || ' ' || coalesce(e.description, ''), ' ')
+                     FROM tracking_event e WHERE e.shipment_id = s.id), '') || ' ' ||
+           coalesce((SELECT a.search_text FROM tracking_event_archive a WHERE a.shipment_id = s.id), '')
+    FROM shipment s"""
+
+SQLITE_REINDEX_INSERT = f"""
+    INSERT INTO shipment_search (rowid, tracking_number, names, phones, addresses, description, events)
+    {SQLITE_DOCUMENTS} WHERE s.id BETWEEN :start AND :end"""
+
+
+def reindex_range(connection, start, end):
+    """Rebuild the search documents of shipments with ids in [start, end]"""
+    params = {'start': start, 'end': end}
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            'DELETE FROM shipment_search WHERE rowid BETWEEN :start AND :end'), params)
+        connection.execute(text(SQLITE_REINDEX_INSERT), params)
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(text(
+            'DELETE FROM shipment_search WHERE shipment_id BETWEEN :start AND :end'), params)
+        connection.execute(text(
+            'SELECT shipment_search_refresh(id) FROM shipment WHERE id BETWEEN :start AND :end'), params)
+    else:
+        raise SearchUnavailable(f'Full-text search is not supported on {connection.dialect.name}')
+
+
+def defer_refresh(connection, shipment_ids):
+    """Stop event inserts and deletes from refreshing these shipments' documents row by row"""
+    if not shipment_ids:
+        return
+    connection.execute(text('INSERT INTO shipment_search_deferred (shipment_id) VALUES (:shipment_id)'),
+                       [{'shipment_id': shipment_id} for shipment_id in shipment_ids])
+
+
+def refresh_deferred(connection, shipment_ids):
+    """Refresh each deferred shipment's document once and resume per-row refreshes"""
+    if not shipment_ids:
+        return
+    connection.execute(
+        text('DELETE FROM shipment_search_deferred WHERE shipment_id IN :shipment_ids')
+            .bindparams(bindparam('shipment_ids', expanding=True)),
+        {'shipment_ids': list(shipment_ids)})
+
+
+def optimize(connection):
+    """Merge index segments after a large rebuild"""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO shipment_search (shipment_search) VALUES ('optimize')"))
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(text('ANALYZE shipment_search'))
@@ -0,0 +1,157 @@
+"""Production server: the app under gunicorn with preforked, threaded workers.
+
+    python serve.py [--bind HOST:PORT] [--workers N] [--threads N] [--migrate]
+
+Defaults come from the SERVER_* settings in config.py. With SERVER_PRELOAD
+(the default) the app is imported once in the master and the workers are
+forked from it, sharing its memory copy-on-write; each worker then forgets
+the database connections it inherited and opens its own pool.
+
+Sessions are signed with SECRET_KEY, or else with the key stored in
+SECRET_KEY_FILE, which defaults to instance/secret_key here so that every
+worker, and every restart, uses the same key.
+
+Signals to the master process:
+
+- HUP: start new workers and gracefully stop the old ones. Preloaded code
+  is not re-imported; to deploy new code send USR2, which starts a new
+  master beside the old one, then QUIT the old master.
+- TERM: stop accepting connections and finish requests in flight within
+  SERVER_GRACEFUL_TIMEOUT seconds.
+- TTIN / TTOU: add or remove a worker.
+
+How long the app import and the startup took is logged when the server and
+each worker become ready.
+
+Workers are threaded (gthread), and an open live tracking stream holds one of
+their threads for as long as it is open. Serve /api/track/stream from the
+asyncio server instead, with the reverse proxy routing that path to it:
+
+    LIVE_UPDATES_BROKER=redis uvicorn live_asgi:app --port 8001
+
+and set LIVE_UPDATES_STREAM_URL=/api/track/stream so tracking pages use it.
+Streams that still reach these workers are capped per worker at
+LIVE_UPDATES_MAX_BLOCKING_STREAMS, by default half of --threads; the server
+refuses to start with a cap that would let streams take every thread.
+"""
+import argparse
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if not os.environ.get('SECRET_KEY'):
+    os.environ.setdefault('SECRET_KEY_FILE', os.path.join(BASE_DIR, 'instance', 'secret_key'))
+
+from gunicorn.app.base import BaseApplication
+
+from config import Config
+
+app_import_seconds = None
+
+
+def import_app():
+    """The Flask app module, timing the import the first time"""
+    global app_import_seconds
+    if app_import_seconds is None:
+        started = time.perf_counter()
+        import app
+        app_import_seconds = time.perf_counter() - started
+    return sys.modules['app']
+
+
+def when_ready(server):
+    loaded = app_import_seconds
+    server.log.info('Server ready in %.0f ms%s', (time.perf_counter() - STARTED) * 1000,
+                    f' (app import {loaded * 1000:.0f} ms)' if loaded is not None else '')
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+    if 'app' in sys.modules:
+        # Inherited from the preloaded master; closing them would close the master's too
+        sys.modules['app'].db.dispose_engines(close=False)
+
+
+def post_worker_init(worker):
+    loaded = app_import_seconds if not worker.cfg.preload_app else None
+    worker.log.info('Worker %s ready in %.0f ms after fork%s', worker.pid,
+                    (time.perf_counter() - worker.forked_at) * 1000,
+                    f' (app import {loaded * 1000:.0f} ms)' if loaded is not None else '')
+
+
+def worker_exit(server, worker):
+    if 'app' in sys.modules:
+        sys.modules['app'].notification_dispatcher.stop(timeout=worker.cfg.graceful_timeout)
+
+
+def server_options(args):
+    max_requests = args.max_requests if args.max_requests is not None else Config.SERVER_MAX_REQUESTS
+    return {
+        'bind': args.bind or Config.SERVER_BIND,
+        'workers': args.workers or Config.SERVER_WORKERS,
+        'threads': args.threads or Config.SERVER_THREADS,
+        'worker_class': 'gthread',
+        'timeout': Config.SERVER_TIMEOUT,
+        'graceful_timeout': Config.SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': Config.SERVER_KEEPALIVE,
+        # Recycle workers now and then, spread out so they do not restart together
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'preload_app': Config.SERVER_PRELOAD if args.preload is None else args.preload,
+        'when_ready': when_ready,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+class Server(BaseApplication):
+    """Gunicorn application serving the Flask app with the options given"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return import_app().app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the app under gunicorn.')
+    parser.add_argument('--bind', help='Address to listen on (SERVER_BIND).')
+    parser.add_argument('--workers', type=int, help='Worker processes (SERVER_WORKERS).')
+    parser.add_argument('--threads', type=int, help='Threads per worker (SERVER_THREADS).')
+    parser.add_argument('--max-requests', type=int,
+                        help='Restart a worker after this many requests; 0 never (SERVER_MAX_REQUESTS).')
+    parser.add_argument('--preload', dest='preload', action='store_true', default=None,
+                        help='Import the app before forking workers (SERVER_PRELOAD).')
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help='Import the app in each worker instead.')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Upgrade the database schema before starting.')
+    args = parser.parse_args(argv)
+    options = server_options(args)
+    if 'LIVE_UPDATES_MAX_BLOCKING_STREAMS' not in os.environ:
+        Config.LIVE_UPDATES_MAX_BLOCKING_STREAMS = options['threads'] // 2
+    elif Config.LIVE_UPDATES_MAX_BLOCKING_STREAMS >= options['threads']:
+        parser.error(f"LIVE_UPDATES_MAX_BLOCKING_STREAMS={Config.LIVE_UPDATES_MAX_BLOCKING_STREAMS} "
+                     f"would let live streams hold all {options['threads']} threads of a worker")
+
+    if args.migrate:
+        courier = import_app()
+        import migrations
+        with courier.app.app_context():
+            migrations.upgrade(courier.db.engine)
+        courier.db.dispose_engines()
+    Server(options).run()
+
+
+if __name__ == '__main__':
+    main()
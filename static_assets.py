@@ -0,0 +1,126 @@
+"""Fingerprinted, precompressed static assets.
+
+``flask assets build`` copies each file under static/ into static/dist/
+under a name carrying a hash of its content (css/style.3f2a9c1e.css), with
+gzip and, when the optional brotli package is installed, brotli copies next
+to it, and records the names in static/dist/manifest.json.
+
+While the manifest exists, ``url_for('static', filename=...)`` links to the
+fingerprinted names, which are served with a one-year immutable
+Cache-Control and the precompressed copy the client accepts, so the app
+never compresses anything per request. A front-end server can serve
+static/dist itself (e.g. nginx ``gzip_static``/``brotli_static``). Without a
+manifest, static files are served as before.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Compressing these again gains little or nothing
+ALREADY_COMPRESSED = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'font/woff',
+                    'font/woff2', 'application/zip', 'application/gzip')
+
+
+def fingerprinted_name(filename, content):
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+class StaticAssets:
+    """Maps static filenames to fingerprinted copies and serves their compressed forms"""
+
+    def __init__(self, app=None, max_age=31536000):
+        self.max_age = max_age
+        self.manifest = {}
+        self.served = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.dist_folder = os.path.join(app.static_folder, DIST_DIR)
+        self.load_manifest()
+        app.url_defaults(self._fingerprint_url)
+        self._send_static_file = app.view_functions['static']
+        app.view_functions['static'] = self.send_static_file
+        app.extensions['static_assets'] = self
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_folder, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        # Reverse map: fingerprinted name -> original name
+        self.served = {name: original for original, name in self.manifest.items()}
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = f"{DIST_DIR}/{self.manifest[values['filename']]}"
+
+    def send_static_file(self, filename):
+        name = filename[len(DIST_DIR) + 1:] if filename.startswith(f'{DIST_DIR}/') else None
+        if name not in self.served:
+            return self._send_static_file(filename=filename)
+        mimetype = mimetypes.guess_type(self.served[name])[0] or 'application/octet-stream'
+        path, encoding = name, None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in request.accept_encodings and \
+                    os.path.exists(os.path.join(self.dist_folder, name + suffix)):
+                path, encoding = name + suffix, candidate
+                break
+        response = send_from_directory(self.dist_folder, path, mimetype=mimetype,
+                                       max_age=self.max_age)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def build(self):
+        """Write fingerprinted and compressed copies of static/ and the manifest"""
+        manifest = {}
+        for directory, dirnames, filenames in os.walk(self.static_folder):
+            if os.path.abspath(directory) == os.path.abspath(self.static_folder):
+                dirnames[:] = [d for d in dirnames if d != DIST_DIR]
+            for filename in sorted(filenames):
+                source = os.path.join(directory, filename)
+                original = os.path.relpath(source, self.static_folder).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    content = f.read()
+                name = fingerprinted_name(original, content)
+                target = os.path.join(self.dist_folder, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(content)
+                if mimetypes.guess_type(original)[0] not in ALREADY_COMPRESSED:
+                    with open(target + '.gz', 'wb') as f:
+                        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        with open(target + '.br', 'wb') as f:
+                            f.write(brotli.compress(content))
+                manifest[original] = name
+        os.makedirs(self.dist_folder, exist_ok=True)
+        temporary = os.path.join(self.dist_folder, MANIFEST + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temporary, os.path.join(self.dist_folder, MANIFEST))
+        if brotli is None:
+            logger.info('brotli is not installed; only gzip copies were written')
+        self.load_manifest()
+        return manifest
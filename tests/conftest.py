@@ -0,0 +1,91 @@
+"""Fixtures: the app on a migrated SQLite database in a temporary directory.
+
+The app reads its configuration when it is imported, so the environment is
+set up here first. All tests share one database; they create their own
+users and shipments and only assert on those, or on counter differences.
+"""
+from datetime import datetime
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP_DIR = tempfile.mkdtemp(prefix='couriers-tests-')
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TMP_DIR, 'test.db')
+os.environ['NOTIFICATION_DISPATCH_MODE'] = 'external'
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+os.environ['MANIFEST_RESULT_DIR'] = os.path.join(TMP_DIR, 'manifests')
+sys.path.insert(0, ROOT)
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def courier():
+    import app as courier
+    import migrations
+    with courier.app.app_context():
+        migrations.upgrade(courier.db.engine, log=lambda *args: None)
+    return courier
+
+
+@pytest.fixture
+def ctx(courier):
+    """An app context; the session is rolled back and removed afterwards"""
+    with courier.app.app_context():
+        yield courier
+        courier.db.session.rollback()
+        courier.db.session.remove()
+
+
+@pytest.fixture
+def admin(ctx):
+    n = next(_ids)
+    user = ctx.User(name=f'Admin {n}', email=f'admin{n}@tests.local', password='x', is_admin=True)
+    ctx.db.session.add(user)
+    ctx.db.session.commit()
+    return user
+
+
+@pytest.fixture
+def new_number(ctx):
+    """Allocate a tracking number as the app does and commit the reservation"""
+    def allocate():
+        number = ctx.generate_tracking_number()
+        ctx.db.session.commit()
+        return number
+    return allocate
+
+
+@pytest.fixture
+def make_shipment(ctx, admin, new_number):
+    """Create and commit a shipment with its initial tracking event"""
+    def make(tracking_number=None, status='Processing', pickup='1 Depot Road, Leeds',
+             delivery='2 High Street, York', created_at=None):
+        shipment = ctx.Shipment(
+            tracking_number=tracking_number or new_number(),
+            sender_name='Sender', sender_phone='0700 000 000',
+            receiver_name='Receiver', receiver_phone='0711 111 111',
+            pickup_address=pickup, delivery_address=delivery,
+            status=status, user_id=admin.id, created_at=created_at or datetime.utcnow())
+        ctx.db.session.add(shipment)
+        ctx.db.session.flush()
+        ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment.id, status=status,
+                                             location=pickup, timestamp=shipment.created_at))
+        ctx.db.session.commit()
+        return shipment
+    return make
+
+
+@pytest.fixture
+def client(ctx, admin):
+    """Test client signed in as ``admin``"""
+    client = ctx.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,74 @@
+"""Analytics rollups after ingest, manifest import and backfill, each event counted once"""
+import io
+import itertools
+import json
+
+import pytest
+from sqlalchemy import func
+
+import analytics
+
+_places = itertools.count(1)
+
+
+def test_percentile_interpolates_like_numpy():
+    assert analytics.percentile([], 50) is None
+    assert analytics.percentile([10], 90) == 10
+    assert analytics.percentile([1, 2, 3, 4], 50) == 2.5
+    assert analytics.percentile([0, 10, 20, 30, 40], 90) == 36
+
+
+@pytest.fixture
+def town():
+    return f'Testville {next(_places)}'
+
+
+def event_count(ctx, location):
+    return ctx.db.session.query(func.coalesce(func.sum(ctx.EventRollup.count), 0))\
+        .filter(ctx.EventRollup.location == location).scalar()
+
+
+def transitions(ctx, route):
+    rows = ctx.db.session.query(ctx.TransitionRollup.status, func.sum(ctx.TransitionRollup.count))\
+        .filter(ctx.TransitionRollup.route == route)\
+        .group_by(ctx.TransitionRollup.status)
+    return dict(rows)
+
+
+def backfill(ctx, *args):
+    result = ctx.app.test_cli_runner().invoke(args=['analytics', 'backfill', '--pause', '0', *args])
+    assert result.exit_code == 0, result.output
+
+
+def test_ingest_rollups_survive_backfill(ctx, admin, make_shipment, town):
+    pickup = f'1 Depot Road, {town}'
+    shipment = make_shipment(pickup=pickup, delivery='2 High Street, York')
+    hub = f'{town} Hub'
+    chunk = [(line_no, {'tracking_number': shipment.tracking_number, 'status': status,
+                        'location': hub, 'description': '', 'timestamp': None})
+             for line_no, status in enumerate(['In Transit', 'In Transit', 'Delivered'], 1)]
+    assert ctx.ingest_scan_chunk(chunk, admin.id)[0] == 3
+
+    route = f'{town} -> York'
+    expected = (event_count(ctx, pickup), event_count(ctx, hub), transitions(ctx, route))
+    assert expected == (1, 3, {'Processing': 1, 'In Transit': 1, 'Delivered': 1})
+
+    backfill(ctx)
+    assert (event_count(ctx, pickup), event_count(ctx, hub), transitions(ctx, route)) == expected
+    backfill(ctx, '--restart', '--batch-size', '2')
+    assert (event_count(ctx, pickup), event_count(ctx, hub), transitions(ctx, route)) == expected
+
+
+def test_manifest_rollups_survive_backfill(ctx, admin, town):
+    pickup = f'1 Depot Road, {town}'
+    rows = [{'reference': str(i), 'sender_name': 'Sender', 'sender_phone': '0700 000 000',
+             'receiver_name': 'Receiver', 'receiver_phone': '0711 111 111',
+             'pickup_address': pickup, 'delivery_address': '2 High Street, York'}
+            for i in range(3)]
+    data = '\n'.join(map(json.dumps, rows)).encode()
+    assert ctx.import_manifest(io.BytesIO(data), 'jsonl', admin.id).created == 3
+
+    route = f'{town} -> York'
+    assert (event_count(ctx, pickup), transitions(ctx, route)) == (3, {'Processing': 3})
+    backfill(ctx, '--restart')
+    assert (event_count(ctx, pickup), transitions(ctx, route)) == (3, {'Processing': 3})
@@ -0,0 +1,69 @@
+"""Tracking event archive: packing, the archive-events job and reads of archived history"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+import archive
+import search
+
+
+def test_summarize_packs_the_history():
+    events = [{'id': 3, 'status': 'Processing', 'location': 'Depot', 'description': None,
+               'timestamp': datetime(2020, 1, 1, 9), 'user_id': 1},
+              {'id': 8, 'status': 'Delivered', 'location': 'York', 'description': 'Left at door',
+               'timestamp': datetime(2020, 1, 2, 15), 'user_id': None}]
+    summary = archive.summarize(events)
+    assert archive.unpack_events(summary['events']) == events
+    assert (summary['event_count'], summary['last_event_id'], summary['last_event_at']) == \
+        (2, 8, datetime(2020, 1, 2, 15))
+    assert summary['search_text'] == 'Depot  York Left at door'
+
+
+def delivered_long_ago(ctx, make_shipment, locations):
+    shipment = make_shipment(status='Delivered', pickup='Harlowby Depot', created_at=datetime(2020, 1, 1))
+    ctx.db.session.add_all([ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit',
+                                              location=location, timestamp=datetime(2020, 1, 2))
+                            for location in locations])
+    ctx.db.session.commit()
+    table = ctx.Shipment.__table__
+    ctx.db.session.execute(table.update().where(table.c.id == shipment.id)
+                           .values(updated_at=datetime(2020, 1, 3)))
+    ctx.db.session.commit()
+    return shipment.id, shipment.tracking_number
+
+
+def test_archive_events_moves_history_and_keeps_it_readable(ctx, client, make_shipment):
+    shipment_id, number = delivered_long_ago(ctx, make_shipment, ['Gorsefield', 'Linbrook'])
+    before = client.get(f'/api/track/{number}').get_json()['data']
+
+    result = ctx.app.test_cli_runner().invoke(
+        args=['archive-events', '--older-than-days', '365', '--restart', '--pause', '0'])
+    assert result.exit_code == 0, result.output
+
+    assert ctx.TrackingEvent.query.filter_by(shipment_id=shipment_id).count() == 0
+    row = ctx.db.session.query(ctx.TrackingEventArchive).get(shipment_id)
+    assert row.event_count == 3
+    after = client.get(f'/api/track/{number}').get_json()['data']
+    assert after['tracking_events'] == before['tracking_events']
+    # The search document keeps the archived event text, refreshed once
+    hits = search.search_shipment_ids(ctx.db.session.connection(), 'gorsefield linbrook harlowby', 10)
+    assert [hit.shipment_id for hit in hits] == [shipment_id]
+    assert ctx.db.session.execute(text('SELECT count(*) FROM shipment_search_deferred')).scalar() == 0
+
+
+def test_archive_events_resumes_from_its_checkpoint(ctx, make_shipment):
+    shipment_id, _ = delivered_long_ago(ctx, make_shipment, ['Hub'])
+    cutoff = datetime(2021, 1, 1)
+    key, shipments, events = ctx.archive_events_batch(cutoff, None, 1000)
+    assert shipments >= 1 and key == ctx.load_archive_checkpoint()
+
+    # A later event moves the shipment past the checkpoint and is merged into its row
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment_id, status='Delivered', location='Late'))
+    ctx.db.session.commit()
+    table = ctx.Shipment.__table__
+    ctx.db.session.execute(table.update().where(table.c.id == shipment_id)
+                           .values(updated_at=datetime(2020, 1, 4)))
+    ctx.db.session.commit()
+    assert ctx.archive_events_batch(cutoff, key, 1000)[1:] == (1, 1)
+    assert ctx.archive_events_batch(cutoff, ctx.load_archive_checkpoint(), 1000) == (None, 0, 0)
+    assert ctx.db.session.query(ctx.TrackingEventArchive).get(shipment_id).event_count == 3
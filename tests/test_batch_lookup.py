@@ -0,0 +1,33 @@
+"""POST /api/track/batch: many shipments in one request, streamed as JSON Lines"""
+import json
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_results_follow_request_order_without_duplicates(ctx, client, make_shipment, new_number):
+    first, second = make_shipment(), make_shipment()
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=second.id, status='In Transit', location='Hub'))
+    ctx.db.session.commit()
+    missing = new_number()
+
+    response = client.post('/api/track/batch', json={'tracking_numbers': [
+        second.tracking_number, missing, first.tracking_number, f' {second.tracking_number} ']})
+    assert response.mimetype == 'application/x-ndjson'
+    results = lines(response)
+    assert [(line['tracking_number'], line['status']) for line in results] == [
+        (second.tracking_number, 'success'), (missing, 'not_found'), (first.tracking_number, 'success')]
+    assert len(results[0]['data']['tracking_events']) == 2
+    assert len(results[2]['data']['tracking_events']) == 1
+
+
+def test_batch_size_is_limited(ctx, client, monkeypatch):
+    monkeypatch.setitem(ctx.app.config, 'TRACKING_BATCH_LIMIT', 2)
+    response = client.post('/api/track/batch', json={'tracking_numbers': ['SC1', 'SC2', 'SC3']})
+    assert response.status_code == 413
+
+
+def test_tracking_numbers_must_be_a_list(client):
+    assert client.post('/api/track/batch', json={'tracking_numbers': 'SC1'}).status_code == 400
+    assert client.post('/api/track/batch', data='not json').status_code == 400
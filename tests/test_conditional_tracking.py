@@ -0,0 +1,52 @@
+"""ETag / Last-Modified validators and ?since delta mode of the tracking APIs"""
+
+
+def test_matching_etag_is_answered_with_304(client, make_shipment):
+    number = make_shipment().tracking_number
+    response = client.get(f'/api/track/{number}')
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    revalidated = client.get(f'/api/track/{number}', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+
+
+def test_if_modified_since_is_answered_with_304(client, make_shipment):
+    number = make_shipment().tracking_number
+    last_modified = client.get(f'/api/track/{number}').headers['Last-Modified']
+    revalidated = client.get(f'/api/track/{number}', headers={'If-Modified-Since': last_modified})
+    assert revalidated.status_code == 304
+
+
+def test_new_event_changes_the_etag(ctx, client, make_shipment):
+    shipment = make_shipment()
+    etag = client.get(f'/api/track/{shipment.tracking_number}').headers['ETag']
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location='Hub'))
+    ctx.db.session.commit()
+
+    response = client.get(f'/api/track/{shipment.tracking_number}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_since_returns_only_newer_events(ctx, client, make_shipment):
+    shipment = make_shipment()
+    number = shipment.tracking_number
+    last_event_id = client.get(f'/api/track/{number}').get_json()['data']['last_event_id']
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location='Hub'))
+    ctx.db.session.commit()
+
+    data = client.get(f'/api/track/{number}?since={last_event_id}').get_json()['data']
+    assert [event['location'] for event in data['tracking_events']] == ['Hub']
+    assert data['status'] == 'Processing'
+    assert data['last_event_id'] > last_event_id
+
+    events = client.get(f'/api/track/{number}/events?since={data["last_event_id"]}')
+    assert events.get_json() == []
+
+
+def test_since_must_be_a_non_negative_event_id(client, make_shipment):
+    number = make_shipment().tracking_number
+    assert client.get(f'/api/track/{number}?since=-1').status_code == 400
+    assert client.get(f'/api/track/{number}/events?since=abc').status_code == 400
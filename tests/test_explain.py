@@ -0,0 +1,21 @@
+"""EXPLAIN check of the hot route queries (flask db check-indexes)"""
+from types import SimpleNamespace
+
+import click
+import pytest
+from sqlalchemy import column, select, table
+from sqlalchemy.dialects import mysql
+
+from migrations.explain import explain
+
+
+def test_hot_path_queries_use_indexes(ctx):
+    result = ctx.app.test_cli_runner().invoke(args=['db', 'check-indexes'])
+    assert result.exit_code == 0, result.output
+    assert 'FAIL' not in result.output
+
+
+def test_unsupported_dialect_is_a_cli_error():
+    connection = SimpleNamespace(dialect=mysql.dialect())
+    with pytest.raises(click.ClickException, match='not mysql'):
+        explain(connection, select(column('id')).select_from(table('shipment')))
@@ -0,0 +1,84 @@
+"""Bulk scan ingestion: per-line error reporting of feeds and the ingest endpoint"""
+import io
+import json
+
+import ingest
+
+
+def scans(text, fmt):
+    return [(line_no, error) for line_no, scan, error in ingest.iter_scans(io.BytesIO(text.encode()), fmt)]
+
+
+def test_jsonl_errors_carry_their_line_numbers():
+    feed = '\n'.join([
+        json.dumps({'tracking_number': 'SC1', 'status': 'In Transit'}),
+        '',
+        '{"tracking_number": ',
+        json.dumps({'tracking_number': 'SC1'}),
+        json.dumps({'tracking_number': 'SC1', 'status': 'Delivered', 'timestamp': 'soon'}),
+        json.dumps(['SC1', 'Delivered']),
+    ])
+    assert scans(feed, 'jsonl') == [
+        (1, None),
+        (3, 'Invalid JSON: Expecting value'),
+        (4, 'status is required'),
+        (5, 'Invalid timestamp: soon'),
+        (6, 'Each line must be an object'),
+    ]
+
+
+def test_csv_errors_carry_their_line_numbers():
+    feed = 'tracking_number,status,location\nSC1,In Transit,Hub\n,Delivered,Hub\nSC1,,Hub\n'
+    assert scans(feed, 'csv') == [(2, None), (3, 'tracking_number is required'), (4, 'status is required')]
+    assert scans('tracking_number,location\nSC1,Hub\n', 'csv') == [(1, 'Missing CSV columns: status')]
+
+
+def test_undecodable_lines_are_reported_not_raised():
+    feed = b'{"tracking_number": "\xff"}\n' + json.dumps({'tracking_number': 'SC1', 'status': 'In Transit'}).encode()
+    assert [(line_no, error) for line_no, scan, error in ingest.iter_scans(io.BytesIO(feed), 'jsonl')] == \
+        [(1, 'Line is not valid UTF-8'), (2, None)]
+    feed = b'tracking_number,status\nSC1,In Transit\nSC\xff,In Transit\nSC2,In Transit\n'
+    assert [(line_no, error and error.split(';')[0])
+            for line_no, scan, error in ingest.iter_scans(io.BytesIO(feed), 'csv')] == \
+        [(2, None), (3, 'Line is not valid UTF-8')]
+
+
+def test_insert_events_returns_the_id_of_each_row(ctx, admin, make_shipment):
+    shipment = make_shipment()
+    rows = [{'shipment_id': shipment.id, 'status': 'In Transit', 'location': f'Hub {i}',
+             'description': '', 'timestamp': None, 'user_id': admin.id} for i in range(3)]
+    ids = ctx.insert_events(ctx.db.session.connection(), rows)
+    locations = dict(ctx.db.session.query(ctx.TrackingEvent.id, ctx.TrackingEvent.location)
+                     .filter(ctx.TrackingEvent.id.in_(ids)))
+    assert [locations[event_id] for event_id in ids] == ['Hub 0', 'Hub 1', 'Hub 2']
+    ctx.db.session.rollback()
+
+
+def test_ingest_endpoint_reports_each_rejected_line(ctx, client, make_shipment, new_number):
+    number = make_shipment().tracking_number
+    unknown = new_number()
+    feed = '\n'.join([
+        json.dumps({'tracking_number': number, 'status': 'In Transit', 'location': 'Hub'}),
+        json.dumps({'tracking_number': unknown, 'status': 'In Transit'}),
+        'not json',
+        json.dumps({'tracking_number': number, 'status': 'Out for Delivery', 'location': 'Van'}),
+    ])
+    response = client.post('/api/track/ingest?chunk_size=2', data=feed,
+                           content_type='application/x-ndjson')
+    assert response.get_json() == {
+        'status': 'success', 'accepted': 2, 'rejected': 2, 'shipments_updated': 1,
+        'errors': [{'line': 2, 'error': 'Shipment not found'},
+                   {'line': 3, 'error': 'Invalid JSON: Expecting value'}],
+    }
+    assert ctx.Shipment.query.filter_by(tracking_number=number).one().status == 'Out for Delivery'
+
+
+def test_ingest_endpoint_reports_undecodable_lines(client, make_shipment):
+    number = make_shipment().tracking_number
+    scan = (json.dumps({'tracking_number': number, 'status': 'In Transit', 'location': 'Hub'}) + '\n').encode()
+    response = client.post('/api/track/ingest?chunk_size=1', data=scan + b'\xff\xfe\n' + scan,
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['accepted'], summary['shipments_updated']) == (2, 1)
+    assert summary['errors'] == [{'line': 2, 'error': 'Line is not valid UTF-8'}]
@@ -0,0 +1,150 @@
+"""Live tracking updates: the hub, its limits and the server-sent event stream"""
+import asyncio
+
+import pytest
+
+from live_updates import (HubFull, LiveHub, LocalBroker, SubscriptionClosed, asgi_app, format_sse,
+                          parse_channels, tracking_frame)
+
+
+def test_format_sse_splits_data_lines():
+    assert format_sse('a\nb', event='tracking', event_id=7) == 'id: 7\nevent: tracking\ndata: a\ndata: b\n\n'
+    assert format_sse('') == 'data: \n\n'
+
+
+def test_parse_channels_deduplicates_and_limits():
+    assert parse_channels(['SC1, SC2', 'SC1'], 5) == ['SC1', 'SC2']
+    with pytest.raises(ValueError):
+        parse_channels([' , '], 5)
+    with pytest.raises(ValueError):
+        parse_channels(['SC1,SC2,SC3'], 2)
+
+
+def test_hub_fans_out_per_channel_and_drops_slow_subscribers():
+    hub = LiveHub(LocalBroker(), queue_size=1)
+    first, second = hub.subscribe(['SC1']), hub.subscribe(['SC1', 'SC2'])
+    hub.publish('SC2', 'frame 1')
+    assert (first.get(timeout=0), second.get(timeout=0)) == (None, 'frame 1')
+
+    hub.publish('SC1', 'frame 2')
+    hub.publish('SC1', 'frame 3')
+    with pytest.raises(SubscriptionClosed):
+        first.get(timeout=0)
+    assert (hub.stats()['subscribers'], hub.dropped) == (0, 2)
+
+
+def test_hub_limits_blocking_subscribers():
+    hub = LiveHub(LocalBroker(), max_blocking=1)
+    subscription = hub.subscribe(['SC1'])
+    with pytest.raises(HubFull):
+        hub.subscribe(['SC2'])
+    subscription.close()
+    subscription.close()
+    hub.subscribe(['SC2'])
+    assert hub.stats()['blocking_subscribers'] == 1
+
+
+def test_committed_event_is_published_with_its_id(ctx, make_shipment):
+    shipment = make_shipment()
+    subscription = ctx.live_hub.subscribe([shipment.tracking_number])
+    try:
+        event = ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location='Hub')
+        ctx.db.session.add(event)
+        ctx.db.session.flush()
+        assert subscription.get(timeout=0) is None
+        ctx.db.session.commit()
+        frame = subscription.get(timeout=0)
+    finally:
+        subscription.close()
+    assert frame.startswith(f'id: {event.id}\nevent: tracking\n')
+    assert '"location": "Hub"' in frame
+
+
+def test_stream_requires_tracking_numbers_and_a_free_slot(ctx, client, monkeypatch):
+    assert client.get('/api/track/stream').status_code == 400
+    monkeypatch.setattr(ctx.live_hub, 'max_blocking', 0)
+    assert client.get('/api/track/stream?tracking_numbers=SC1').status_code == 503
+
+
+def test_stream_sends_heartbeats(ctx, client, monkeypatch):
+    monkeypatch.setitem(ctx.app.config, 'LIVE_UPDATES_HEARTBEAT', 0.01)
+    response = client.get('/api/track/stream?tracking_numbers=SC1', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    frames = iter(response.response)
+    assert (next(frames), next(frames)) == (b'retry: 5000\n\n', b': keep-alive\n\n')
+    response.close()
+    assert ctx.live_hub.stats()['subscribers'] == 0
+
+
+def test_reconnecting_stream_replays_missed_events_once(ctx, client, make_shipment, monkeypatch):
+    monkeypatch.setitem(ctx.app.config, 'LIVE_UPDATES_HEARTBEAT', 0.01)
+    shipment = make_shipment()
+    number = shipment.tracking_number
+    seen = max(event.id for event in shipment.tracking_events)
+    missed = [ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location=location)
+              for location in ('Hub', 'Depot')]
+    ctx.db.session.add_all(missed)
+    ctx.db.session.commit()
+    missed_ids = [event.id for event in missed]
+
+    response = client.get(f'/api/track/stream?tracking_numbers={number}', buffered=False,
+                          headers={'Last-Event-ID': str(seen)})
+    frames = iter(response.response)
+    assert next(frames) == b'retry: 5000\n\n'
+    assert [int(next(frames).split(b'\n')[0][4:]) for _ in missed_ids] == missed_ids
+    assert next(frames) == b': keep-alive\n\n'
+    response.close()
+
+    response = client.get(f'/api/track/stream?tracking_numbers={number}', buffered=False,
+                          headers={'Last-Event-ID': str(missed_ids[-1])})
+    frames = iter(response.response)
+    assert (next(frames), next(frames)) == (b'retry: 5000\n\n', b': keep-alive\n\n')
+    response.close()
+
+
+def test_asgi_replay_reads_missed_events(ctx, make_shipment):
+    import live_asgi
+    shipment = make_shipment()
+    seen = max(event.id for event in shipment.tracking_events)
+    event = ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location='Hub')
+    ctx.db.session.add(event)
+    ctx.db.session.commit()
+
+    frames = live_asgi.replay([shipment.tracking_number], seen)
+    assert frames == ctx.replay_frames([shipment.tracking_number], seen)
+    assert frames[0].startswith(f'id: {event.id}\n')
+
+
+def test_asgi_stream_replays_from_last_event_id_without_duplicates():
+    hub = LiveHub(LocalBroker())
+    frames = {event_id: tracking_frame('SC1', 'In Transit', {'id': event_id}) for event_id in (5, 6)}
+    calls = []
+
+    def replay(channels, last_event_id):
+        calls.append((channels, last_event_id))
+        # Committed while the replay query ran: both reach the subscription too
+        hub.publish('SC1', frames[5])
+        hub.publish('SC1', frames[6])
+        return [frames[5]]
+
+    async def stream():
+        sent = []
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message.get('body', b'').decode())
+            if len(sent) == 4:
+                raise asyncio.CancelledError()
+
+        app = asgi_app(hub, heartbeat=1, replay=replay)
+        scope = {'type': 'http', 'path': '/api/track/stream', 'query_string': b'tracking_number=SC1',
+                 'headers': [(b'last-event-id', b'4')]}
+        with pytest.raises(asyncio.CancelledError):
+            await app(scope, receive, send)
+        return sent
+
+    assert asyncio.run(stream()) == ['', 'retry: 5000\n\n', frames[5], frames[6]]
+    assert calls == [(['SC1'], 4)]
+    assert hub.stats()['subscribers'] == 0
@@ -0,0 +1,76 @@
+"""Merchant manifest imports: per-row validation, result files and the import API"""
+import csv
+import io
+import json
+
+import pytest
+
+import manifest
+
+MANIFEST_FIELDS = ['reference', 'sender_name', 'sender_phone', 'receiver_name', 'receiver_phone',
+                   'pickup_address', 'delivery_address', 'weight']
+
+
+def manifest_row(reference, **fields):
+    row = dict(zip(MANIFEST_FIELDS, [reference, 'Sender', '0700 000 000', 'Receiver',
+                                     '0711 111 111', '1 Depot Road, Leeds', '2 High Street, York', '1.5']))
+    row.update(fields)
+    return row
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'json'])
+def test_manifest_errors_carry_their_row_numbers(fmt):
+    rows = [manifest_row('A'), manifest_row('B', receiver_phone=''), manifest_row('C', weight='heavy'),
+            manifest_row('D', weight='-1'), manifest_row('E')]
+    if fmt == 'csv':
+        text = io.StringIO()
+        writer = csv.DictWriter(text, MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        data = text.getvalue()
+    elif fmt == 'jsonl':
+        data = '\n'.join(map(json.dumps, rows))
+    else:
+        data = json.dumps(rows)
+    parsed = [(row_no, row and row['reference'], error)
+              for row_no, row, error in manifest.iter_rows(io.BytesIO(data.encode()), fmt)]
+    assert parsed == [
+        (1, 'A', None),
+        (2, 'B', 'Missing receiver_phone'),
+        (3, 'C', 'Invalid weight: heavy'),
+        (4, 'D', 'weight must not be negative'),
+        (5, 'E', None),
+    ]
+
+
+def test_json_manifest_elements_need_separators():
+    data = json.dumps(manifest_row('A')) + ' ' + json.dumps(manifest_row('B'))
+    parsed = list(manifest.iter_rows(io.BytesIO(f'[{data}]'.encode()), 'json'))
+    assert [(row_no, error) for row_no, _, error in parsed] == \
+        [(1, None), (2, "Invalid JSON: Expecting ',' delimiter")]
+
+
+def test_import_manifest_writes_a_result_per_row(ctx, admin):
+    rows = [manifest_row('A'), manifest_row('B', sender_name=''), manifest_row('C')]
+    data = '\n'.join(map(json.dumps, rows)).encode()
+    result = ctx.import_manifest(io.BytesIO(data), 'jsonl', admin.id, 'manifest.jsonl')
+    assert (result.status, result.rows, result.created, result.rejected) == ('completed', 3, 2, 1)
+
+    with open(ctx.manifest_result_path(result.id), newline='', encoding='utf-8') as result_file:
+        lines = list(csv.DictReader(result_file))
+    assert [(line['row'], line['reference'], line['error']) for line in lines] == [
+        ('1', 'A', ''), ('2', 'B', 'Missing sender_name'), ('3', 'C', '')]
+    created = {line['tracking_number'] for line in lines if line['tracking_number']}
+    assert ctx.Shipment.query.filter(ctx.Shipment.tracking_number.in_(created)).count() == 2
+
+
+def test_import_api_reports_counts_and_serves_the_result_file(client):
+    data = json.dumps([manifest_row('A'), manifest_row('B', weight='heavy')])
+    response = client.post('/api/shipments/import', data=data, content_type='application/json')
+    summary = response.get_json()
+    assert (summary['created'], summary['rejected']) == (1, 1)
+
+    result = client.get(f"/shipments/import/{summary['id']}/result")
+    assert result.mimetype == 'text/csv'
+    assert 'Invalid weight: heavy' in result.get_data(as_text=True)
+    assert client.post('/api/shipments/import', data='x', content_type='text/plain').status_code == 415
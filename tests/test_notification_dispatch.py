@@ -0,0 +1,72 @@
+"""Notification outbox: enqueued with the update, delivered and retried by the dispatcher"""
+from notification_dispatch import DispatchMetrics, BatchResult, retry_delay
+
+
+def outbox_entry(ctx, shipment_id):
+    ctx.db.session.remove()
+    return ctx.NotificationOutbox.query.filter_by(shipment_id=shipment_id).one()
+
+
+def notify(client, tracking_number, status='In Transit'):
+    response = client.post(f'/api/track/{tracking_number}/update',
+                           json={'status': status, 'location': 'Hub', 'notify_customer': True})
+    assert response.status_code == 200
+
+
+def test_retry_delay_backs_off_exponentially_up_to_the_cap():
+    assert [retry_delay(attempts, base=5, cap=60) for attempts in range(1, 6)] == [5, 10, 20, 40, 60]
+
+
+def test_metrics_bucket_latencies():
+    metrics = DispatchMetrics()
+    metrics.record(BatchResult(3, 2, 1, 0, [0.05, 2.0]))
+    stats = metrics.as_dict()
+    assert (stats['dispatched'], stats['retried'], stats['latency_max_s']) == (2, 1, 2.0)
+    assert stats['latency_buckets']['0.1'] == 1 and stats['latency_buckets']['5'] == 1
+
+
+def test_update_queues_the_notification_instead_of_sending_it(ctx, client, make_shipment, monkeypatch):
+    shipment = make_shipment()
+    sent = []
+    monkeypatch.setattr(ctx, 'send_shipment_notification', lambda entry: sent.append(entry) or {})
+    notify(client, shipment.tracking_number)
+
+    entry = outbox_entry(ctx, shipment.id)
+    assert (entry.status, entry.dispatched_at, sent) == ('In Transit', None, [])
+
+
+def test_dispatcher_delivers_and_counts_unread(ctx, client, admin, make_shipment):
+    shipment = make_shipment()
+    shipment_id, unread = shipment.id, ctx.db.session.query(ctx.NotificationUnreadCount).get(admin.id)
+    before = unread.count if unread else 0
+    notify(client, shipment.tracking_number, 'Delivered')
+
+    ctx.notification_dispatcher.drain()
+
+    entry = outbox_entry(ctx, shipment_id)
+    assert entry.dispatched_at is not None and entry.attempts == 0
+    assert ctx.Notification.query.filter_by(shipment_id=shipment_id, title='Shipment Delivered').count() == 1
+    assert ctx.db.session.query(ctx.NotificationUnreadCount).get(entry.user_id).count == before + 1
+
+
+def test_failed_delivery_is_retried_then_given_up(ctx, client, make_shipment, monkeypatch):
+    shipment = make_shipment()
+    shipment_id = shipment.id
+
+    def fail(entry):
+        raise RuntimeError('SMTP down')
+    monkeypatch.setattr(ctx, 'send_shipment_notification', fail)
+    monkeypatch.setitem(ctx.app.config, 'NOTIFICATION_MAX_ATTEMPTS', 2)
+    notify(client, shipment.tracking_number)
+
+    ctx.notification_dispatcher.run_once()
+    entry = outbox_entry(ctx, shipment_id)
+    assert (entry.attempts, entry.last_error, entry.failed_at) == (1, 'SMTP down', None)
+    assert entry.next_attempt_at > entry.created_at
+
+    # Due again: the second failure is the last attempt
+    entry.next_attempt_at = entry.created_at
+    ctx.db.session.commit()
+    ctx.notification_dispatcher.run_once()
+    entry = outbox_entry(ctx, shipment_id)
+    assert entry.attempts == 2 and entry.failed_at is not None
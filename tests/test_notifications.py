@@ -0,0 +1,53 @@
+"""Notification inbox: keyset listing, the unread counter and marking read in bulk"""
+from datetime import datetime, timedelta
+
+
+def add_notifications(ctx, user_id, count, started=datetime(2024, 1, 1)):
+    """Insert notifications the way the dispatcher does, counter included"""
+    rows = [{'user_id': user_id, 'title': f'Update {i}', 'message': 'Shipment moved', 'is_read': False,
+             'created_at': started + timedelta(minutes=i)} for i in range(count)]
+    ctx.db.session.execute(ctx.Notification.__table__.insert(), rows)
+    ctx.apply_unread_deltas(ctx.db.session.connection(), {user_id: count})
+    ctx.db.session.commit()
+    return [notification.id for notification in ctx.Notification.query
+            .filter_by(user_id=user_id).order_by(ctx.Notification.id)]
+
+
+def test_inbox_pages_newest_first(ctx, client, admin):
+    add_notifications(ctx, admin.id, 5)
+    first = client.get('/api/notifications?limit=3').get_json()
+    second = client.get(f"/api/notifications?limit=3&cursor={first['next_cursor']}").get_json()
+    titles = [n['title'] for n in first['notifications'] + second['notifications']]
+    assert titles == ['Update 4', 'Update 3', 'Update 2', 'Update 1', 'Update 0']
+    assert second['next_cursor'] is None
+    assert {n['time_ago'] for n in first['notifications']} == {'Jan 01, 2024'}
+
+    assert client.get('/api/notifications?limit=0').status_code == 400
+    assert client.get('/api/notifications?cursor=bad').status_code == 400
+
+
+def test_marking_read_updates_the_counter_once(ctx, client, admin):
+    ids = add_notifications(ctx, admin.id, 4)
+    other = ctx.User(name='Other', email=f'other{admin.id}@tests.local', password='x')
+    ctx.db.session.add(other)
+    ctx.db.session.commit()
+    foreign = add_notifications(ctx, other.id, 1)
+    assert client.get('/api/notifications/unread-count').get_json() == {'unread_count': 4}
+
+    response = client.post('/api/notifications/read', json={'ids': ids[:2] + foreign})
+    assert response.get_json() == {'marked': 2, 'unread_count': 2}
+    # Already read: nothing changes
+    assert client.post('/api/notifications/read', json={'ids': ids[:1]}).get_json()['marked'] == 0
+    unread = client.get('/api/notifications?unread=1').get_json()['notifications']
+    assert sorted(n['id'] for n in unread) == ids[2:]
+
+    assert client.post('/api/notifications/read', json={'all': True}).get_json() == \
+        {'marked': 2, 'unread_count': 0}
+    assert ctx.db.session.query(ctx.NotificationUnreadCount).get(other.id).count == 1
+
+
+def test_mark_read_requires_ids_or_all(ctx, client, monkeypatch):
+    assert client.post('/api/notifications/read', json={}).status_code == 400
+    assert client.post('/api/notifications/read', json={'ids': ['1']}).status_code == 400
+    monkeypatch.setitem(ctx.app.config, 'NOTIFICATION_MARK_READ_MAX', 2)
+    assert client.post('/api/notifications/read', json={'ids': [1, 2, 3]}).status_code == 400
@@ -0,0 +1,66 @@
+"""Cached public pages and fragments, and fingerprinted static assets"""
+import gzip
+
+from flask import Flask, g, url_for
+
+from static_assets import StaticAssets
+
+
+def test_public_page_is_cached_per_sign_in_state(ctx, client):
+    anonymous = ctx.app.test_client()
+    first = anonymous.get('/about')
+    assert first.headers['Cache-Control'] == f'public, max-age={ctx.page_cache.max_age}'
+    assert 'Cookie' in first.headers['Vary']
+    hits = ctx.page_cache.stats()['hits']
+    assert anonymous.get('/about').get_data() == first.get_data()
+    assert ctx.page_cache.stats()['hits'] == hits + 1
+    assert anonymous.get('/about', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # The signed-in variant is a separate entry, never stored by shared caches.
+    # Requests reuse the fixture's app context, so forget the loaded user first.
+    g.pop('_login_user', None)
+    misses = ctx.page_cache.stats()['misses']
+    signed_in = client.get('/about')
+    assert ctx.page_cache.stats()['misses'] == misses + 1
+    assert signed_in.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_requests_with_a_query_string_are_rendered(ctx):
+    anonymous = ctx.app.test_client()
+    response = anonymous.get('/track?tracking_number=SC1')
+    assert 'ETag' not in response.headers
+
+
+def test_fragment_is_reused_while_its_version_is_unchanged(ctx):
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f'<p>{len(renders)}</p>'
+    with ctx.app.test_request_context():
+        assert ctx.page_cache.fragment('test', 1, render) == '<p>1</p>'
+        assert ctx.page_cache.fragment('test', 1, render) == '<p>1</p>'
+        assert ctx.page_cache.fragment('test', 2, render) == '<p>2</p>'
+    assert len(renders) == 2
+
+
+def test_built_assets_are_fingerprinted_and_served_precompressed(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'style.css').write_text('body { color: #333; }\n' * 20)
+    app = Flask(__name__, static_folder=str(static))
+    assets = StaticAssets(app, max_age=3600)
+    with app.test_request_context():
+        assert url_for('static', filename='css/style.css') == '/static/css/style.css'
+
+    manifest = assets.build()
+    name = manifest['css/style.css']
+    assert name.startswith('css/style.') and name != 'css/style.css'
+    with app.test_request_context():
+        assert url_for('static', filename='css/style.css') == f'/static/dist/{name}'
+
+    response = app.test_client().get(f'/static/dist/{name}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert gzip.decompress(response.get_data()) == (static / 'css' / 'style.css').read_bytes()
+    response.close()
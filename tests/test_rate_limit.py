@@ -0,0 +1,94 @@
+"""Rate limiting of the public tracking endpoints and the not-found cache"""
+import json
+import time
+
+import pytest
+
+from rate_limit import LocalSharedBucketStore, MemoryBucketStore, RateLimiter
+
+
+@pytest.fixture
+def limited(ctx, monkeypatch):
+    """The app's limiter, enabled with a bucket of two tokens"""
+    monkeypatch.setitem(ctx.app.config, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(ctx.rate_limiter, 'rate', 0.001)
+    monkeypatch.setattr(ctx.rate_limiter, 'burst', 2)
+    ctx.rate_limiter.clear()
+    yield ctx.rate_limiter
+    ctx.rate_limiter.clear()
+
+
+def test_bucket_refills_at_the_configured_rate(monkeypatch):
+    limiter = RateLimiter(MemoryBucketStore(), rate=1.0, burst=2, key_rate=10.0, key_burst=5,
+                          api_keys=['secret'])
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    assert [limiter.check('10.0.0.1').allowed for _ in range(3)] == [True, True, False]
+    assert limiter.check('10.0.0.1').retry_after == pytest.approx(1.0)
+    assert limiter.check('10.0.0.2').allowed
+    assert limiter.check('10.0.0.1', 'secret', cost=10).remaining == 0
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 1)
+    assert limiter.check('10.0.0.1').allowed
+    assert limiter.stats()['rejected_ip'] == 2 and limiter.stats()['served_key'] == 1
+
+
+def test_memory_store_drops_least_recently_used_buckets():
+    store = MemoryBucketStore(maxsize=2)
+    for key in ('a', 'b', 'a', 'c'):
+        store.take(key, 1, 1.0, 5)
+    assert len(store) == 2 and store.evictions == 1
+    # 'b' was dropped and starts full again
+    assert store.take('b', 1, 1.0, 5)[1] == 4
+
+
+def test_local_shared_store_sweeps_full_buckets_before_evicting(monkeypatch):
+    store = LocalSharedBucketStore(maxsize=2)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    store.take('idle', 1, 1.0, 5)
+    store.take('a', 1, 0.01, 5)
+    # 'idle' expires once full again, after two seconds, and goes first
+    monkeypatch.setattr(time, 'time', lambda: now + 3)
+    store.take('b', 1, 0.01, 5)
+    assert len(store) == 2 and store.evictions == 0
+    store.take('a', 1, 0.01, 5)
+    store.take('c', 1, 0.01, 5)
+    assert len(store) == 2 and store.evictions == 1
+    assert store.take('b', 1, 0.01, 5)[1] == 4
+
+
+def test_rejected_before_any_lookup(ctx, limited, new_number, monkeypatch):
+    number = new_number()
+    client = ctx.app.test_client()
+    assert [client.get(f'/api/track/{number}').status_code for _ in range(2)] == [404, 404]
+
+    def lookup(tracking_number):
+        raise AssertionError('rate-limited request reached the database')
+    monkeypatch.setattr(ctx, 'tracking_validators', lookup)
+    response = client.get(f'/api/track/{number}')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] and response.headers['X-RateLimit-Remaining'] == '0'
+    assert client.get('/api/track/x', headers={'X-API-Key': 'unknown'}).status_code == 401
+    assert (limited.stats()['rejected'], limited.stats()['invalid_keys']) == (1, 1)
+
+
+def test_not_found_is_cached_until_the_shipment_is_created(ctx, client, make_shipment, new_number):
+    number = new_number()
+    assert client.get(f'/api/track/{number}').status_code == 404
+    assert ctx.tracking_misses.get(number) is not None
+
+    make_shipment(tracking_number=number)
+
+    assert ctx.tracking_misses.get(number) is None
+    assert client.get(f'/api/track/{number}').status_code == 200
+
+
+def test_batch_lookup_records_misses(ctx, client, make_shipment, new_number):
+    found = make_shipment().tracking_number
+    missing = new_number()
+    response = client.post('/api/track/batch', json={'tracking_numbers': [found, missing]})
+    statuses = [line['status'] for line in map(json.loads, response.get_data(as_text=True).splitlines())]
+    assert statuses == ['success', 'not_found']
+    assert ctx.tracking_misses.get(missing) is not None
+    assert ctx.tracking_misses.get(found) is None
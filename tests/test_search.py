@@ -0,0 +1,84 @@
+"""Full-text shipment search: query parsing, trigger-maintained index and reindexing"""
+from sqlalchemy import text
+
+import search
+
+
+def search_ids(ctx, query):
+    return [row.shipment_id for row in search.search_shipment_ids(ctx.db.session.connection(), query, 50)]
+
+
+def test_search_terms():
+    assert search.search_terms('Nairobi  depot, BAY-7') == ['nairobi', 'depot', 'bay', '7']
+    assert search.search_terms('+254 (712) 345-678') == ['254712345678']
+    assert search.search_terms('a b c d', max_terms=2) == ['a', 'b']
+    assert search.match_expression(['bay', '7'], 'sqlite') == '"bay"* "7"*'
+    assert search.match_expression(['bay', '7'], 'postgresql') == 'bay:* & 7:*'
+
+
+def test_index_follows_shipment_and_event_writes(ctx, make_shipment):
+    shipment = make_shipment(pickup='4 Quillon Street, Leeds')
+    assert search_ids(ctx, 'quillon') == [shipment.id]
+    assert search_ids(ctx, shipment.tracking_number) == [shipment.id]
+
+    shipment.receiver_phone = '+44 (7700) 900-123'
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit',
+                                         location='Marrowgate sorting centre'))
+    ctx.db.session.commit()
+    assert search_ids(ctx, '447700900123') == [shipment.id]
+    assert search_ids(ctx, 'marrowgate quillon') == [shipment.id]
+
+    ctx.TrackingEvent.query.filter_by(shipment_id=shipment.id, location='Marrowgate sorting centre').delete()
+    ctx.db.session.commit()
+    assert search_ids(ctx, 'marrowgate') == []
+
+
+def test_search_endpoint_ranks_tracking_numbers_first(ctx, client, make_shipment):
+    first = make_shipment(pickup='9 Brackwater Road, Leeds')
+    second = make_shipment(delivery='Brackwater House, York')
+    second.tracking_number = 'BRACKWATER' + second.tracking_number[10:]
+    ctx.db.session.commit()
+
+    response = client.get('/api/search?q=brackwater&limit=1')
+    data = response.get_json()
+    assert [row['tracking_number'] for row in data['results']] == [second.tracking_number]
+    assert data['next_page'] == 2
+    page = client.get('/api/search?q=brackwater&limit=1&page=2').get_json()
+    assert [row['tracking_number'] for row in page['results']] == [first.tracking_number]
+
+    assert client.get('/api/search?q=').status_code == 400
+    assert client.get('/api/search?q=x&limit=20&page=51').status_code == 400
+
+
+def test_reindex_rebuilds_missing_documents(ctx, make_shipment):
+    shipment = make_shipment(pickup='1 Fennimore Yard, Hull')
+    connection = ctx.db.session.connection()
+    connection.execute(text('DELETE FROM shipment_search WHERE rowid = :id'), {'id': shipment.id})
+    assert search_ids(ctx, 'fennimore') == []
+
+    search.reindex_range(connection, shipment.id, shipment.id)
+    assert search_ids(ctx, 'fennimore') == [shipment.id]
+    ctx.db.session.rollback()
+
+
+def test_deferred_event_inserts_refresh_the_document_once(ctx, make_shipment):
+    shipment = make_shipment()
+    connection = ctx.db.session.connection()
+    search.defer_refresh(connection, [shipment.id])
+    ctx.db.session.add_all([ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location=location)
+                            for location in ('Ostwick', 'Pellbury')])
+    ctx.db.session.flush()
+    assert search_ids(ctx, 'pellbury') == []
+
+    search.refresh_deferred(connection, [shipment.id])
+    assert search_ids(ctx, 'ostwick pellbury') == [shipment.id]
+    ctx.db.session.rollback()
+
+
+def test_ingested_scans_are_searchable(ctx, client, make_shipment):
+    shipment = make_shipment()
+    feed = '\n'.join(f'{{"tracking_number": "{shipment.tracking_number}", "status": "In Transit", '
+                     f'"location": "{location}"}}' for location in ('Tranmere', 'Vantoft'))
+    client.post('/api/track/ingest', data=feed, content_type='application/x-ndjson')
+    assert search_ids(ctx, 'tranmere vantoft') == [shipment.id]
+    assert ctx.db.session.execute(text('SELECT count(*) FROM shipment_search_deferred')).scalar() == 0
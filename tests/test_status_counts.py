@@ -0,0 +1,65 @@
+"""Per-status shipment counters maintained on flush and by bulk writers"""
+from collections import Counter
+
+
+def counts(ctx):
+    return Counter(ctx.shipment_status_counts())
+
+
+def test_orm_writes_apply_status_deltas(ctx, make_shipment):
+    before = counts(ctx)
+    shipment = make_shipment()
+    assert counts(ctx) - before == Counter({'Processing': 1})
+
+    shipment.status = 'In Transit'
+    ctx.db.session.commit()
+    after = counts(ctx)
+    after.subtract(before)
+    assert +after == Counter({'In Transit': 1})
+    assert after['Processing'] == 0
+
+    ctx.TrackingEvent.query.filter_by(shipment_id=shipment.id).delete()
+    ctx.db.session.delete(shipment)
+    ctx.db.session.commit()
+    assert counts(ctx) == before
+
+
+def test_ingest_applies_status_deltas(ctx, admin, make_shipment):
+    first, second = make_shipment(), make_shipment()
+    before = counts(ctx)
+    chunk = [(1, scan(first.tracking_number, 'In Transit')),
+             (2, scan(first.tracking_number, 'Delivered')),
+             (3, scan(second.tracking_number, 'Processing'))]
+    assert ctx.ingest_scan_chunk(chunk, admin.id) == (3, {first.id, second.id}, [])
+    after = counts(ctx)
+    after.subtract(before)
+    assert {status: delta for status, delta in after.items() if delta} == \
+        {'Processing': -1, 'Delivered': 1}
+
+
+def test_status_changes_on_expired_shipments_are_counted(ctx, make_shipment):
+    shipment = make_shipment()
+    before = counts(ctx)
+    # The commit in make_shipment expired the instance: its old status is not loaded
+    assert 'status' not in ctx.db.inspect(shipment).dict
+    shipment.status = 'Delivered'
+    ctx.db.session.commit()
+    after = counts(ctx)
+    assert (after['Processing'] - before['Processing'], after['Delivered'] - before['Delivered']) == (-1, 1)
+
+
+def test_counters_match_a_rebuild(ctx, make_shipment):
+    make_shipment(status='Out for Delivery')
+    maintained = {status: count for status, count in ctx.shipment_status_counts().items() if count}
+    assert ctx.rebuild_status_counts() == maintained
+
+
+def test_admin_dashboard_reads_the_counters(ctx, client, monkeypatch):
+    monkeypatch.setattr(ctx, 'shipment_status_counts', lambda: {'Processing': 7, 'Delivered': 5})
+    page = client.get('/admin/dashboard').get_data(as_text=True)
+    assert '<div class="h3 mb-0">12</div>' in page
+
+
+def scan(tracking_number, status, location='Hub'):
+    return {'tracking_number': tracking_number, 'status': status, 'location': location,
+            'description': '', 'timestamp': None}
@@ -0,0 +1,92 @@
+"""Tracking response cache: backends and invalidation on commit"""
+from datetime import datetime
+import time
+
+from tracking_cache import CachedResponse, LocalSharedBackend, LRUBackend, ResponseCache
+
+
+def test_lru_backend_evicts_least_recently_used():
+    backend = LRUBackend(maxsize=2, ttl=30)
+    backend.set('a', b'1')
+    backend.set('b', b'2')
+    backend.get('a')
+    backend.set('c', b'3')
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (b'1', None, b'3')
+    assert backend.evictions == 1
+
+
+def test_lru_backend_expires_entries(monkeypatch):
+    backend = LRUBackend(ttl=30)
+    backend.set('a', b'1')
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+    assert backend.get('a') is None
+    assert backend.expirations == 1
+
+
+def test_local_shared_backend_sweeps_expired_keys_before_evicting(monkeypatch):
+    backend = LocalSharedBackend(ttl=30, maxsize=2)
+    backend.set('old', b'1')
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 20)
+    backend.set('a', b'2')
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 40)
+    backend.set('b', b'3')
+    assert len(backend) == 2
+    assert (backend.expirations, backend.evictions) == (1, 0)
+    backend.set('c', b'4')
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (None, b'3', b'4')
+    assert backend.evictions == 1
+
+
+def test_cached_response_round_trip():
+    cached = CachedResponse('"abc"', datetime(2024, 1, 1, 12, 30), b'{"a":\n1}')
+    assert CachedResponse.from_bytes(cached.to_bytes()) == cached
+
+
+def test_response_cache_counts_hits_and_misses():
+    cache = ResponseCache(LRUBackend())
+    cache.get('a')
+    cache.set('a', b'1')
+    cache.get('a')
+    cache.invalidate('a')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_commit_invalidates_cached_response(ctx, client, make_shipment):
+    shipment = make_shipment()
+    number = shipment.tracking_number
+    assert client.get(f'/api/track/{number}').status_code == 200
+    assert ctx.tracking_cache.get(number) is not None
+
+    shipment.status = 'In Transit'
+    ctx.db.session.commit()
+
+    assert ctx.tracking_cache.get(number) is None
+    assert client.get(f'/api/track/{number}').get_json()['data']['status'] == 'In Transit'
+
+
+def test_rollback_keeps_cached_response(ctx, client, make_shipment):
+    shipment = make_shipment()
+    number = shipment.tracking_number
+    client.get(f'/api/track/{number}')
+
+    shipment.status = 'In Transit'
+    ctx.db.session.flush()
+    ctx.db.session.rollback()
+
+    assert ctx.tracking_cache.get(number) is not None
+
+
+def test_new_event_invalidates_cached_response(ctx, client, make_shipment):
+    shipment = make_shipment()
+    number = shipment.tracking_number
+    client.get(f'/api/track/{number}')
+
+    ctx.db.session.add(ctx.TrackingEvent(shipment_id=shipment.id, status='In Transit', location='Hub'))
+    ctx.db.session.commit()
+
+    assert ctx.tracking_cache.get(number) is None
+    events = client.get(f'/api/track/{number}').get_json()['data']['tracking_events']
+    assert [event['location'] for event in events].count('Hub') == 1
@@ -0,0 +1,80 @@
+"""Tracking number allocation: block reservation, SQLite locking and check digits"""
+import itertools
+
+import pytest
+
+import tracking_numbers
+
+_names = itertools.count(1)
+
+
+@pytest.fixture
+def allocator(ctx):
+    """Allocators sharing a sequence row of their own"""
+    name = f'test-{next(_names)}'
+
+    def make(block_size=3):
+        return tracking_numbers.TrackingNumberAllocator(lambda: ctx.db.engine, name=name,
+                                                        block_size=block_size)
+    return make
+
+
+def test_allocators_reserve_disjoint_blocks(allocator):
+    first, second = allocator(), allocator()
+    numbers = [allocator.allocate() for _ in range(4) for allocator in (first, second)]
+    assert len(set(numbers)) == len(numbers) == 8
+    assert first.blocks_reserved == second.blocks_reserved == 2
+
+
+def test_allocate_many_spans_block_boundaries(allocator):
+    allocator = allocator(block_size=3)
+    single = allocator.allocate()
+    many = allocator.allocate_many(4)
+    assert len(set([single] + many)) == 5
+    assert allocator.blocks_reserved == 2
+    # The rest of the second block is used before a third is reserved
+    assert allocator.allocate() not in many
+    assert allocator.blocks_reserved == 2
+
+
+def test_connection_allocation_does_not_cache_a_block(ctx, allocator):
+    allocator = allocator(block_size=100)
+    with ctx.db.engine.begin() as connection:
+        first = allocator.allocate(connection)
+    second = allocator.allocate()
+    assert first != second
+    assert allocator.blocks_reserved == 2
+
+
+def test_allocation_inside_an_open_sqlite_transaction(ctx, admin):
+    # Reading the expired user opens the session's BEGIN IMMEDIATE transaction
+    assert admin.id
+    assert ctx.db.session().in_transaction()
+    number = ctx.generate_tracking_number()
+    ctx.db.session.commit()
+    assert not ctx.tracking_numbers.is_mistyped(number)
+
+
+def test_check_digit_rejects_single_digit_typos(ctx):
+    number = ctx.tracking_numbers.format(1234)
+    assert tracking_numbers.has_valid_check_digit(number)
+    assert not ctx.tracking_numbers.is_mistyped(number)
+    for i in range(len(ctx.tracking_numbers.prefix), len(number)):
+        digit = str((int(number[i]) + 1) % 10)
+        assert ctx.tracking_numbers.is_mistyped(number[:i] + digit + number[i + 1:])
+
+
+def test_other_shapes_are_not_mistyped(ctx):
+    assert not ctx.tracking_numbers.is_mistyped('SC24010112345')
+    assert not ctx.tracking_numbers.is_mistyped('not a tracking number')
+
+
+def test_mistyped_number_is_rejected_without_a_lookup(ctx, client, new_number, monkeypatch):
+    number = new_number()
+    mistyped = number[:-1] + str((int(number[-1]) + 1) % 10)
+
+    def lookup(tracking_number):
+        raise AssertionError('mistyped number was looked up')
+    monkeypatch.setattr(ctx, 'tracking_validators', lookup)
+
+    assert client.get(f'/api/track/{mistyped}').status_code == 404
@@ -0,0 +1,129 @@
+"""Password hashing, sign-in with hash upgrades, registration and the session user cache"""
+import itertools
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import HashingBusy, PasswordHasher
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture
+def hasher(ctx, monkeypatch):
+    """A cheap hasher in place of the app's, so sign-ins stay fast"""
+    hasher = PasswordHasher(method='pbkdf2', pbkdf2_iterations=1000)
+    monkeypatch.setattr(ctx, 'passwords', hasher)
+    return hasher
+
+
+@pytest.fixture
+def user(ctx, hasher):
+    user = ctx.User(name='Customer', email=f'customer{next(_ids)}@tests.local',
+                    password=hasher.hash('secret'))
+    ctx.db.session.add(user)
+    ctx.db.session.commit()
+    return user
+
+
+def test_hashes_verify_across_schemes():
+    scrypt = PasswordHasher(method='scrypt', scrypt_n=1024)
+    pbkdf2 = PasswordHasher(method='pbkdf2', pbkdf2_iterations=1000)
+    stored = scrypt.hash('secret')
+    assert stored.startswith('scrypt:1024:8:1$')
+    assert scrypt.verify(stored, 'secret') and not scrypt.verify(stored, 'Secret')
+    assert pbkdf2.verify(stored, 'secret') and pbkdf2.needs_rehash(stored)
+
+    legacy = generate_password_hash('secret', method='sha256')
+    assert scrypt.verify(legacy, 'secret') and scrypt.needs_rehash(legacy)
+    assert not scrypt.verify('not a hash', 'secret')
+
+
+def test_saturated_pool_rejects_instead_of_queueing(monkeypatch):
+    hasher = PasswordHasher(method='pbkdf2', pbkdf2_iterations=1000, workers=1, max_pending=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password):
+        started.set()
+        release.wait(5)
+        return 'hash'
+    monkeypatch.setattr(hasher, '_hash', slow_hash)
+    worker = threading.Thread(target=hasher.hash, args=('first',))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(HashingBusy):
+        hasher.hash('second')
+    release.set()
+    worker.join()
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_sign_in_upgrades_an_outdated_hash(ctx, hasher, user):
+    client = ctx.app.test_client()
+    response = client.post('/login', data={'email': user.email, 'password': 'wrong'})
+    assert b'Invalid email or password' in response.data
+
+    hasher.pbkdf2_iterations = 2000
+    response = client.post('/login', data={'email': user.email, 'password': 'secret'})
+    assert response.status_code == 302
+    ctx.db.session.expire_all()
+    assert ctx.db.session.query(ctx.User).get(user.id).password.startswith('pbkdf2:sha256:2000$')
+
+
+def test_register_creates_the_user_once(ctx, hasher, monkeypatch):
+    client = ctx.app.test_client()
+    form = {'email': f'new{next(_ids)}@tests.local', 'password': 'secret', 'name': 'New', 'phone': '0'}
+    assert client.post('/register', data=form).headers['Location'].endswith('/login')
+    stored = ctx.User.query.filter_by(email=form['email']).one().password
+    assert hasher.verify(stored, 'secret')
+
+    # A taken email is turned away before any hashing
+    def fail(password):
+        raise AssertionError('hashed a password for a taken email')
+    monkeypatch.setattr(hasher, 'hash', fail)
+    assert client.post('/register', data=form).headers['Location'].endswith('/register')
+
+
+def test_session_user_is_cached_until_the_row_changes(ctx, user):
+    user_id = str(user.id)
+    ctx.user_cache.invalidate(user_id)
+    assert ctx.load_user(user_id).name == 'Customer'
+    assert ctx.user_cache.get(user_id) is not None
+    assert b'password' not in ctx.user_cache.get(user_id)
+
+    user.name = 'Renamed'
+    ctx.db.session.commit()
+    assert ctx.user_cache.get(user_id) is None
+    assert ctx.load_user(user_id).name == 'Renamed'
+
+
+def test_register_race_on_the_same_email_is_reported(ctx, hasher, monkeypatch):
+    form = {'email': f'race{next(_ids)}@tests.local', 'password': 'secret', 'name': 'Racer', 'phone': '0'}
+    hash_password = hasher.hash
+
+    def hash_while_another_request_registers(password):
+        with ctx.db.engine.begin() as connection:
+            connection.execute(ctx.User.__table__.insert(),
+                               {'email': form['email'], 'password': 'x', 'name': 'First'})
+        return hash_password(password)
+    monkeypatch.setattr(hasher, 'hash', hash_while_another_request_registers)
+
+    response = ctx.app.test_client().post('/register', data=form)
+    assert response.headers['Location'].endswith('/register')
+    assert ctx.User.query.filter_by(email=form['email']).one().name == 'First'
+
+
+def test_admins_are_never_cached(ctx, admin):
+    user_id = str(admin.id)
+    # Reading the id opened the session's write transaction; end it
+    ctx.db.session.commit()
+    assert ctx.load_user(user_id).is_admin
+    assert ctx.user_cache.get(user_id) is None
+
+    # A demotion made by another process is seen on the next request
+    table = ctx.User.__table__
+    with ctx.db.engine.begin() as connection:
+        connection.execute(table.update().where(table.c.id == int(user_id)).values(is_admin=False))
+    ctx.db.read_session.remove()
+    assert not ctx.load_user(user_id).is_admin
@@ -0,0 +1,262 @@
+"""Response cache for the public tracking API.
+
+Entries are keyed by tracking number and hold the already-serialized JSON
+payload along with its ETag and Last-Modified validators, so a hit skips
+both the database and the JSON encoding step.
+Backends are pluggable: an in-process LRU with TTL (the default), an
+in-process stand-in for a shared key/value store, and Redis. The backends
+are not tied to tracking responses; the login user cache reuses them.
+"""
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import threading
+import time
+
+
+class CachedResponse(namedtuple('CachedResponse', 'etag last_modified body')):
+    """Encoded response body together with the validators it was served with"""
+
+    def to_bytes(self):
+        return b'\n'.join([
+            self.etag.encode('ascii'),
+            self.last_modified.isoformat().encode('ascii'),
+            self.body,
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        etag, last_modified, body = data.split(b'\n', 2)
+        return cls(etag.decode('ascii'),
+                   datetime.fromisoformat(last_modified.decode('ascii')),
+                   body)
+
+
+class LRUBackend:
+    """Bounded in-process cache with least-recently-used eviction and a TTL"""
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedBackend:
+    """Stand-in for a shared store with Redis-like get/setex/delete semantics.
+
+    Values must be bytes, exactly as they would be on the wire, so code that
+    works against this backend works against RedisBackend unchanged. Like a
+    Redis server with a memory limit it holds at most ``maxsize`` keys: a set
+    beyond that first sweeps out expired keys, then drops the oldest ones.
+    """
+
+    def __init__(self, ttl=30, prefix='track:', maxsize=1024):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.maxsize = maxsize
+        self.evictions = 0
+        self.expirations = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(self.prefix + key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[self.prefix + key]
+                self.expirations += 1
+                return None
+            return value
+
+    def set(self, key, value):
+        if not isinstance(value, bytes):
+            raise TypeError('shared cache values must be bytes')
+        now = time.monotonic()
+        with self._lock:
+            # Re-inserted so the dict stays ordered by when keys were written
+            self._data.pop(self.prefix + key, None)
+            self._data[self.prefix + key] = (now + self.ttl, value)
+            if len(self._data) > self.maxsize:
+                self._sweep(now)
+
+    def _sweep(self, now):
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+        while len(self._data) > self.maxsize:
+            del self._data[next(iter(self._data))]
+            self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(self.prefix + key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Shared cache stored in Redis, so every worker sees the same entries"""
+
+    def __init__(self, url, ttl=30, prefix='track:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('The redis package is required for the redis cache backend')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, value)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class NullBackend:
+    """Backend used when caching is disabled"""
+
+    evictions = 0
+    expirations = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    """Read-through cache front end that keeps hit/miss/invalidation counters"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def invalidate(self, key):
+        self.backend.delete(key)
+        with self._lock:
+            self.invalidations += 1
+
+    def invalidate_many(self, keys):
+        for key in keys:
+            self.invalidate(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'size': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.backend.evictions,
+            'expirations': self.backend.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+def create_backend(config, prefix='track:', setting='TRACKING_CACHE'):
+    """Build the backend selected by <setting>_BACKEND, sized by <setting>_SIZE/_TTL/_URL
+
+    <setting>_SIZE caps the in-process backends ('memory' and 'local-shared').
+    """
+    kind = config.get(f'{setting}_BACKEND', 'memory')
+    ttl = config.get(f'{setting}_TTL', 30)
+    if kind == 'memory':
+        return LRUBackend(maxsize=config.get(f'{setting}_SIZE', 1024), ttl=ttl)
+    if kind == 'local-shared':
+        return LocalSharedBackend(ttl=ttl, prefix=prefix, maxsize=config.get(f'{setting}_SIZE', 1024))
+    if kind == 'redis':
+        return RedisBackend(config[f'{setting}_URL'], ttl=ttl, prefix=prefix)
+    if kind == 'none':
+        return NullBackend()
+    raise ValueError(f'Unknown {setting.lower().replace("_", " ")} backend: {kind}')
+
+
+def create_tracking_cache(config):
+    """Create the response cache used by the tracking API"""
+    return ResponseCache(create_backend(config))
@@ -0,0 +1,164 @@
+"""Tracking number allocation.
+
+Numbers are built from a database sequence instead of random digits, so
+they are unique by construction and shipments can be inserted without a
+lookup-then-insert round trip or a retry on the unique constraint. Each
+process reserves a block of sequence values at a time with one short
+transaction on the ``tracking_number_sequence`` row and hands numbers out
+from memory until the block is used up; values of a block left unused when
+a process exits are skipped, never reused.
+
+The rendered number gets a Luhn check digit over its digits, so mistyped
+numbers can be rejected before they reach the database (see
+``TrackingNumberAllocator.is_mistyped``).
+"""
+from datetime import datetime
+import os
+import re
+import threading
+
+from sqlalchemy import exc, text
+
+DEFAULT_FORMAT = '{prefix}{date:%y%m%d}{sequence:08d}'
+
+
+def luhn_check_digit(digits):
+    """Luhn check digit for a string of decimal digits"""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def has_valid_check_digit(tracking_number):
+    """True when the last digit is the Luhn check digit of the digits before it"""
+    digits = re.sub(r'\D', '', tracking_number)
+    return len(digits) > 1 and luhn_check_digit(digits[:-1]) == digits[-1]
+
+
+class TrackingNumberAllocator:
+    """Hands out unique tracking numbers from blocks reserved in the database
+
+    ``get_engine`` returns the engine to reserve blocks with; reservations
+    use their own connection and commit immediately, so the sequence row is
+    never held for the length of a request. Callers that already hold the
+    database's only write lock (an open SQLite transaction) pass their
+    ``connection`` instead: exactly the values needed are then reserved in
+    the caller's transaction, and roll back with it, and no block is cached.
+    """
+
+    def __init__(self, get_engine, name='tracking_number', block_size=1000, prefix='SC',
+                 number_format=DEFAULT_FORMAT, max_length=20):
+        self.get_engine = get_engine
+        self.name = name
+        self.block_size = block_size
+        self.prefix = prefix
+        self.number_format = number_format
+        self.max_length = max_length
+        self.blocks_reserved = 0
+        # Numbers of this allocator's shape: the sample with every digit free
+        sample = self.format(0, datetime(2000, 1, 1))
+        self._pattern = re.compile(re.sub(r'\d', r'\\d', re.escape(sample)))
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not hand out its parent's block
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _claim(self, connection, size):
+        params = {'name': self.name, 'size': size}
+        updated = connection.execute(text(
+            'UPDATE tracking_number_sequence SET next_value = next_value + :size '
+            'WHERE name = :name'), params).rowcount
+        if not updated:
+            connection.execute(text(
+                'INSERT INTO tracking_number_sequence (name, next_value) '
+                'VALUES (:name, 1 + :size)'), params)
+        end = connection.execute(text(
+            'SELECT next_value FROM tracking_number_sequence WHERE name = :name'),
+            params).scalar()
+        return end - size
+
+    def reserve_block(self, size, connection=None):
+        """Atomically claim ``size`` sequence values; returns the first one
+        
+        With ``connection`` the values are claimed in its current transaction.
+        """
+        if connection is not None:
+            start = self._claim(connection, size)
+            self.blocks_reserved += 1
+            return start
+        while True:
+            try:
+                with self.get_engine().begin() as connection:
+                    start = self._claim(connection, size)
+            except exc.IntegrityError:
+                # Another process created the sequence row first
+                continue
+            self.blocks_reserved += 1
+            return start
+
+    def next_sequence(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self.reserve_block(self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    def sequences(self, count):
+        """``count`` sequence values, reserving one block for all of them if needed"""
+        with self._lock:
+            values = list(range(self._next, min(self._end, self._next + count)))
+            self._next += len(values)
+            if len(values) < count:
+                # Use up this block and take one block covering the rest
+                remaining = count - len(values)
+                size = max(self.block_size, remaining)
+                start = self.reserve_block(size)
+                values.extend(range(start, start + remaining))
+                self._next, self._end = start + remaining, start + size
+            return values
+
+    def format(self, sequence, now=None):
+        body = self.number_format.format(prefix=self.prefix, date=now or datetime.utcnow(),
+                                         sequence=sequence)
+        number = body + luhn_check_digit(re.sub(r'\D', '', body))
+        if len(number) > self.max_length:
+            raise ValueError(f'Tracking number {number} exceeds {self.max_length} characters')
+        return number
+
+    def allocate(self, connection=None):
+        """One new tracking number"""
+        if connection is not None:
+            return self.format(self.reserve_block(1, connection))
+        return self.format(self.next_sequence())
+
+    def allocate_many(self, count, connection=None):
+        """``count`` new tracking numbers, for bulk shipment creation"""
+        now = datetime.utcnow()
+        if connection is not None:
+            start = self.reserve_block(count, connection)
+            sequences = range(start, start + count)
+        else:
+            sequences = self.sequences(count)
+        return [self.format(sequence, now) for sequence in sequences]
+
+    def is_mistyped(self, tracking_number):
+        """True for a number shaped like this allocator's whose check digit is wrong
+        
+        Numbers of any other shape, such as those issued before the
+        allocator, are left for the database to answer.
+        """
+        return bool(self._pattern.fullmatch(tracking_number)) and \
+            not has_valid_check_digit(tracking_number)